@@ -0,0 +1,397 @@
+"""Replay synthetic power events through the Power Max Tracker hot paths.
+
+Runs a synthetic meter stream through the shared source dispatcher, which fans
+each parsed sample out to the coordinators and sensors of 1, 10 and 50 config
+entries sharing one source. Every timer of the integration (window boundaries,
+the shared tick, deferred publishes, recorder fallbacks and delayed saves) runs
+on a virtual clock against local stubs of the recorder statistics API, the
+storage helper and the state machine writes, so a day of 1 Hz samples replays
+in seconds.
+
+Run from the repository root with Home Assistant installed:
+
+    python benchmarks/replay.py --events 1000000 --entries 1 10 50
+
+Reports per-event latency percentiles, allocated bytes per event, state writes,
+timer callbacks, storage writes and recorder queries for each entry count.
+"""
+import argparse
+import array
+import asyncio
+import gc
+import heapq
+import itertools
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from homeassistant.const import EVENT_STATE_CHANGED  # noqa: E402
+from homeassistant.core import Event, HomeAssistant  # noqa: E402
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+
+from custom_components.power_max_tracker import broker, coordinator, dispatcher, sensor, tick  # noqa: E402
+from custom_components.power_max_tracker.const import (  # noqa: E402
+    DOMAIN,
+    CONF_SOURCE_SENSOR,
+    CONF_NUM_MAX_VALUES,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_DELTA,
+    CONF_WINDOW_MINUTES,
+    CONF_LIVE_WINDOWS,
+)
+from custom_components.power_max_tracker.coordinator import PowerMaxCoordinator  # noqa: E402
+
+SOURCE = "sensor.bench_meter"
+START = datetime(2025, 1, 6, 0, 0, 30, tzinfo=timezone.utc)
+# Events sampled for allocation tracing; tracemalloc is too slow for every event
+ALLOCATION_SAMPLE = 2000
+
+
+class VirtualClock:
+    """Replacement for dt_util.utcnow/now and time.time driven by the replay."""
+
+    def __init__(self, start):
+        self.now = start
+
+    def utcnow(self):
+        return self.now
+
+    def timestamp(self):
+        return self.now.timestamp()
+
+    def local(self, time_zone=None):
+        return self.now.astimezone(time_zone or dt_util.DEFAULT_TIME_ZONE)
+
+
+class RecorderStub:
+    """Local stand-in for the recorder instance and statistics_during_period."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    async def async_add_executor_job(self, func, *args):
+        return func(*args)
+
+    def statistics_during_period(self, hass, start_time, end_time, statistic_ids, period, units, types):
+        """Return one synthetic row per period for every requested entity."""
+        begin = time.perf_counter()
+        self.queries += 1
+        step = timedelta(hours=1) if period == "hour" else timedelta(minutes=5)
+        rows = []
+        moment = start_time.astimezone(timezone.utc)
+        while moment < end_time:
+            rows.append({
+                "start": moment.timestamp(),
+                "end": (moment + step).timestamp(),
+                "mean": 1500.0 + 1000.0 * math.sin(moment.timestamp() / 7200.0),
+            })
+            moment += step
+        result = {statistic_id: rows for statistic_id in statistic_ids}
+        self.query_seconds += time.perf_counter() - begin
+        return result
+
+
+class StoreStub:
+    """Local stand-in for the storage helper that counts the writes it would make."""
+
+    def __init__(self, harness):
+        self.harness = harness
+        self._delayed = None
+
+    async def async_load(self):
+        return None
+
+    async def async_save(self, data):
+        self.harness.saves += 1
+
+    def async_delay_save(self, data_func, delay=0):
+        if self._delayed is None:
+            self._delayed = self.harness.call_later(None, delay, lambda now: self._write(data_func))
+
+    def _write(self, data_func):
+        self._delayed = None
+        data_func()
+        self.harness.saves += 1
+
+
+def matches(value, pattern):
+    """Return True if a time field matches an async_track_time_change pattern."""
+    if pattern is None:
+        return True
+    if isinstance(pattern, str) and pattern.startswith("/"):
+        return value % int(pattern[1:]) == 0
+    return value == int(pattern)
+
+
+class Harness:
+    """Run the integration's listeners and timers on the virtual clock instead of real ones."""
+
+    def __init__(self, hass, clock, args):
+        self.hass = hass
+        self.clock = clock
+        self.args = args
+        self.state_listeners = []  # (entity_ids, handler) of state change subscriptions
+        self.time_changes = []  # (handler, kwargs) of time pattern subscriptions
+        self.timers = []  # heap of (due, sequence, handler, interval or None)
+        self.cancelled = set()  # sequences of cancelled timers
+        self.sequence = itertools.count()
+        self.coordinators = []
+        self.writes = 0
+        self.saves = 0
+        self.fired = 0
+        self._schedule(START.replace(second=0) + timedelta(minutes=1), self._async_minute, timedelta(minutes=1))
+
+    def _schedule(self, due, action, interval=None):
+        sequence = next(self.sequence)
+        heapq.heappush(self.timers, (due, sequence, action, interval))
+        return lambda: self.cancelled.add(sequence)
+
+    def _async_minute(self, now):
+        """Fire the time pattern subscriptions matching this minute, in local time."""
+        local = dt_util.as_local(now)
+        for action, kwargs in list(self.time_changes):
+            if (matches(local.hour, kwargs.get("hour")) and matches(local.minute, kwargs.get("minute"))
+                    and matches(local.second, kwargs.get("second"))):
+                action(now)
+                self.fired += 1
+
+    def track_state_change_event(self, hass, entity_ids, action):
+        entry = ([entity_ids] if isinstance(entity_ids, str) else list(entity_ids), action)
+        self.state_listeners.append(entry)
+        return lambda: self.state_listeners.remove(entry)
+
+    def track_time_change(self, hass, action, **kwargs):
+        entry = (action, kwargs)
+        self.time_changes.append(entry)
+        return lambda: self.time_changes.remove(entry)
+
+    def track_time_interval(self, hass, action, interval):
+        return self._schedule(self.clock.now + interval, action, interval)
+
+    def track_point_in_time(self, hass, action, point_in_time):
+        return self._schedule(dt_util.as_utc(point_in_time), action)
+
+    def call_later(self, hass, delay, action):
+        if isinstance(delay, timedelta):
+            delay = delay.total_seconds()
+        return self._schedule(self.clock.now + timedelta(seconds=delay), action)
+
+    def source_listeners(self):
+        return [action for entity_ids, action in self.state_listeners if SOURCE in entity_ids]
+
+    async def async_run_timers(self, until):
+        """Fire every timer due up to until at its own virtual time, returning the callbacks run."""
+        fired = 0
+        while self.timers and self.timers[0][0] <= until:
+            due, sequence, action, interval = heapq.heappop(self.timers)
+            if sequence in self.cancelled:
+                self.cancelled.discard(sequence)
+                continue
+            if interval is not None:
+                heapq.heappush(self.timers, (due + interval, sequence, action, interval))
+            self.clock.now = due
+            if action == self._async_minute:
+                before = self.fired
+                action(due)
+                fired += self.fired - before
+            else:
+                action(due)
+                fired += 1
+            # Let the tasks the timer created, such as recorder fallbacks, run at this virtual time
+            await self.hass.async_block_till_done()
+        self.clock.now = until
+        return fired
+
+    def count_writes(self, entity):
+        """Count state writes; the state and attributes are still rendered, as a real write would."""
+
+        def async_write_ha_state():
+            self.writes += 1
+            entity.state
+            entity.extra_state_attributes
+
+        entity.async_write_ha_state = async_write_ha_state
+
+    async def async_add_entry(self, index):
+        entry = SimpleNamespace(
+            entry_id=f"bench{index:03d}",
+            data={
+                CONF_SOURCE_SENSOR: SOURCE,
+                CONF_NUM_MAX_VALUES: 3,
+                CONF_MIN_PUBLISH_INTERVAL: self.args.publish_interval,
+                CONF_MIN_PUBLISH_DELTA: self.args.publish_delta,
+                CONF_WINDOW_MINUTES: self.args.window,
+                CONF_LIVE_WINDOWS: self.args.live,
+            },
+        )
+        tracker = PowerMaxCoordinator(self.hass, entry)
+        self.hass.data.setdefault(DOMAIN, {})[entry.entry_id] = tracker
+        await tracker.async_setup()
+        entities = [
+            sensor.MaxPowerSensor(tracker, 0, f"Max {sensor.window_label(self.args.window)} Average Power 1"),
+            sensor.AverageMaxPowerSensor(tracker, entry),
+            sensor.SourcePowerSensor(tracker, entry),
+            sensor.HourlyAveragePowerSensor(tracker, entry),
+            sensor.ProjectedAveragePowerSensor(tracker, entry),
+            sensor.PeakBudgetSensor(tracker, entry),
+        ]
+        for entity in entities:
+            entity.hass = self.hass
+            entity.entity_id = f"sensor.{entity._attr_unique_id}"
+            self.count_writes(entity)
+            tracker.add_entity(entity)
+            await entity.async_added_to_hass()
+        self.coordinators.append(tracker)
+
+
+def percentile(sorted_values, fraction):
+    """Return a percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def async_run(entries, args):
+    """Replay args.events samples against the given number of config entries."""
+    config_dir = tempfile.mkdtemp(prefix="power_max_bench_")
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:  # Home Assistant before 2024.3
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    await er.async_load(hass)
+
+    clock = VirtualClock(START)
+    stub = RecorderStub(hass)
+    patches = [
+        (dt_util, "utcnow", clock.utcnow),
+        (dt_util, "now", clock.local),
+        # States are stamped by the state machine with time.time(), and samples carry their update time
+        (time, "time", clock.timestamp),
+        (broker, "get_instance", lambda hass: stub),
+        (broker, "statistics_during_period", stub.statistics_during_period),
+        (broker, "BATCH_DELAY", 0),
+    ]
+    harness = Harness(hass, clock, args)
+    patches += [
+        (dispatcher, "async_track_state_change_event", harness.track_state_change_event),
+        (sensor, "async_track_time_change", harness.track_time_change),
+        (sensor, "async_call_later", harness.call_later),
+        (tick, "async_track_time_interval", harness.track_time_interval),
+        (coordinator, "async_track_state_change_event", harness.track_state_change_event),
+        (coordinator, "async_track_time_change", harness.track_time_change),
+        (coordinator, "async_track_point_in_time", harness.track_point_in_time),
+        (coordinator, "async_call_later", harness.call_later),
+        (coordinator, "Store", lambda hass, version, key, **kwargs: StoreStub(harness)),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+
+    try:
+        hass.states.async_set(SOURCE, "0.0")
+        for index in range(entries):
+            await harness.async_add_entry(index)
+        await hass.async_block_till_done()
+        harness.writes = harness.saves = 0
+        source_listeners = harness.source_listeners()
+
+        rng = random.Random(42)
+        step = timedelta(seconds=args.interval)
+        power = 1500.0
+        latencies = array.array("q")  # No object per event, so retained blocks are the integration's
+        timer_seconds = 0.0
+        timers_fired = 0
+        allocated = 0
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+
+        for index in range(args.events):
+            begin = time.perf_counter()
+            timers_fired += await harness.async_run_timers(clock.now + step)
+            timer_seconds += time.perf_counter() - begin
+            power = max(-200.0, min(11000.0, power + rng.gauss(0, 150)))
+            traced = index < ALLOCATION_SAMPLE
+            if traced:
+                tracemalloc.start()
+            begin = time.perf_counter_ns()
+            old_state = hass.states.get(SOURCE)
+            hass.states.async_set(SOURCE, f"{power:.1f}")
+            event = Event(EVENT_STATE_CHANGED, {
+                "entity_id": SOURCE, "old_state": old_state, "new_state": hass.states.get(SOURCE),
+            })
+            for action in source_listeners:
+                result = action(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            latencies.append(time.perf_counter_ns() - begin)
+            if traced:
+                allocated += tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        gc.collect()
+        blocks_after = sys.getallocatedblocks()
+        await hass.async_block_till_done()
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+        for tracker in harness.coordinators:
+            tracker.async_unload()
+        await hass.async_stop(force=True)
+
+    latencies = sorted(latencies)
+    sampled = min(args.events, ALLOCATION_SAMPLE)
+    return {
+        "entries": entries,
+        "events": args.events,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p90_us": percentile(latencies, 0.90) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "p999_us": percentile(latencies, 0.999) / 1000,
+        "max_us": latencies[-1] / 1000,
+        "bytes_per_event": allocated / sampled if sampled else 0.0,
+        "retained_blocks_per_event": (blocks_after - blocks_before) / args.events,
+        "state_writes": harness.writes,
+        "writes_per_event": harness.writes / args.events,
+        "timers": timers_fired,
+        "timer_mean_ms": 1000 * timer_seconds / timers_fired if timers_fired else 0.0,
+        "saves": harness.saves,
+        "recorder_queries": stub.queries,
+        "recorder_seconds": stub.query_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000, help="synthetic events per run")
+    parser.add_argument("--entries", type=int, nargs="+", default=[1, 10, 50], help="config entries on the same source")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between meter events")
+    parser.add_argument("--window", type=int, default=60, choices=[15, 30, 60], help="window length in minutes")
+    parser.add_argument("--live", action="store_true", help="take window means from the live integrator")
+    parser.add_argument("--publish-interval", type=float, default=0, help="min_publish_interval in seconds")
+    parser.add_argument("--publish-delta", type=float, default=0, help="min_publish_delta in W")
+    args = parser.parse_args()
+
+    print(f"{'entries':>7} {'events':>9} {'p50 us':>8} {'p90 us':>8} {'p99 us':>8} {'p99.9 us':>9} "
+          f"{'max us':>9} {'B/event':>8} {'blk/ev':>7} {'writes':>9} {'w/ev':>6} {'timers':>7} "
+          f"{'timer ms':>8} {'saves':>6} {'queries':>7}")
+    for entries in args.entries:
+        r = asyncio.run(async_run(entries, args))
+        print(f"{r['entries']:>7} {r['events']:>9} {r['p50_us']:>8.1f} {r['p90_us']:>8.1f} {r['p99_us']:>8.1f} "
+              f"{r['p999_us']:>9.1f} {r['max_us']:>9.1f} {r['bytes_per_event']:>8.0f} "
+              f"{r['retained_blocks_per_event']:>7.3f} {r['state_writes']:>9} {r['writes_per_event']:>6.2f} "
+              f"{r['timers']:>7} {r['timer_mean_ms']:>8.3f} {r['saves']:>6} {r['recorder_queries']:>7}")
+
+
+if __name__ == "__main__":
+    main()
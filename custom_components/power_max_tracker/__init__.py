@@ -1,13 +1,70 @@
 """Power Max Tracker integration."""
+import asyncio
 import logging
+import os
+import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
 from homeassistant.const import Platform
 from homeassistant.helpers import config_validation as cv
-from homeassistant.exceptions import ConfigEntryNotReady
-from .const import DOMAIN, CONF_SOURCE_SENSOR, CONF_MONTHLY_RESET, CONF_NUM_MAX_VALUES, CONF_BINARY_SENSOR
-from .coordinator import PowerMaxCoordinator
+from homeassistant.helpers.storage import Store
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
+from homeassistant.util import dt as dt_util
+from .const import (
+    DOMAIN,
+    CONF_SOURCE_SENSOR,
+    CONF_MONTHLY_RESET,
+    CONF_NUM_MAX_VALUES,
+    CONF_BINARY_SENSOR,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_DELTA,
+    CONF_PEAK_UNIQUENESS,
+    CONF_WINDOW_MINUTES,
+    CONF_LIVE_WINDOWS,
+    CONF_SCHEDULE_MONTHS,
+    CONF_SCHEDULE_WEEKDAYS,
+    CONF_SCHEDULE_HOURS,
+    CONF_SCHEDULE_HOLIDAYS,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_TICK_INTERVAL,
+    CONF_MAX_HOLD,
+    DEFAULT_TICK_INTERVAL,
+    DEFAULT_MAX_HOLD,
+    CONF_SOURCE_TYPE,
+    CONF_PROFILES,
+    CONF_PROFILE_NAME,
+    CONF_PERCENTILES,
+    CONF_ROLLING_DAYS,
+    CONF_SHED_LOADS,
+    CONF_SHED_MIN_ON,
+    CONF_SHED_MIN_OFF,
+    CONF_SHED_HYSTERESIS,
+    DEFAULT_SHED_MIN_ON,
+    DEFAULT_SHED_MIN_OFF,
+    DEFAULT_SHED_HYSTERESIS,
+    SOURCE_TYPE_POWER,
+    SOURCE_TYPES,
+    DATA_BROKER,
+    DATA_DISPATCHER,
+    DATA_TICKER,
+    STORAGE_VERSION,
+)
+from .archive import export_csv
+from .integrator import WINDOW_OPTIONS
+from .peaks import UNIQUENESS_OPTIONS, UNIQUE_WINDOW
+from .shedding import SHED_DOMAINS
+from .sketch import parse_percentiles
+from .coordinator import (
+    PowerMaxCoordinator,
+    archive_path,
+    build_schedule,
+    profile_key,
+    source_label,
+    source_sensors,
+)
 from .sensor import MaxPowerSensor, SourcePowerSensor  # Import sensor after coordinator
+from .websocket import async_register_websocket_commands
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,18 +72,155 @@ PLATFORMS = [Platform.SENSOR]
 
 CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 
+RECOMPUTE_SCHEMA = vol.Schema(
+    {
+        vol.Required("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("entry_id"): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("reset", default=False): cv.boolean,
+    }
+)
+
+PEAK_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("entry_id"): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("csv_path"): cv.string,
+    }
+)
+
+PROFILE_KEYS = (
+    CONF_PROFILE_NAME,
+    CONF_NUM_MAX_VALUES,
+    CONF_MONTHLY_RESET,
+    CONF_BINARY_SENSOR,
+    CONF_PEAK_UNIQUENESS,
+    CONF_SCHEDULE_MONTHS,
+    CONF_SCHEDULE_WEEKDAYS,
+    CONF_SCHEDULE_HOURS,
+    CONF_SCHEDULE_HOLIDAYS,
+    CONF_PERCENTILES,
+    CONF_ROLLING_DAYS,
+)
+
+def _rolling_days_error(conf):
+    """Return the error in the rolling window of a tracker or profile, or None if it is valid."""
+    rolling_days = conf.get(CONF_ROLLING_DAYS, 0)
+    if not isinstance(rolling_days, int) or not (0 <= rolling_days <= 366):
+        return "rolling_days must be an integer between 0 and 366"
+    if rolling_days and conf.get(CONF_MONTHLY_RESET, False):
+        return "rolling_days and monthly_reset cannot be combined"
+    return None
+
+def _shedding_error(conf):
+    """Return the error in the load shedding options, or None if they are valid."""
+    loads = conf.get(CONF_SHED_LOADS, [])
+    if not isinstance(loads, list) or not all(
+        isinstance(entity_id, str) and entity_id.split(".")[0] in SHED_DOMAINS for entity_id in loads
+    ):
+        return f"shed_loads must be a list of {', '.join(SHED_DOMAINS)} entity ids"
+    for key, default in ((CONF_SHED_MIN_ON, DEFAULT_SHED_MIN_ON), (CONF_SHED_MIN_OFF, DEFAULT_SHED_MIN_OFF)):
+        if not isinstance(conf.get(key, default), int) or conf.get(key, default) < 0:
+            return f"{key} must be a non-negative number of seconds"
+    hysteresis = conf.get(CONF_SHED_HYSTERESIS, DEFAULT_SHED_HYSTERESIS)
+    if not isinstance(hysteresis, (int, float)) or not (0 <= hysteresis < 100):
+        return "shed_hysteresis must be a percentage from 0 to below 100"
+    return None
+
+def _validate_profiles(profiles):
+    """Return the error in a list of tracker profiles, or None if they are valid."""
+    if not isinstance(profiles, list):
+        return "profiles must be a list"
+    keys = set()
+    for profile in profiles:
+        if not isinstance(profile, dict) or not profile.get(CONF_PROFILE_NAME):
+            return "every profile needs a name"
+        key = profile_key(profile)
+        if not key or key in keys:
+            return f"profile name {profile[CONF_PROFILE_NAME]} is empty or not unique"
+        keys.add(key)
+        num_max_values = profile.get(CONF_NUM_MAX_VALUES, 2)
+        if not isinstance(num_max_values, int) or not (1 <= num_max_values <= 10):
+            return f"num_max_values of profile {profile[CONF_PROFILE_NAME]} must be an integer between 1 and 10"
+        if profile.get(CONF_PEAK_UNIQUENESS, UNIQUE_WINDOW) not in UNIQUENESS_OPTIONS:
+            return f"peak_uniqueness of profile {profile[CONF_PROFILE_NAME]} must be one of {UNIQUENESS_OPTIONS}"
+        try:
+            build_schedule(profile)
+        except (ValueError, TypeError) as err:
+            return f"Invalid schedule of profile {profile[CONF_PROFILE_NAME]}: {err}"
+        if error := _rolling_days_error(profile):
+            return f"Invalid profile {profile[CONF_PROFILE_NAME]}: {error}"
+        try:
+            profile[CONF_PERCENTILES] = parse_percentiles(profile.get(CONF_PERCENTILES))
+        except ValueError as err:
+            return f"Invalid percentiles of profile {profile[CONF_PROFILE_NAME]}: {err}"
+    return None
+
+def _as_local(value):
+    """Interpret a naive service datetime in the configured time zone."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+    return dt_util.as_local(value)
+
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the Power Max Tracker integration from YAML."""
+    def coordinators(entry_ids=None):
+        """Return the loaded coordinators, optionally limited to some config entries."""
+        return [
+            coord for entry_id, coord in hass.data.get(DOMAIN, {}).items()
+            if isinstance(coord, PowerMaxCoordinator) and (not entry_ids or entry_id in entry_ids)
+        ]
+
+    # Register services globally
+    async def update_max_values_service(call: ServiceCall) -> None:
+        """Service to update max values from midnight."""
+        _LOGGER.debug("Running update_max_values_service")
+        # Run all coordinators concurrently so the broker can batch their queries
+        await asyncio.gather(
+            *(coord.async_update_max_values_from_midnight() for coord in coordinators())
+        )
+
+    async def recompute_service(call: ServiceCall) -> None:
+        """Service to recompute max values over an arbitrary range."""
+        start = _as_local(call.data["start"])
+        end = _as_local(call.data["end"]) if "end" in call.data else None
+        _LOGGER.debug(f"Running recompute_service from {start} to {end}")
+        await asyncio.gather(
+            *(coord.async_recompute(start, end, call.data["reset"])
+              for coord in coordinators(call.data.get("entry_id")))
+        )
+
+    async def get_peak_history_service(call: ServiceCall) -> ServiceResponse:
+        """Service to return archived peaks from the archive index, optionally exported as CSV."""
+        start = _as_local(call.data["start"]) if "start" in call.data else None
+        end = _as_local(call.data["end"]) if "end" in call.data else None
+        selected = coordinators(call.data.get("entry_id"))
+        if csv_path := call.data.get("csv_path"):
+            if not hass.config.is_allowed_path(csv_path):
+                raise HomeAssistantError(f"Writing to {csv_path} is not allowed, add it to allowlist_external_dirs")
+            try:
+                archives = [
+                    (coord.entry.entry_id, profile.key, profile.archive)
+                    for coord in selected for profile in coord.profiles
+                ]
+                rows = await hass.async_add_executor_job(export_csv, csv_path, archives, start, end)
+            except OSError as err:
+                raise HomeAssistantError(f"Could not export peak history to {csv_path}: {err}") from err
+            _LOGGER.info(f"Exported {rows} archived peaks to {csv_path}")
+        if not call.return_response:
+            return None
+        histories = await asyncio.gather(*(coord.async_get_peak_history(start, end) for coord in selected))
+        return {coord.entry.entry_id: history for coord, history in zip(selected, histories)}
+
+    hass.services.async_register(DOMAIN, "update_max_values", update_max_values_service)
+    hass.services.async_register(DOMAIN, "recompute", recompute_service, schema=RECOMPUTE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN, "get_peak_history", get_peak_history_service,
+        schema=PEAK_HISTORY_SCHEMA, supports_response=SupportsResponse.OPTIONAL,
+    )
+    async_register_websocket_commands(hass)
     if DOMAIN not in config:
-        # Register service globally
-        async def update_max_values_service(call: ServiceCall) -> None:
-            """Service to update max values from midnight."""
-            _LOGGER.debug("Running update_max_values_service")
-            for entry_id, coord in hass.data.get(DOMAIN, {}).items():
-                if isinstance(coord, PowerMaxCoordinator):
-                    await coord.async_update_max_values_from_midnight()
-
-        hass.services.async_register(DOMAIN, "update_max_values", update_max_values_service)
         return True
 
     for conf in config[DOMAIN]:
@@ -34,21 +228,82 @@ async def async_setup(hass: HomeAssistant, config: dict):
         if not isinstance(conf.get(CONF_NUM_MAX_VALUES, 2), int) or not (1 <= conf.get(CONF_NUM_MAX_VALUES, 2) <= 10):
             _LOGGER.error("num_max_values must be an integer between 1 and 10")
             continue
+        if conf.get(CONF_PEAK_UNIQUENESS, UNIQUE_WINDOW) not in UNIQUENESS_OPTIONS:
+            _LOGGER.error(f"peak_uniqueness must be one of {UNIQUENESS_OPTIONS}")
+            continue
+        if conf.get(CONF_SOURCE_TYPE, SOURCE_TYPE_POWER) not in SOURCE_TYPES:
+            _LOGGER.error(f"source_type must be one of {SOURCE_TYPES}")
+            continue
+        if not isinstance(conf.get(CONF_TICK_INTERVAL, DEFAULT_TICK_INTERVAL), int) or conf.get(CONF_TICK_INTERVAL, DEFAULT_TICK_INTERVAL) < 0:
+            _LOGGER.error("tick_interval must be a non-negative number of seconds")
+            continue
+        if not isinstance(conf.get(CONF_MAX_HOLD, DEFAULT_MAX_HOLD), int) or conf.get(CONF_MAX_HOLD, DEFAULT_MAX_HOLD) < 60:
+            _LOGGER.error("max_hold must be at least 60 seconds")
+            continue
+        if conf.get(CONF_WINDOW_MINUTES, 60) not in WINDOW_OPTIONS:
+            _LOGGER.error(f"window_minutes must be one of {WINDOW_OPTIONS}")
+            continue
+        sources = source_sensors(conf)
+        if not sources:
+            _LOGGER.error("source_sensor must be an entity id or a list of entity ids")
+            continue
+        try:
+            build_schedule(conf)
+        except (ValueError, TypeError) as err:
+            _LOGGER.error(f"Invalid schedule: {err}")
+            continue
+        if error := _rolling_days_error(conf):
+            _LOGGER.error(error)
+            continue
+        if error := _shedding_error(conf):
+            _LOGGER.error(error)
+            continue
+        try:
+            percentiles = parse_percentiles(conf.get(CONF_PERCENTILES))
+        except ValueError as err:
+            _LOGGER.error(f"Invalid percentiles: {err}")
+            continue
+        if error := _validate_profiles(conf.get(CONF_PROFILES, [])):
+            _LOGGER.error(error)
+            continue
 
         # Create a config entry programmatically
         entry_data = {
-            CONF_SOURCE_SENSOR: conf.get(CONF_SOURCE_SENSOR),
+            CONF_SOURCE_SENSOR: sources[0] if len(sources) == 1 else sources,
+            CONF_SOURCE_TYPE: conf.get(CONF_SOURCE_TYPE, SOURCE_TYPE_POWER),
             CONF_NUM_MAX_VALUES: conf.get(CONF_NUM_MAX_VALUES, 2),
             CONF_MONTHLY_RESET: conf.get(CONF_MONTHLY_RESET, False),
+            CONF_ROLLING_DAYS: conf.get(CONF_ROLLING_DAYS, 0),
             CONF_BINARY_SENSOR: conf.get(CONF_BINARY_SENSOR),
-            "max_values": [0.0] * conf.get(CONF_NUM_MAX_VALUES, 2)
+            CONF_MIN_PUBLISH_INTERVAL: conf.get(CONF_MIN_PUBLISH_INTERVAL, 0),
+            CONF_MIN_PUBLISH_DELTA: conf.get(CONF_MIN_PUBLISH_DELTA, 0),
+            CONF_PEAK_UNIQUENESS: conf.get(CONF_PEAK_UNIQUENESS, UNIQUE_WINDOW),
+            CONF_WINDOW_MINUTES: conf.get(CONF_WINDOW_MINUTES, 60),
+            CONF_LIVE_WINDOWS: conf.get(CONF_LIVE_WINDOWS, False),
+            CONF_SCHEDULE_MONTHS: conf.get(CONF_SCHEDULE_MONTHS, []),
+            CONF_SCHEDULE_WEEKDAYS: conf.get(CONF_SCHEDULE_WEEKDAYS, []),
+            CONF_SCHEDULE_HOURS: conf.get(CONF_SCHEDULE_HOURS),
+            CONF_SCHEDULE_HOLIDAYS: conf.get(CONF_SCHEDULE_HOLIDAYS, []),
+            CONF_DIAGNOSTIC_SENSORS: conf.get(CONF_DIAGNOSTIC_SENSORS, False),
+            CONF_EXTERNAL_STATISTICS: conf.get(CONF_EXTERNAL_STATISTICS, False),
+            CONF_TICK_INTERVAL: conf.get(CONF_TICK_INTERVAL, DEFAULT_TICK_INTERVAL),
+            CONF_MAX_HOLD: conf.get(CONF_MAX_HOLD, DEFAULT_MAX_HOLD),
+            CONF_PERCENTILES: percentiles,
+            CONF_SHED_LOADS: conf.get(CONF_SHED_LOADS, []),
+            CONF_SHED_MIN_ON: conf.get(CONF_SHED_MIN_ON, DEFAULT_SHED_MIN_ON),
+            CONF_SHED_MIN_OFF: conf.get(CONF_SHED_MIN_OFF, DEFAULT_SHED_MIN_OFF),
+            CONF_SHED_HYSTERESIS: conf.get(CONF_SHED_HYSTERESIS, DEFAULT_SHED_HYSTERESIS),
+            CONF_PROFILES: [
+                {key: profile[key] for key in PROFILE_KEYS if key in profile}
+                for profile in conf.get(CONF_PROFILES, [])
+            ],
         }
         hass.async_create_task(
             hass.config_entries.async_add(
                 ConfigEntry(
                     version=1,
                     domain=DOMAIN,
-                    title=f"Power Max Tracker ({conf.get(CONF_SOURCE_SENSOR, 'unknown').split('.')[-1]})",
+                    title=f"Power Max Tracker ({source_label(conf)})",
                     data=entry_data,
                     source="yaml",
                     options={},
@@ -76,7 +331,25 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
     coordinator.async_unload()
+    await coordinator.async_save()
     if await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
         hass.data[DOMAIN].pop(entry.entry_id)
+        if not any(isinstance(coord, PowerMaxCoordinator) for coord in hass.data[DOMAIN].values()):
+            broker = hass.data[DOMAIN].pop(DATA_BROKER, None)
+            if broker is not None:
+                broker.async_shutdown()
+            # Every subscription and tick listener was released by the coordinators and entities above
+            hass.data[DOMAIN].pop(DATA_DISPATCHER, None)
+            hass.data[DOMAIN].pop(DATA_TICKER, None)
         return True
-    return False
\ No newline at end of file
+    return False
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the persisted tracker state of a deleted config entry."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+    paths = [archive_path(hass, entry.entry_id)] + [
+        archive_path(hass, entry.entry_id, profile_key(profile)) for profile in entry.data.get(CONF_PROFILES, [])
+    ]
+    for path in paths:
+        if await hass.async_add_executor_job(os.path.exists, path):
+            await hass.async_add_executor_job(os.remove, path)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""Append-only binary archive of the peaks of closed periods."""
+import csv
+import os
+import struct
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+# Period start, period end, peak start (UTC epoch seconds) and peak value (kW)
+RECORD = struct.Struct("<qqqd")
+CSV_HEADER = ["entry_id", "profile", "period_start", "period_end", "rank", "value_kw", "peak_start"]
+
+
+class ArchivedPeriod(NamedTuple):
+    """Peaks of one closed period, largest first."""
+
+    start: datetime  # UTC
+    end: datetime  # UTC
+    peaks: list  # [(value kW, start UTC datetime)]
+
+
+def _timestamp(moment: datetime) -> int:
+    return int(moment.timestamp())
+
+
+def _datetime(timestamp: int) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class PeakArchive:
+    """Peaks of closed periods stored as fixed-size records that are never rewritten.
+
+    Each period is appended once. An in-memory index of period starts and
+    file offsets, a few dozen bytes per period, answers period and range
+    queries by reading only the records returned. All methods block and are
+    run on the executor.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._starts = []  # Period start timestamps, ascending
+        self._index = []  # (file offset, record count) per period, same order as _starts
+        self._size = 0  # Bytes of complete records in the file
+
+    def __len__(self):
+        return len(self._starts)
+
+    def load(self):
+        """Build the index from the archive file, dropping a partly written last record."""
+        self._starts.clear()
+        self._index.clear()
+        self._size = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as archive:
+            while chunk := archive.read(RECORD.size * 4096):
+                usable = len(chunk) - len(chunk) % RECORD.size
+                for period_start, _, _, _ in RECORD.iter_unpack(chunk[:usable]):
+                    self._index_record(period_start, self._size)
+                    self._size += RECORD.size
+        if os.path.getsize(self.path) > self._size:
+            # Left over from a write interrupted mid-record
+            os.truncate(self.path, self._size)
+
+    def _index_record(self, period_start, offset):
+        """Add one record at offset to the index."""
+        position = bisect_left(self._starts, period_start)
+        if position < len(self._starts) and self._starts[position] == period_start:
+            offset, count = self._index[position]
+            self._index[position] = (offset, count + 1)
+        else:
+            self._starts.insert(position, period_start)
+            self._index.insert(position, (offset, 1))
+
+    def __contains__(self, period_start: datetime) -> bool:
+        timestamp = _timestamp(period_start)
+        position = bisect_left(self._starts, timestamp)
+        return position < len(self._starts) and self._starts[position] == timestamp
+
+    def append(self, period_start: datetime, period_end: datetime, peaks) -> bool:
+        """Append the (value kW, start) peaks of a closed period unless it is archived already."""
+        if period_start in self or not peaks:
+            return False
+        records = b"".join(
+            RECORD.pack(_timestamp(period_start), _timestamp(period_end), _timestamp(start), value)
+            for value, start in peaks
+        )
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as archive:
+            archive.write(records)
+            archive.flush()
+            os.fsync(archive.fileno())
+        start_ts = _timestamp(period_start)
+        position = bisect_left(self._starts, start_ts)
+        self._starts.insert(position, start_ts)
+        self._index.insert(position, (self._size, len(peaks)))
+        self._size += len(records)
+        return True
+
+    def periods(self, start: datetime | None = None, end: datetime | None = None):
+        """Yield the archived periods starting within [start, end), oldest first."""
+        first = bisect_left(self._starts, _timestamp(start)) if start is not None else 0
+        last = bisect_left(self._starts, _timestamp(end)) if end is not None else len(self._starts)
+        if first >= last:
+            return
+        with open(self.path, "rb") as archive:
+            for offset, count in self._index[first:last]:
+                archive.seek(offset)
+                records = list(RECORD.iter_unpack(archive.read(count * RECORD.size)))
+                peaks = sorted(
+                    ((value, _datetime(peak_start)) for _, _, peak_start, value in records),
+                    key=lambda peak: peak[0],
+                    reverse=True,
+                )
+                yield ArchivedPeriod(_datetime(records[0][0]), _datetime(records[0][1]), peaks)
+
+
+def export_csv(path: str, archives, start: datetime | None = None, end: datetime | None = None) -> int:
+    """Write the periods of several (entry_id, profile key, PeakArchive) triples to one CSV file.
+
+    Periods are streamed from the archives, so memory does not grow with the
+    length of the history. Returns the number of peak rows written.
+    """
+    rows = 0
+    with open(path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(CSV_HEADER)
+        for entry_id, profile, archive in archives:
+            for period in archive.periods(start, end):
+                for rank, (value, peak_start) in enumerate(period.peaks, start=1):
+                    writer.writerow([
+                        entry_id,
+                        profile,
+                        period.start.isoformat(),
+                        period.end.isoformat(),
+                        rank,
+                        value,
+                        peak_start.isoformat(),
+                    ])
+                    rows += 1
+    return rows
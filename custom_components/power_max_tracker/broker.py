@@ -0,0 +1,113 @@
+"""Shared recorder statistics broker for Power Max Tracker."""
+import logging
+from datetime import datetime
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import statistics_during_period
+from homeassistant.const import UnitOfEnergy, UnitOfPower
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, DATA_BROKER
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for other coordinators to queue their requests before querying
+BATCH_DELAY = 0.5
+# Statistics are converted to the units of the live samples, whatever the unit of the source entity
+STATISTICS_UNITS = {"power": UnitOfPower.WATT, "energy": UnitOfEnergy.KILO_WATT_HOUR}
+
+
+def async_get_broker(hass: HomeAssistant) -> "StatisticsBroker":
+    """Return the domain-wide statistics broker, creating it on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    broker = domain_data.get(DATA_BROKER)
+    if broker is None:
+        broker = domain_data[DATA_BROKER] = StatisticsBroker(hass)
+    return broker
+
+
+def row_start(row) -> datetime:
+    """Return the start of a statistics row as an aware UTC datetime."""
+    start = row["start"]
+    if isinstance(start, datetime):
+        return dt_util.as_utc(start)
+    return dt_util.utc_from_timestamp(start)
+
+
+class StatisticsBroker:
+    """Coalesce statistics requests from all config entries into one recorder query."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._pending = {}  # (period, types) -> [(entity_id, start, end, future)]
+        self._flush_handle = None
+
+    async def async_fetch(self, entity_id, start_time, end_time, period="hour", types=("mean",)):
+        """Return the statistics rows of entity_id that start within [start_time, end_time).
+
+        Requests queued within BATCH_DELAY of each other are answered by a single
+        multi-entity statistics_during_period call covering all requested windows.
+        """
+        future = self.hass.loop.create_future()
+        self._pending.setdefault((period, frozenset(types)), []).append(
+            (entity_id, start_time, end_time, future)
+        )
+        if self._flush_handle is None:
+            self._flush_handle = self.hass.loop.call_later(BATCH_DELAY, self._schedule_flush)
+        return await future
+
+    @callback
+    def _schedule_flush(self):
+        """Hand every pending batch to its own query task."""
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for (period, types), requests in pending.items():
+            self.hass.async_create_task(self._async_flush(period, types, requests))
+
+    async def _async_flush(self, period, types, requests):
+        """Run one recorder query for a batch and slice the result per request."""
+        requests = [r for r in requests if not r[3].done()]
+        if not requests:
+            return
+        entity_ids = sorted({r[0] for r in requests})
+        start_time = min(r[1] for r in requests)
+        end_time = max(r[2] for r in requests)
+        _LOGGER.debug("Querying %s statistics for %d entities from %s to %s on behalf of %d requests",
+                      period, len(entity_ids), start_time, end_time, len(requests))
+        try:
+            stats = await get_instance(self.hass).async_add_executor_job(
+                statistics_during_period,
+                self.hass,
+                start_time,
+                end_time,
+                entity_ids,
+                period,
+                STATISTICS_UNITS,
+                set(types),
+            )
+        except Exception as err:
+            _LOGGER.error(f"Statistics query for {entity_ids} failed: {err}")
+            for _, _, _, future in requests:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for entity_id, req_start, req_end, future in requests:
+            if future.done():
+                continue
+            rows = [
+                row for row in stats.get(entity_id, [])
+                if req_start <= row_start(row) < req_end
+            ]
+            future.set_result(rows)
+
+    @callback
+    def async_shutdown(self):
+        """Cancel any scheduled flush and fail outstanding requests."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for requests in self._pending.values():
+            for _, _, _, future in requests:
+                if not future.done():
+                    future.cancel()
+        self._pending.clear()
@@ -3,7 +3,45 @@ import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.const import CONF_ENTITY_ID
 from homeassistant.helpers import selector
-from .const import DOMAIN, CONF_SOURCE_SENSOR, CONF_MONTHLY_RESET, CONF_NUM_MAX_VALUES, CONF_BINARY_SENSOR
+from .const import (
+    DOMAIN,
+    CONF_SOURCE_SENSOR,
+    CONF_MONTHLY_RESET,
+    CONF_NUM_MAX_VALUES,
+    CONF_BINARY_SENSOR,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_DELTA,
+    CONF_PEAK_UNIQUENESS,
+    CONF_WINDOW_MINUTES,
+    CONF_LIVE_WINDOWS,
+    CONF_SCHEDULE_MONTHS,
+    CONF_SCHEDULE_WEEKDAYS,
+    CONF_SCHEDULE_HOURS,
+    CONF_SCHEDULE_HOLIDAYS,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_TICK_INTERVAL,
+    CONF_MAX_HOLD,
+    CONF_PERCENTILES,
+    CONF_ROLLING_DAYS,
+    CONF_SHED_LOADS,
+    CONF_SHED_MIN_ON,
+    CONF_SHED_MIN_OFF,
+    CONF_SHED_HYSTERESIS,
+    DEFAULT_SHED_MIN_ON,
+    DEFAULT_SHED_MIN_OFF,
+    DEFAULT_SHED_HYSTERESIS,
+    DEFAULT_TICK_INTERVAL,
+    DEFAULT_MAX_HOLD,
+    CONF_SOURCE_TYPE,
+    SOURCE_TYPE_POWER,
+    SOURCE_TYPES,
+)
+from .coordinator import build_schedule, source_label, source_sensors
+from .integrator import WINDOW_OPTIONS
+from .peaks import UNIQUENESS_OPTIONS, UNIQUE_WINDOW
+from .shedding import SHED_DOMAINS
+from .sketch import parse_percentiles
 
 class PowerMaxTrackerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle the config flow."""
@@ -22,9 +60,47 @@ class PowerMaxTrackerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     errors={CONF_NUM_MAX_VALUES: "Number of max values must be an integer between 1 and 10"}
                 )
 
-            # Generate a unique title based on the source sensor and a random suffix
-            source_sensor = user_input[CONF_SOURCE_SENSOR]
-            title = f"Power Max Tracker ({source_sensor.split('.')[-1]}-{str(uuid.uuid4())[:8]})"
+            user_input[CONF_ROLLING_DAYS] = int(user_input.get(CONF_ROLLING_DAYS, 0))
+            if user_input[CONF_ROLLING_DAYS] and user_input.get(CONF_MONTHLY_RESET, False):
+                return self.async_show_form(
+                    step_id="user",
+                    data_schema=self._get_schema(),
+                    errors={CONF_ROLLING_DAYS: "A rolling window cannot be combined with the monthly reset"}
+                )
+
+            # Validate the gating schedule
+            user_input[CONF_SCHEDULE_MONTHS] = [int(m) for m in user_input.get(CONF_SCHEDULE_MONTHS, [])]
+            user_input[CONF_SCHEDULE_WEEKDAYS] = [int(d) for d in user_input.get(CONF_SCHEDULE_WEEKDAYS, [])]
+            try:
+                build_schedule(user_input)
+            except ValueError as err:
+                return self.async_show_form(
+                    step_id="user",
+                    data_schema=self._get_schema(),
+                    errors={CONF_SCHEDULE_HOURS: f"Invalid schedule: {err}"}
+                )
+
+            try:
+                user_input[CONF_PERCENTILES] = parse_percentiles(user_input.get(CONF_PERCENTILES))
+            except ValueError as err:
+                return self.async_show_form(
+                    step_id="user",
+                    data_schema=self._get_schema(),
+                    errors={CONF_PERCENTILES: f"Invalid percentiles: {err}"}
+                )
+
+            user_input[CONF_WINDOW_MINUTES] = int(user_input.get(CONF_WINDOW_MINUTES, 60))
+            # Several sources are summed; a single one is stored as a plain entity id
+            sources = source_sensors(user_input)
+            if not sources:
+                return self.async_show_form(
+                    step_id="user",
+                    data_schema=self._get_schema(),
+                    errors={CONF_SOURCE_SENSOR: "At least one source sensor is required"}
+                )
+            user_input[CONF_SOURCE_SENSOR] = sources[0] if len(sources) == 1 else sources
+            # Generate a unique title based on the source sensors and a random suffix
+            title = f"Power Max Tracker ({source_label(user_input)}-{str(uuid.uuid4())[:8]})"
             return self.async_create_entry(title=title, data=user_input)
 
         return self.async_show_form(
@@ -39,10 +115,21 @@ class PowerMaxTrackerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_SOURCE_SENSOR): selector.EntitySelector(
                     selector.EntitySelectorConfig(
                         domain="sensor",
-                        device_class="power"
+                        device_class=["power", "energy"],
+                        multiple=True
+                    )
+                ),
+                vol.Optional(CONF_SOURCE_TYPE, default=SOURCE_TYPE_POWER): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=SOURCE_TYPES, mode=selector.SelectSelectorMode.DROPDOWN, translation_key=CONF_SOURCE_TYPE
                     )
                 ),
                 vol.Optional(CONF_MONTHLY_RESET, default=False): selector.BooleanSelector(),
+                vol.Optional(CONF_ROLLING_DAYS, default=0): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=366, step=1, unit_of_measurement="d", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
                 vol.Required(CONF_NUM_MAX_VALUES, default=2): selector.NumberSelector(
                     selector.NumberSelectorConfig(
                         min=1, max=10, step=1, mode=selector.NumberSelectorMode.BOX
@@ -51,5 +138,76 @@ class PowerMaxTrackerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Optional(CONF_BINARY_SENSOR): selector.EntitySelector(
                     selector.EntitySelectorConfig(domain="binary_sensor")
                 ),
+                vol.Optional(CONF_WINDOW_MINUTES, default="60"): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=[str(minutes) for minutes in WINDOW_OPTIONS], mode=selector.SelectSelectorMode.DROPDOWN
+                    )
+                ),
+                vol.Optional(CONF_LIVE_WINDOWS, default=False): selector.BooleanSelector(),
+                vol.Optional(CONF_PEAK_UNIQUENESS, default=UNIQUE_WINDOW): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=UNIQUENESS_OPTIONS, mode=selector.SelectSelectorMode.DROPDOWN,
+                        translation_key=CONF_PEAK_UNIQUENESS
+                    )
+                ),
+                vol.Optional(CONF_SCHEDULE_MONTHS, default=[]): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=[str(month) for month in range(1, 13)], multiple=True,
+                        mode=selector.SelectSelectorMode.LIST
+                    )
+                ),
+                vol.Optional(CONF_SCHEDULE_WEEKDAYS, default=[]): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=[
+                            selector.SelectOptionDict(value=str(day), label=label)
+                            for day, label in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+                        ],
+                        multiple=True,
+                        mode=selector.SelectSelectorMode.LIST
+                    )
+                ),
+                vol.Optional(CONF_SCHEDULE_HOURS): selector.TextSelector(),
+                vol.Optional(CONF_SCHEDULE_HOLIDAYS): selector.TextSelector(),
+                vol.Optional(CONF_MIN_PUBLISH_INTERVAL, default=0): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=3600, step=1, unit_of_measurement="s", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_MIN_PUBLISH_DELTA, default=0): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=10000, step=1, unit_of_measurement="W", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_TICK_INTERVAL, default=DEFAULT_TICK_INTERVAL): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=3600, step=1, unit_of_measurement="s", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_MAX_HOLD, default=DEFAULT_MAX_HOLD): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=60, max=86400, step=1, unit_of_measurement="s", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_PERCENTILES): selector.TextSelector(),
+                vol.Optional(CONF_SHED_LOADS, default=[]): selector.EntitySelector(
+                    selector.EntitySelectorConfig(domain=SHED_DOMAINS, multiple=True)
+                ),
+                vol.Optional(CONF_SHED_MIN_ON, default=DEFAULT_SHED_MIN_ON): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=86400, step=1, unit_of_measurement="s", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_SHED_MIN_OFF, default=DEFAULT_SHED_MIN_OFF): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=86400, step=1, unit_of_measurement="s", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_SHED_HYSTERESIS, default=DEFAULT_SHED_HYSTERESIS): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=99, step=1, unit_of_measurement="%", mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Optional(CONF_DIAGNOSTIC_SENSORS, default=False): selector.BooleanSelector(),
+                vol.Optional(CONF_EXTERNAL_STATISTICS, default=False): selector.BooleanSelector(),
             }
         )
\ No newline at end of file
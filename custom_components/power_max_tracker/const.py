@@ -2,4 +2,69 @@ DOMAIN = "power_max_tracker"
 CONF_SOURCE_SENSOR = "source_sensor"
 CONF_MONTHLY_RESET = "monthly_reset"
 CONF_NUM_MAX_VALUES = "num_max_values"
-CONF_BINARY_SENSOR = "binary_sensor"
\ No newline at end of file
+CONF_BINARY_SENSOR = "binary_sensor"
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+CONF_MIN_PUBLISH_DELTA = "min_publish_delta"
+CONF_PEAK_UNIQUENESS = "peak_uniqueness"
+CONF_WINDOW_MINUTES = "window_minutes"
+CONF_LIVE_WINDOWS = "live_windows"
+CONF_SCHEDULE_MONTHS = "schedule_months"
+CONF_SCHEDULE_WEEKDAYS = "schedule_weekdays"
+CONF_SCHEDULE_HOURS = "schedule_hours"
+CONF_SCHEDULE_HOLIDAYS = "schedule_holidays"
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+CONF_SOURCE_TYPE = "source_type"
+CONF_EXTERNAL_STATISTICS = "external_statistics"
+CONF_TICK_INTERVAL = "tick_interval"
+CONF_MAX_HOLD = "max_hold"
+CONF_PROFILES = "profiles"
+CONF_PROFILE_NAME = "name"
+CONF_PERCENTILES = "percentiles"
+CONF_ROLLING_DAYS = "rolling_days"
+CONF_SHED_LOADS = "shed_loads"
+CONF_SHED_MIN_ON = "shed_min_on"
+CONF_SHED_MIN_OFF = "shed_min_off"
+CONF_SHED_HYSTERESIS = "shed_hysteresis"
+
+SOURCE_TYPE_POWER = "power"
+SOURCE_TYPE_ENERGY = "energy"
+SOURCE_TYPES = [SOURCE_TYPE_POWER, SOURCE_TYPE_ENERGY]
+
+DATA_BROKER = "broker"
+DATA_DISPATCHER = "dispatcher"
+DATA_TICKER = "ticker"
+
+EVENT_RECOMPUTE_PROGRESS = f"{DOMAIN}_recompute_progress"
+EVENT_PEAK_IMMINENT = f"{DOMAIN}_peak_imminent"
+EVENT_LOAD_SHED = f"{DOMAIN}_load_shed"
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30  # seconds
+
+# Minimum fraction of a window the live integrator must cover to be trusted
+WINDOW_MIN_COVERAGE = 0.99
+# Seconds after a window closes before its recorder statistics are queried
+STATISTICS_DELAY = 60
+# Integrator snapshots older than this (seconds) are discarded on restart
+MAX_RESTORE_AGE = 86400
+# Seconds between ticks that publish the running averages between samples
+DEFAULT_TICK_INTERVAL = 60
+# Seconds the last power of a silent source is held before it is treated as unavailable
+DEFAULT_MAX_HOLD = 3600
+# Seconds after the last state write before a change held back by min_publish_delta is written anyway
+MAX_PUBLISH_AGE = 300
+# Default minimum seconds between pushes to a websocket subscriber
+DEFAULT_LIVE_INTERVAL = 1.0
+# The peak imminent event re-arms once the projection drops this fraction below the lowest peak
+PEAK_IMMINENT_HYSTERESIS = 0.05
+# Default seconds a shed load stays off, and a restored load stays on, before it is switched again
+DEFAULT_SHED_MIN_ON = 300
+DEFAULT_SHED_MIN_OFF = 300
+# Default percentage below the lowest peak the projection must drop to before a load is restored
+DEFAULT_SHED_HYSTERESIS = 10
+# Seconds between load shedding actions, so the meter reflects one before the next is taken
+SHED_SETTLE_TIME = 30
+# Hours of statistics fetched per recorder round-trip when recomputing a range
+RECOMPUTE_CHUNK_HOURS = 744
+# Seconds of binary sensor changes kept to gate closed windows; older windows use the recorder history
+GATE_HISTORY_KEEP = 86400
\ No newline at end of file
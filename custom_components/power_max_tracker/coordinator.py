@@ -1,46 +1,312 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import timedelta
+from functools import partial
 import logging
-from homeassistant.helpers.event import async_track_time_change
-from homeassistant.components.recorder import get_instance
-from homeassistant.components.recorder.statistics import statistics_during_period
-from homeassistant.core import HomeAssistant
+import time
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_point_in_time,
+    async_track_state_change_event,
+    async_track_time_change,
+)
+from homeassistant.components.recorder import get_instance, history
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
-from .const import DOMAIN, CONF_SOURCE_SENSOR, CONF_MONTHLY_RESET, CONF_NUM_MAX_VALUES, CONF_BINARY_SENSOR
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+from .broker import async_get_broker, row_start
+from .dispatcher import async_get_dispatcher
+from .const import (
+    DOMAIN,
+    CONF_SOURCE_SENSOR,
+    CONF_MONTHLY_RESET,
+    CONF_NUM_MAX_VALUES,
+    CONF_BINARY_SENSOR,
+    CONF_PEAK_UNIQUENESS,
+    CONF_WINDOW_MINUTES,
+    CONF_LIVE_WINDOWS,
+    CONF_SCHEDULE_MONTHS,
+    CONF_SCHEDULE_WEEKDAYS,
+    CONF_SCHEDULE_HOURS,
+    CONF_SCHEDULE_HOLIDAYS,
+    CONF_SOURCE_TYPE,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_TICK_INTERVAL,
+    CONF_MAX_HOLD,
+    CONF_PROFILES,
+    CONF_PERCENTILES,
+    CONF_ROLLING_DAYS,
+    CONF_SHED_LOADS,
+    CONF_SHED_MIN_ON,
+    CONF_SHED_MIN_OFF,
+    CONF_SHED_HYSTERESIS,
+    DEFAULT_SHED_MIN_ON,
+    DEFAULT_SHED_MIN_OFF,
+    DEFAULT_SHED_HYSTERESIS,
+    CONF_PROFILE_NAME,
+    SOURCE_TYPE_ENERGY,
+    DEFAULT_TICK_INTERVAL,
+    DEFAULT_MAX_HOLD,
+    EVENT_PEAK_IMMINENT,
+    EVENT_RECOMPUTE_PROGRESS,
+    STORAGE_VERSION,
+    STORAGE_SAVE_DELAY,
+    WINDOW_MIN_COVERAGE,
+    STATISTICS_DELAY,
+    MAX_RESTORE_AGE,
+    PEAK_IMMINENT_HYSTERESIS,
+    RECOMPUTE_CHUNK_HOURS,
+    GATE_HISTORY_KEEP,
+)
+from .engine import StateTimeline, TrackerProfile, fold_window, next_reset_boundary
+from .engine import month_start as local_month_start, next_month_start as local_next_month_start
+from .external_statistics import StatisticsPublisher
+from .integrator import EnergyCounters, SourceSum, WindowIntegrator, window_floor
+from .metrics import TrackerMetrics
+from .peaks import UNIQUE_WINDOW
+from .schedule import GateSchedule
+from .shedding import LoadShedder
+from .sketch import QuantileSketch
+from .tick import async_get_ticker
 
 _LOGGER = logging.getLogger(__name__)
 
+# Unique id suffixes of the sensors the coordinator pushes updates to
+ENTITY_SUFFIXES = (
+    "_source",
+    "_hourly_energy",
+    "_hourly_average_power",
+    "_projected_average_power",
+    "_peak_budget",
+    "_average_max",
+    "_window_percentile",
+)
+# Sensors that follow the live integrator and are flushed at each window boundary
+WINDOW_ENTITY_SUFFIXES = ("_hourly_average_power", "_projected_average_power", "_peak_budget")
+
+
+def source_sensors(data):
+    """Return the configured source entities as a list; a single source may be stored as a string."""
+    sources = data.get(CONF_SOURCE_SENSOR)
+    if isinstance(sources, str):
+        return [sources]
+    return list(sources or [])
+
+
+def source_label(data):
+    """Return a short name of the configured sources for titles and entity names."""
+    return "+".join(entity_id.split(".")[-1] for entity_id in source_sensors(data))
+
+
+def archive_path(hass: HomeAssistant, entry_id, profile_key=""):
+    """Return the path of the peak archive file of a config entry or one of its profiles."""
+    if profile_key:
+        return hass.config.path(".storage", f"{DOMAIN}.{entry_id}.{profile_key}.archive")
+    return hass.config.path(".storage", f"{DOMAIN}.{entry_id}.archive")
+
+
+def profile_key(config):
+    """Return the key of a tracker profile, used in unique ids and storage."""
+    return slugify(config[CONF_PROFILE_NAME])
+
+
+def build_profile(hass: HomeAssistant, entry_id, config, key="", name="", window_minutes=60):
+    """Return a tracker profile configured like a config entry's own peaks, for windows of the entry's length."""
+    return TrackerProfile(
+        key,
+        name,
+        int(config.get(CONF_NUM_MAX_VALUES, 2)),
+        config.get(CONF_PEAK_UNIQUENESS, UNIQUE_WINDOW),
+        config.get(CONF_MONTHLY_RESET, False),
+        config.get(CONF_BINARY_SENSOR),
+        build_schedule(config),
+        archive_path(hass, entry_id, key),
+        config.get(CONF_PERCENTILES, []),
+        int(config.get(CONF_ROLLING_DAYS, 0)),
+        window_minutes,
+    )
+
+
+def month_start(moment):
+    """Return local midnight on the first day of the month containing moment."""
+    return local_month_start(dt_util.as_local(moment))
+
+
+def next_month_start(moment):
+    """Return local midnight on the first day of the month after the one containing moment."""
+    return local_next_month_start(dt_util.as_local(moment))
+
+
+def build_schedule(data):
+    """Return the gating schedule configured in entry data, or None."""
+    keys = (CONF_SCHEDULE_MONTHS, CONF_SCHEDULE_WEEKDAYS, CONF_SCHEDULE_HOURS, CONF_SCHEDULE_HOLIDAYS)
+    if not any(data.get(key) for key in keys):
+        return None
+    return GateSchedule(
+        data.get(CONF_SCHEDULE_MONTHS),
+        data.get(CONF_SCHEDULE_WEEKDAYS),
+        data.get(CONF_SCHEDULE_HOURS),
+        data.get(CONF_SCHEDULE_HOLIDAYS),
+    )
+
+
 class PowerMaxCoordinator:
-    """Coordinator for updating max hourly average power values in kW."""
+    """Coordinator for updating max window average power values in kW."""
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry):
         self.hass = hass
         self.entry = entry
-        self.source_sensor = entry.data[CONF_SOURCE_SENSOR]
-        self.source_sensor_entity_id = None  # Set dynamically after entity registration
-        self.monthly_reset = entry.data.get(CONF_MONTHLY_RESET, False)
-        self.num_max_values = int(entry.data.get(CONF_NUM_MAX_VALUES, 2))  # Cast to int
-        self.binary_sensor = entry.data.get(CONF_BINARY_SENSOR, None)
-        self.max_values = entry.data.get("max_values", [0.0] * self.num_max_values)
-        if len(self.max_values) != self.num_max_values:
-            self.max_values = [0.0] * self.num_max_values
+        self.source_sensors = source_sensors(entry.data)
+        self.source_sensor = ", ".join(self.source_sensors)  # For log messages
+        # Energy meters report cumulative kWh; consumption between readings is integrated exactly
+        self.energy_source = entry.data.get(CONF_SOURCE_TYPE) == SOURCE_TYPE_ENERGY
+        self.source_sum = SourceSum(self.source_sensors)  # Latest power reading per source
+        self.energy_counters = EnergyCounters(self.source_sensors)  # Latest meter reading per source
+        # The entry's own peaks, followed by any named profiles sharing the integrator
+        window_minutes = int(entry.data.get(CONF_WINDOW_MINUTES, 60))
+        self.profile = build_profile(hass, entry.entry_id, entry.data, window_minutes=window_minutes)
+        self.profiles = [self.profile] + [
+            build_profile(hass, entry.entry_id, config, profile_key(config), config[CONF_PROFILE_NAME], window_minutes)
+            for config in entry.data.get(CONF_PROFILES, [])
+        ]
+        self.monthly_reset = self.profile.monthly_reset
+        self.num_max_values = self.profile.num_max_values
+        self.binary_sensor = self.profile.binary_sensor
+        self.schedule = self.profile.schedule
+        self.gate_open = True  # Current schedule state, flipped by a single transition timer
+        self._gate_listeners = []
+        self._gate_unsub = None
+        self.window_minutes = window_minutes
+        # Windows of energy meters are closed once every meter has reported past their end, and
+        # a sum of power sources is a step function that only changes when one of them reports
+        self.integrator = WindowIntegrator(
+            self.window_minutes,
+            len(self.source_sensors) if self.energy_source else 0,
+            hold=len(self.source_sensors) > 1,
+        )
+        # Sub-hour windows are always taken from the integrator; hourly ones on request
+        self.live_windows = self.window_minutes < 60 or entry.data.get(CONF_LIVE_WINDOWS, False)
+        self.peak_store = self.profile.peak_store
+        self.last_window = None  # Start of the last window folded into the peaks
+        self._catch_up_task = None
+        self.integrator_snapshot = None  # Snapshot restored from storage
+        self.window_entities = []  # Live window sensors fed by the integrator
+        self.projected_mean = 0.0  # W the current window ends with at the current draw
+        self.peak_budget = 0.0  # kWh left in the window before it beats the lowest peak
+        self._peak_imminent_armed = True
+        self.tick_interval = int(entry.data.get(CONF_TICK_INTERVAL, DEFAULT_TICK_INTERVAL))
+        self.max_hold = int(entry.data.get(CONF_MAX_HOLD, DEFAULT_MAX_HOLD))
+        self._last_sample_time = None  # Time of the last valid sample of any source
+        self.stalled = False  # Set once the sources were silent for longer than max_hold
+        self._live_listeners = []  # Websocket subscribers of the live values
+        self._live_unload_listeners = []  # Called when the entry is unloaded, so subscribers are ended
+        self.metrics = TrackerMetrics()
+        # Closed window means and the peak average, imported as long-term statistics
+        self.statistics = (
+            StatisticsPublisher(hass, entry.entry_id, f"Power Max {source_label(entry.data)}")
+            if entry.data.get(CONF_EXTERNAL_STATISTICS, False) else None
+        )
+        # Loads turned off in priority order while the window is projected to beat the lowest peak
+        self.shedder = (
+            LoadShedder(
+                hass,
+                entry.entry_id,
+                entry.data[CONF_SHED_LOADS],
+                entry.data.get(CONF_SHED_MIN_ON, DEFAULT_SHED_MIN_ON),
+                entry.data.get(CONF_SHED_MIN_OFF, DEFAULT_SHED_MIN_OFF),
+                entry.data.get(CONF_SHED_HYSTERESIS, DEFAULT_SHED_HYSTERESIS) / 100,
+            )
+            if entry.data.get(CONF_SHED_LOADS) else None
+        )
         self.entities = []  # Store sensor entities
+        self.percentile_entities = []  # Percentile sensors, written after every batch of folded windows
+        self._percentiles_pending = False
         self._listeners = []
+        self._statistics_fetches = {}  # window start -> cancel callback of a delayed query
+        self._recompute_task = None
+        self.recompute_progress = None  # Last reported progress of the recompute service
+        self._broker = async_get_broker(hass)
+        self._dispatcher = async_get_dispatcher(hass)
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+        self.archive = self.profile.archive  # Peaks of closed periods
+        self._save_pending = False
+
+    @property
+    def period_start(self):
+        """Return the start of the month the entry's own peaks belong to."""
+        return self.profile.period_start
+
+    @property
+    def _binary_on(self):
+        """Return the cached state of the entry's binary sensor."""
+        return self.profile.binary_on
+
+    @property
+    def max_values(self):
+        """Return the tracked max values in kW, largest first."""
+        return self.peak_store.values
+
+    @property
+    def peaks(self):
+        """Return the tracked peaks with their window start, largest first."""
+        return self.peak_store.peaks
+
+    async def _async_load_store(self):
+        """Load tracker state, migrating it out of the config entry on first run."""
+        data = await self._store.async_load()
+        if data is None:
+            # Older versions kept the peaks in the config entry; move them once
+            self.peak_store.load(self.entry.data.get("peaks", self.entry.data.get("max_values")), dt_util.parse_datetime)
+            if "max_values" in self.entry.data or "peaks" in self.entry.data:
+                _LOGGER.info(f"Migrating max values of {self.source_sensor} from config entry to storage")
+                await self._store.async_save(self._data_to_save())
+                self.hass.config_entries.async_update_entry(
+                    entry=self.entry,
+                    data={k: v for k, v in self.entry.data.items() if k not in ("max_values", "peaks")}
+                )
+            return
+        self.profile.load(data, dt_util.parse_datetime)
+        for profile in self.profiles[1:]:
+            profile.load(data.get("profiles", {}).get(profile.key), dt_util.parse_datetime)
+        if data.get("last_window"):
+            self.last_window = dt_util.parse_datetime(data["last_window"])
+        self.integrator_snapshot = data.get("integrator")
+        if self.shedder is not None:
+            self.shedder.load(data.get("shedding"))
+
+    @callback
+    def _data_to_save(self):
+        """Return the tracker state to persist."""
+        self._save_pending = False
+        self.integrator_snapshot = self.integrator.snapshot()
+        return {
+            **self.profile.as_dict(),
+            "last_window": self.last_window.isoformat() if self.last_window else None,
+            "integrator": self.integrator_snapshot,
+            "profiles": {profile.key: profile.as_dict() for profile in self.profiles[1:]},
+            "shedding": self.shedder.as_dict() if self.shedder is not None else None,
+        }
+
+    @callback
+    def async_schedule_save(self):
+        """Schedule a coalesced write of the tracker state."""
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    async def async_save(self):
+        """Write the tracker state immediately."""
+        await self._store.async_save(self._data_to_save())
 
     def add_entity(self, entity):
         """Add a sensor entity to the coordinator."""
-        if (entity is not None and
-            hasattr(entity, '_attr_unique_id') and
-            hasattr(entity, 'entity_id') and
-            hasattr(entity, 'async_write_ha_state') and
-            callable(getattr(entity, 'async_write_ha_state', None)) and
-            (entity._attr_unique_id.endswith("_source") or
-             entity._attr_unique_id.endswith("_hourly_energy") or
-             any(entity._attr_unique_id.endswith(f"_max_values_{i+1}") for i in range(self.num_max_values)))):
+        if self._is_valid_entity(entity):
             self.entities.append(entity)
             _LOGGER.debug(f"Added entity {entity.entity_id} with unique_id {entity._attr_unique_id}")
-            if entity._attr_unique_id.endswith("_source"):
-                self.source_sensor_entity_id = entity.entity_id
-                _LOGGER.debug(f"Set source_sensor_entity_id to {self.source_sensor_entity_id}")
+            if entity._attr_unique_id.endswith(WINDOW_ENTITY_SUFFIXES):
+                self.window_entities.append(entity)
+            if entity._attr_unique_id.endswith("_window_percentile"):
+                self.percentile_entities.append(entity)
         else:
             _LOGGER.error(f"Failed to add entity: {entity}, has_unique_id={hasattr(entity, '_attr_unique_id')}, "
                          f"has_entity_id={hasattr(entity, 'entity_id')}, "
@@ -48,24 +314,69 @@ class PowerMaxCoordinator:
                          f"is_callable={callable(getattr(entity, 'async_write_ha_state', None)) if entity else False}")
 
     async def async_setup(self):
-        """Set up hourly update and monthly reset."""
+        """Set up window updates and monthly reset."""
+        await self._async_load_store()
+        for profile in self.profiles:
+            await self.hass.async_add_executor_job(profile.archive.load)
+            if profile.period_start is None:
+                # Stores written before the period was tracked are assumed to be current
+                profile.period_start = month_start(dt_util.now())
+            else:
+                # Month boundaries are stepped on the local clock, across DST changes
+                profile.period_start = dt_util.as_local(profile.period_start)
+        # Rolling peaks that aged out while Home Assistant was down are dropped before they are published
+        self._async_expire_peaks(dt_util.now())
+        watermark = self.last_window
+        restored_from = await self._async_restore_integrator()
+        # Windows before the restored one were missed while Home Assistant was down
+        self._async_schedule_catch_up(watermark, restored_from or window_floor(dt_util.now(), self.window_minutes))
+        if self.schedule is not None:
+            self._async_update_gate()
+        binary_sensors = {profile.binary_sensor for profile in self.profiles if profile.binary_sensor}
+        if binary_sensors:
+            for profile in self.profiles:
+                if profile.binary_sensor:
+                    state = self.hass.states.get(profile.binary_sensor)
+                    profile.binary_on = state is not None and state.state == "on"
+                    if state is not None:
+                        profile.binary_states.record(state.last_changed, profile.binary_on)
+            # One listener serves the binary sensors of all profiles
+            self._listeners.append(
+                async_track_state_change_event(self.hass, list(binary_sensors), self._async_binary_sensor_changed)
+            )
+
+        # One shared subscription per source; sensors subscribe after the coordinator
+        for source in self.source_sensors:
+            self._listeners.append(
+                self._dispatcher.async_subscribe(source, partial(self._async_handle_sample, source))
+            )
+            sample = self._dispatcher.async_last_sample(source)
+            if self.energy_source:
+                self.energy_counters.update(source, sample.time, sample.value)
+            else:
+                self.source_sum.update(source, sample.value)
+
         # Clean invalid entities
         self.entities = [e for e in self.entities if self._is_valid_entity(e)]
         _LOGGER.debug(f"After setup cleanup, {len(self.entities)} valid entities for {self.source_sensor}")
 
-        # Hourly update listener (for max values)
+        # Window boundary listener (closes the live integrator window)
         self._listeners.append(
             async_track_time_change(
                 self.hass,
-                self._async_update_hourly,
+                self._async_window_boundary,
                 hour=None,
-                minute=1,
+                minute=f"/{self.window_minutes}",
                 second=0,
             )
         )
 
+        # One shared timer publishes the running averages of all entries between samples
+        if self.tick_interval > 0:
+            self._listeners.append(async_get_ticker(self.hass).async_add_listener(self._async_tick, self.tick_interval))
+
         # Monthly reset listener (daily at 00:00 to check for 1st of the month)
-        if self.monthly_reset:
+        if any(profile.monthly_reset for profile in self.profiles):
             self._listeners.append(
                 async_track_time_change(
                     self.hass,
@@ -76,6 +387,189 @@ class PowerMaxCoordinator:
                 )
             )
 
+    async def _async_restore_integrator(self):
+        """Resume the in-progress window and fill the downtime from short-term statistics."""
+        now = dt_util.now()
+        if not self.integrator.restore(self.integrator_snapshot, dt_util.parse_datetime):
+            self.integrator.start(now)
+            return None
+        gap_start = self.integrator.last_time
+        if (now - gap_start).total_seconds() > MAX_RESTORE_AGE:
+            _LOGGER.debug(f"Integrator snapshot for {self.source_sensor} from {gap_start} is too old, starting fresh")
+            self.integrator.start(now)
+            return None
+        restored_from = self.integrator.window_start
+
+        # One short-term statistics query covers the whole downtime
+        entity_ids = self.statistics_ids
+        query_start = gap_start.replace(minute=gap_start.minute - gap_start.minute % 5, second=0, microsecond=0)
+        _LOGGER.debug(f"Filling integrator gap for {entity_ids} from {gap_start} to {now}")
+        try:
+            rows = await self._async_fetch_statistics(entity_ids, query_start, now, "5minute")
+        except Exception as err:
+            _LOGGER.warning(f"Could not fill integrator gap for {entity_ids}: {err}")
+            rows = []
+
+        closed = []
+        for row in rows:
+            if row["mean"] is None:
+                continue
+            start = max(row_start(row), gap_start)
+            end = min(row_start(row) + timedelta(minutes=5), now)
+            if start < end:
+                closed.extend(self.integrator.add_segment(start, end, max(0.0, row["mean"])))
+        closed.extend(self.integrator.advance(now))
+        for window in closed:
+            self._async_window_closed(window)
+        _LOGGER.debug(f"Restored integrator for {self.source_sensor} in window {self.integrator.window_start}, "
+                      f"covered {self.integrator.covered:.0f} s")
+        return restored_from
+
+    @callback
+    def _async_schedule_catch_up(self, watermark, end_time):
+        """Process the windows after the watermark up to end_time and any missed monthly reset.
+
+        Runs once the statistics of the last missed window are compiled. The
+        windows from end_time on are closed by the restored integrator.
+        """
+        missed_reset = self._next_reset_boundary() is not None
+        if watermark is None and not missed_reset:
+            return  # First run, nothing was processed before
+        start_time = watermark + self.integrator.window if watermark is not None else end_time
+        if start_time >= end_time and not missed_reset:
+            return
+
+        @callback
+        def _async_start(_now):
+            self._catch_up_task = self.hass.async_create_task(self._async_catch_up(start_time, end_time))
+
+        self._listeners.append(async_call_later(self.hass, STATISTICS_DELAY, _async_start))
+
+    async def _async_catch_up(self, start_time, end_time):
+        """Fold missed windows with batched statistics queries, resetting at missed month boundaries."""
+        entity_ids = self.statistics_ids
+        _LOGGER.info(f"Catching up on windows of {self.source_sensor} from {start_time} to {end_time}")
+        changed = False
+        while True:
+            # Windows before a missed reset belong to the period that reset closes
+            boundary = self._next_reset_boundary()
+            segment_end = min(end_time, boundary) if boundary is not None else end_time
+            if entity_ids and start_time < segment_end:
+                async for chunk_changed, _, _ in self._async_fold_range(entity_ids, start_time, segment_end):
+                    changed |= chunk_changed
+                start_time = segment_end
+            if boundary is None:
+                break
+            _LOGGER.info(f"Performing missed monthly reset of {self.source_sensor} at {boundary}")
+            for profile in self.profiles:
+                if profile.monthly_reset and next_month_start(profile.period_start) == boundary:
+                    await self._async_close_period(profile, boundary)
+            changed = True
+        if changed:
+            self.async_schedule_save()
+            await self._update_entities("catch-up")
+
+    def _next_reset_boundary(self):
+        """Return the earliest month start that is due for a reset of any profile but was missed."""
+        return next_reset_boundary(self.profiles, dt_util.now())
+
+    @callback
+    def _async_update_gate(self, _now=None):
+        """Set the schedule gate state and arm the timer for its next transition."""
+        now = dt_util.now()
+        gate_open = self.schedule.is_open_at(now)
+        changed = gate_open != self.gate_open
+        self.gate_open = gate_open
+        next_transition = self.schedule.next_transition(now)
+        self._gate_unsub = (
+            async_track_point_in_time(self.hass, self._async_update_gate, next_transition)
+            if next_transition is not None else None
+        )
+        _LOGGER.debug(f"Schedule gate for {self.source_sensor} is {'open' if gate_open else 'closed'}, "
+                      f"next transition at {next_transition}")
+        if changed:
+            self._async_gate_changed()
+
+    @callback
+    def _async_binary_sensor_changed(self, event):
+        """Cache the binary sensor state so gate checks need no state lookup."""
+        new_state = event.data["new_state"]
+        binary_on = new_state is not None and new_state.state == "on"
+        changed_at = new_state.last_changed if new_state is not None else dt_util.utcnow()
+        for profile in self.profiles:
+            if profile.binary_sensor == event.data["entity_id"]:
+                # Closed windows are gated by the state at their start, not the current one
+                profile.binary_states.record(changed_at, binary_on)
+        for profile in self.profiles[1:]:
+            if profile.binary_sensor == event.data["entity_id"]:
+                profile.binary_on = binary_on
+        # Only the entry's own binary sensor gates the source mirror and the live values
+        if self.binary_sensor == event.data["entity_id"] and binary_on != self.profile.binary_on:
+            self.profile.binary_on = binary_on
+            self._async_gate_changed()
+
+    @callback
+    def _async_gate_changed(self):
+        """Notify the sensors that the entry's gate opened or closed."""
+        for listener in self._gate_listeners:
+            listener()
+
+    @callback
+    def is_gate_open(self):
+        """Return True if tracking is currently allowed by the schedule and binary sensor."""
+        if self.schedule is not None and not self.gate_open:
+            return False
+        if self.binary_sensor:
+            return self._binary_on
+        return True
+
+    @property
+    def source_power(self):
+        """Return the current summed source power in W, None while a power source is unavailable."""
+        if self.energy_source:
+            return self.energy_counters.rate
+        return self.source_sum.total
+
+    @callback
+    def _async_handle_sample(self, source, sample):
+        """Integrate the source sum after a dispatched sample of one source."""
+        begin = time.perf_counter()
+        if sample.value is not None:
+            self._last_sample_time = sample.time
+            self.stalled = False
+        if self.energy_source:
+            self._async_integrate_energy(source, sample)
+        else:
+            self.async_add_sample(sample.time, self.source_sum.update(source, sample.value))
+        self.metrics.record_event(time.perf_counter() - begin, sample.value is None)
+        for listener in self._live_listeners:
+            listener(sample.time)
+
+    @callback
+    def _async_integrate_energy(self, source, sample):
+        """Integrate the consumption of one meter since its previous reading."""
+        reading = self.energy_counters.update(source, sample.time, sample.value)
+        if reading is None:
+            return
+        last_time, power = reading
+        # Consumption before the current window is credited to the windows still waiting for this meter
+        for window in self.integrator.add_segment(last_time, sample.time, power, 1 / len(self.source_sensors),
+                                                  source):
+            self._async_window_closed(window)
+        self._async_update_projection(sample.time)
+        self.async_schedule_save()
+
+    @callback
+    def async_add_gate_listener(self, listener):
+        """Call a callback whenever the schedule or binary sensor gate changes state."""
+        self._gate_listeners.append(listener)
+
+        @callback
+        def _remove():
+            self._gate_listeners.remove(listener)
+
+        return _remove
+
     def _is_valid_entity(self, entity):
         """Check if an entity is valid for state updates."""
         return (entity is not None and
@@ -83,113 +577,491 @@ class PowerMaxCoordinator:
                 hasattr(entity, 'entity_id') and
                 hasattr(entity, 'async_write_ha_state') and
                 callable(getattr(entity, 'async_write_ha_state', None)) and
-                (entity._attr_unique_id.endswith("_source") or
-                 entity._attr_unique_id.endswith("_hourly_energy") or
-                 any(entity._attr_unique_id.endswith(f"_max_values_{i+1}") for i in range(self.num_max_values))))
-
-    async def _async_update_hourly(self, now):
-        """Calculate hourly average power in kW and update max values if binary sensor allows."""
-        if not self.source_sensor_entity_id:
-            _LOGGER.debug(f"Cannot update hourly stats: source_sensor_entity_id not set for {self.source_sensor}")
+                (entity._attr_unique_id.endswith(ENTITY_SUFFIXES) or
+                 any(entity._attr_unique_id.endswith(f"_max_values_{i+1}")
+                     for i in range(max(profile.num_max_values for profile in self.profiles)))))
+
+    @callback
+    def async_add_sample(self, now, power):
+        """Feed a non-negative power sample in W (None if unavailable) to the live integrator.
+
+        Samples are integrated whatever the gates: each profile applies its own
+        gate when the closed window is folded.
+        """
+        for window in self.integrator.add_sample(now, power):
+            self._async_window_closed(window)
+        self._async_update_projection(now)
+        self.async_schedule_save()
+
+    @callback
+    def _async_update_projection(self, now):
+        """Project the window's final mean at the current draw and warn before it beats the lowest peak."""
+        self.projected_mean = self.integrator.projected_mean(now, self.held_power)
+        threshold = self.peak_store.min_value  # kW, 0 until every peak slot is filled
+        window_hours = self.integrator.window.total_seconds() / 3600
+        self.peak_budget = max(0.0, threshold * window_hours - self.integrator.energy_at(now, self.held_power))
+        projected_kw = self.projected_mean / 1000
+        if projected_kw < threshold * (1 - PEAK_IMMINENT_HYSTERESIS):
+            self._peak_imminent_armed = True
+        elif (self._peak_imminent_armed and threshold > 0 and projected_kw >= threshold and
+              self._can_update_max_values(self.integrator.window_start)):
+            self._peak_imminent_armed = False
+            _LOGGER.debug("Projected %.3f kW for %s reaches the lowest peak of %.3f kW",
+                          projected_kw, self.source_sensor, threshold)
+            self.hass.bus.async_fire(EVENT_PEAK_IMMINENT, {
+                "entry_id": self.entry.entry_id,
+                "window_start": dt_util.as_local(self.integrator.window_start).isoformat(),
+                "projected_power": round(projected_kw, 3),
+                "threshold": threshold,
+                "energy_budget": round(self.peak_budget, 3),
+            })
+        if self.shedder is not None:
+            # Windows outside the gate cannot become peaks, so every shed load is restored
+            gated = self._can_update_max_values(self.integrator.window_start)
+            self.shedder.async_update(now, projected_kw, threshold if gated else 0.0)
+
+    @property
+    def held_power(self):
+        """Return the power in W counted since the last sample, None for the integrator's last power."""
+        if not self.energy_source:
+            return None  # A stalled power source was marked unavailable in the integrator
+        if self.stalled:
+            return 0.0
+        return self.energy_counters.rate
+
+    def window_mean(self, now):
+        """Return the average power in W of the current window so far, holding the last power."""
+        return self.integrator.mean(now, self.held_power)
+
+    @callback
+    def _async_tick(self, now):
+        """Account for the time since the last sample and publish the window sensors once."""
+        if (self._last_sample_time is not None and not self.stalled and
+                (now - self._last_sample_time).total_seconds() > self.max_hold):
+            # Holding the last power any longer would be a guess; leave the rest of the window uncovered
+            self.stalled = True
+            self.metrics.source_stalls += 1
+            _LOGGER.debug("No sample from %s for %d s, treating it as unavailable", self.source_sensor, self.max_hold)
+            if not self.energy_source:
+                self.async_add_sample(self._last_sample_time + timedelta(seconds=self.max_hold), None)
+        self._async_update_projection(now)
+        for entity in self.window_entities:
+            entity.async_tick(now)
+        for listener in self._live_listeners:
+            listener(now)
+
+    @callback
+    def async_add_live_listener(self, listener, unload_listener=None):
+        """Call listener(now) after every sample and tick, returning a callback that removes it.
+
+        unload_listener() is called if the entry is unloaded while the
+        listener is registered.
+        """
+        self._live_listeners.append(listener)
+        if unload_listener is not None:
+            self._live_unload_listeners.append(unload_listener)
+
+        @callback
+        def _remove():
+            if listener in self._live_listeners:
+                self._live_listeners.remove(listener)
+            if unload_listener in self._live_unload_listeners:
+                self._live_unload_listeners.remove(unload_listener)
+
+        return _remove
+
+    def live_values(self, now):
+        """Return the live source power and window values pushed to websocket subscribers."""
+        power = self.source_power
+        gate_open = self.is_gate_open()
+        return {
+            "entry_id": self.entry.entry_id,
+            "time": dt_util.as_local(now).isoformat(),
+            "power": power if power is None or gate_open else 0.0,  # W, as mirrored by the source sensor
+            "gate_open": gate_open,
+            "stalled": self.stalled,
+            "window_start": dt_util.as_local(self.integrator.window_start).isoformat()
+            if self.integrator.window_start else None,
+            "window_average": round(self.window_mean(now) / 1000, 3),  # kW
+            "projected_average": round(self.projected_mean / 1000, 3),  # kW
+            "peak_budget": round(self.peak_budget, 3),  # kWh
+        }
+
+    @callback
+    def _async_window_boundary(self, now):
+        """Close the live integrator window at its boundary."""
+        for entity in self.window_entities:
+            # Publish the closing value of the window before it resets
+            entity.async_flush_window(now)
+        closed = self.integrator.advance(now)
+        # A meter silent for longer than max_hold no longer holds back the windows waiting for it
+        closed.extend(self.integrator.release_pending(now - timedelta(seconds=self.max_hold)))
+        for window in closed:
+            self._async_window_closed(window)
+        # Every window may become a new peak, so the warning is re-armed
+        self._peak_imminent_armed = True
+        if self._async_expire_peaks(now):
+            self.hass.async_create_task(self._update_entities("rolling expiry"))
+        self._async_update_projection(now)
+        for entity in self.window_entities:
+            entity.async_window_started(now)
+        self.async_schedule_save()
+
+    @callback
+    def _async_expire_peaks(self, now):
+        """Drop the rolling peaks older than their profile's window, returning True if any peaks changed."""
+        changed = False
+        for profile in self.profiles:
+            changed |= profile.peak_store.expire(now)
+        if changed:
+            _LOGGER.debug("Rolling peaks of %s expired at %s", self.source_sensor, now)
+            self.async_schedule_save()
+        return changed
+
+    @callback
+    def _async_window_closed(self, window):
+        """Fold a closed window into the peaks, from the integrator or the recorder."""
+        self.metrics.record_window(window.start, (window.end - window.start).total_seconds(), window.coverage)
+        # Older windows are folded from the statistics and gated by the recorded history
+        for profile in self.profiles:
+            profile.binary_states.prune(window.start - timedelta(seconds=GATE_HISTORY_KEEP))
+        if self.live_windows:
+            if window.coverage >= WINDOW_MIN_COVERAGE:
+                if self._fold_window(window.start, window.mean):
+                    self.async_schedule_save()
+                    self.hass.async_create_task(self._update_entities("window update"))
+                self._async_publish_statistics(window.end)
+                return
+            _LOGGER.debug("Integrator covered only %.0f%% of window %s for %s, falling back to recorder statistics",
+                          window.coverage * 100, window.start, self.source_sensor)
+
+        @callback
+        def _async_fetch(_now):
+            """Query the recorder once the window's statistics are compiled."""
+            self._statistics_fetches.pop(window.start, None)
+            self.hass.async_create_task(self._async_update_from_statistics(window.start, window.end))
+
+        if window.start not in self._statistics_fetches:
+            self._statistics_fetches[window.start] = async_call_later(self.hass, STATISTICS_DELAY, _async_fetch)
+
+    def _fold_window(self, window_start, avg_watts, sketches=None, binary_states=None):
+        """Offer a window mean in W to the peaks and sketches of every profile, returning True if any peaks changed.
+
+        Each profile counts a window in its sketch only once, however often
+        and in whatever order it is folded. Past windows are gated by the
+        binary sensor history in binary_states, keyed by profile, if given.
+        """
+        in_order = self._mark_processed(window_start)
+        # Only use non-negative values
+        if avg_watts < 0:
+            _LOGGER.debug("Skipping negative average power: %s W", avg_watts)
+            return False
+        avg_kw = avg_watts / 1000.0  # Convert watts to kW
+        _LOGGER.debug("Average power for window starting %s: %s kW (from %s W)", window_start, avg_kw, avg_watts)
+        # Each profile checks its schedule for the window itself and its binary sensor state
+        changed = fold_window(self.profiles, dt_util.as_local(window_start), avg_kw, sketches, binary_states)
+        self._async_schedule_percentiles()
+        if self.statistics is not None:
+            # The peak average is only the one after this window if no later window was folded yet, or
+            # if a recompute with reset is rebuilding the peaks in order
+            average_max = None
+            if in_order or sketches is not None:
+                values = self.peak_store.values
+                average_max = sum(values) / len(values) if values else 0.0
+            self.statistics.add(window_start, avg_kw, average_max)
+        return changed
+
+    @callback
+    def _async_publish_statistics(self, complete_before):
+        """Import the external statistics of the hours completed by the folded windows."""
+        if self.statistics is not None:
+            self.statistics.async_flush(complete_before)
+
+    def _rows_to_windows(self, rows):
+        """Yield (window start, mean W) for statistics rows, merging 5-minute rows into windows."""
+        if self.window_minutes == 60:
+            for row in rows:
+                if row["mean"] is not None:
+                    yield row_start(row), row["mean"]
             return
+        windows = {}
+        for row in rows:
+            if row["mean"] is None:
+                continue
+            start = window_floor(dt_util.as_local(row_start(row)), self.window_minutes)
+            total, count = windows.get(start, (0.0, 0))
+            windows[start] = (total + row["mean"], count + 1)
+        # Only complete windows are used
+        rows_per_window = self.window_minutes // 5
+        for start in sorted(windows):
+            total, count = windows[start]
+            if count == rows_per_window:
+                yield start, total / count
 
-        end_time = now.replace(minute=0, second=0, microsecond=0)
-        start_time = end_time - timedelta(hours=1)
-
-        _LOGGER.debug(f"Querying hourly stats for {self.source_sensor_entity_id} from {start_time} to {end_time}")
-        stats = await get_instance(self.hass).async_add_executor_job(
-            statistics_during_period,
-            self.hass,
-            start_time,
-            end_time,
-            [self.source_sensor_entity_id],
-            "hour",
-            None,
-            {"mean"},
-        )
+    @property
+    def statistics_ids(self):
+        """Return the entities whose statistics back the peaks.
+
+        These are the sources themselves: their statistics are not gated, like
+        the integrator's samples, and predate the tracker.
+        """
+        return self.source_sensors
 
-        if self.source_sensor_entity_id in stats and stats[self.source_sensor_entity_id] and stats[self.source_sensor_entity_id][0]["mean"] is not None:
-            hourly_avg_watts = stats[self.source_sensor_entity_id][0]["mean"]
-            # Only use non-negative values
-            if hourly_avg_watts >= 0:
-                hourly_avg_kw = hourly_avg_watts / 1000.0  # Convert watts to kW
-                _LOGGER.debug(f"Hourly average power for {start_time} to {end_time}: {hourly_avg_kw} kW (from {hourly_avg_watts} W)")
-                # Check binary sensor state
-                if self._can_update_max_values():
-                    # Insert new value into sorted max_values list
-                    new_max_values = sorted(self.max_values + [hourly_avg_kw], reverse=True)[:self.num_max_values]
-                    if new_max_values != self.max_values:
-                        self.max_values = new_max_values
-                        self.hass.config_entries.async_update_entry(
-                            entry=self.entry,
-                            data={**self.entry.data, "max_values": self.max_values}
-                        )
-                        # Force sensor update
-                        await self._update_entities("hourly update")
-                else:
-                    _LOGGER.debug("Skipping max values update due to binary sensor state")
+    async def _async_fetch_statistics(self, entity_ids, start_time, end_time, period="hour"):
+        """Fetch statistics rows through the broker, summing the means of several entities.
+
+        Rows are only kept for periods where every entity has a mean. The
+        requests are issued together, so the broker answers them with one query.
+        """
+        begin = time.perf_counter()
+        try:
+            if self.energy_source:
+                # The consumption of a period is its sum minus the sum of the period before
+                step = timedelta(hours=1) if period == "hour" else timedelta(minutes=5)
+                results = await asyncio.gather(*(
+                    self._broker.async_fetch(entity_id, start_time - step, end_time, period, ("sum",))
+                    for entity_id in entity_ids
+                ))
+                results = [list(self._sums_to_means(rows, step)) for rows in results]
             else:
-                _LOGGER.debug(f"Skipping negative hourly average power: {hourly_avg_watts} W")
+                results = await asyncio.gather(*(
+                    self._broker.async_fetch(entity_id, start_time, end_time, period) for entity_id in entity_ids
+                ))
+        finally:
+            self.metrics.record_query(time.perf_counter() - begin)
+        if len(results) == 1:
+            return results[0]
+        sums = {}
+        for rows in results:
+            for row in rows:
+                if row["mean"] is not None:
+                    start = row_start(row)
+                    total, count = sums.get(start, (0.0, 0))
+                    sums[start] = (total + row["mean"], count + 1)
+        return [
+            {"start": start, "mean": total}
+            for start, (total, count) in sorted(sums.items()) if count == len(results)
+        ]
+
+    @staticmethod
+    def _sums_to_means(rows, step):
+        """Yield rows with the mean power in W of each period, from consecutive meter sums in kWh.
+
+        The recorder's sums already account for meter resets.
+        """
+        previous_start = previous_sum = None
+        for row in rows:
+            start = row_start(row)
+            if row["sum"] is not None and previous_sum is not None and previous_start + step == start:
+                used = max(0.0, row["sum"] - previous_sum)
+                yield {"start": start, "mean": used * 3600000 / step.total_seconds()}
+            previous_start, previous_sum = start, row["sum"]
+
+    async def _async_update_from_statistics(self, start_time, end_time):
+        """Update max values from the recorder statistics of one closed window."""
+        entity_ids = self.statistics_ids
+        _LOGGER.debug("Querying window stats for %s from %s to %s", entity_ids, start_time, end_time)
+        period = "hour" if self.window_minutes == 60 else "5minute"
+        rows = await self._async_fetch_statistics(entity_ids, start_time, end_time, period)
+        windows = list(self._rows_to_windows(rows))
+
+        if windows:
+            window_start, avg_watts = windows[0]
+            changed = self._fold_window(window_start, avg_watts)
+            self._async_publish_statistics(end_time)
+            if changed:
+                self.async_schedule_save()
+                # Force sensor update
+                await self._update_entities("window update")
         else:
-            _LOGGER.warning(f"No mean statistics found for {self.source_sensor_entity_id} from {start_time} to {end_time}. Stats: {stats}")
+            _LOGGER.warning("No mean statistics found for %s from %s to %s. Rows: %s",
+                            entity_ids, start_time, end_time, rows)
 
     async def async_update_max_values_from_midnight(self):
-        """Update max values from midnight to the current hour."""
-        if not self.source_sensor_entity_id:
-            _LOGGER.debug(f"Cannot update max values: source_sensor_entity_id not set for {self.source_sensor}")
-            return
-
-        now = datetime.now()
-        end_time = now.replace(minute=0, second=0, microsecond=0)
+        """Update max values from midnight to the current window."""
+        entity_ids = self.statistics_ids
+        now = dt_util.now()
+        end_time = window_floor(now, self.window_minutes)
         start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)  # Midnight
-        _LOGGER.debug(f"Updating max values for {self.source_sensor_entity_id} from {start_time} to {end_time}")
-
-        # Calculate number of hours from midnight to current hour
-        hours = (end_time - start_time).seconds // 3600
-        if hours == 0:
-            _LOGGER.debug("No hours to process since midnight")
+        if end_time <= start_time:
+            _LOGGER.debug("No windows to process since midnight")
             return
 
-        new_max_values = self.max_values.copy()
-        for hour in range(hours):
-            hour_start = start_time + timedelta(hours=hour)
-            hour_end = hour_start + timedelta(hours=1)
-            _LOGGER.debug(f"Querying stats for {self.source_sensor_entity_id} from {hour_start} to {hour_end}")
-            stats = await get_instance(self.hass).async_add_executor_job(
-                statistics_during_period,
-                self.hass,
-                hour_start,
-                hour_end,
-                [self.source_sensor_entity_id],
-                "hour",
-                None,
-                {"mean"},
-            )
-
-            if self.source_sensor_entity_id in stats and stats[self.source_sensor_entity_id] and stats[self.source_sensor_entity_id][0]["mean"] is not None:
-                hourly_avg_watts = stats[self.source_sensor_entity_id][0]["mean"]
-                if hourly_avg_watts >= 0:
-                    hourly_avg_kw = hourly_avg_watts / 1000.0  # Convert watts to kW
-                    _LOGGER.debug(f"Hourly average power for {hour_start} to {hour_end}: {hourly_avg_kw} kW (from {hourly_avg_watts} W)")
-                    if self._can_update_max_values():
-                        new_max_values = sorted(new_max_values + [hourly_avg_kw], reverse=True)[:self.num_max_values]
-                    else:
-                        _LOGGER.debug("Skipping max values update due to binary sensor state")
-                else:
-                    _LOGGER.debug(f"Skipping negative hourly average power: {hourly_avg_watts} W")
-            else:
-                _LOGGER.warning(f"No mean statistics found for {self.source_sensor_entity_id} from {hour_start} to {hour_end}. Stats: {stats}")
+        # One request for the whole range; the broker merges it with other entries
+        _LOGGER.debug(f"Updating max values for {entity_ids} from {start_time} to {end_time}")
+        changed = False
+        async for chunk_changed, _, _ in self._async_fold_range(entity_ids, start_time, end_time):
+            changed |= chunk_changed
 
         # Update max values if changed
-        if new_max_values != self.max_values:
-            self.max_values = new_max_values
-            self.hass.config_entries.async_update_entry(
-                entry=self.entry,
-                data={**self.entry.data, "max_values": self.max_values}
-            )
+        if changed:
+            self.async_schedule_save()
             # Force sensor update
             await self._update_entities("midnight update")
 
+    async def _async_fold_range(self, entity_ids, start_time, end_time, sketches=None):
+        """Fold the statistics of [start_time, end_time) into the peaks in bounded chunks.
+
+        Yields (changed, windows folded, end of chunk) after each chunk, so only
+        one chunk of rows is held in memory however long the range is. Chunks
+        are whole hours, so they never split a window. Window means are counted
+        in sketches, keyed by profile, if given.
+        """
+        period = "hour" if self.window_minutes == 60 else "5minute"
+        chunk = timedelta(hours=RECOMPUTE_CHUNK_HOURS)
+        chunk_start = start_time
+        while chunk_start < end_time:
+            chunk_end = min(end_time, chunk_start + chunk)
+            rows = await self._async_fetch_statistics(entity_ids, chunk_start, chunk_end, period)
+            binary_states = await self._async_fetch_binary_states(chunk_start, chunk_end)
+            changed = False
+            windows = 0
+            for window_start, avg_watts in self._rows_to_windows(rows):
+                changed |= self._fold_window(window_start, avg_watts, sketches, binary_states)
+                windows += 1
+            self._async_publish_statistics(chunk_end)
+            yield changed, windows, chunk_end
+            chunk_start = chunk_end
+
+    async def _async_fetch_binary_states(self, start_time, end_time):
+        """Return the recorded timeline of each profile's binary sensor over a range, keyed by profile.
+
+        Returns None without binary sensors. A sensor without recorded history
+        falls back to its recent changes, then to its current state.
+        """
+        entity_ids = sorted({profile.binary_sensor for profile in self.profiles if profile.binary_sensor})
+        if not entity_ids:
+            return None
+        states = await get_instance(self.hass).async_add_executor_job(partial(
+            history.get_significant_states, self.hass, start_time, end_time, entity_ids,
+            significant_changes_only=False, no_attributes=True,
+        ))
+        timelines = {}
+        for entity_id in entity_ids:
+            timeline = timelines[entity_id] = StateTimeline()
+            for state in states.get(entity_id, ()):
+                timeline.record(state.last_changed, state.state == "on")
+        return {profile.key: timelines[profile.binary_sensor] for profile in self.profiles if profile.binary_sensor}
+
+    async def async_recompute(self, start_time, end_time=None, reset=False):
+        """Recompute the peaks from the statistics between start_time and end_time.
+
+        The work runs in a task owned by the coordinator: a new recompute of
+        the same entry or unloading the entry cancels it.
+        """
+        if self._recompute_task is not None and not self._recompute_task.done():
+            _LOGGER.info(f"Cancelling running recompute for {self.source_sensor}")
+            self._recompute_task.cancel()
+        self._recompute_task = self.hass.async_create_task(
+            self._async_recompute(start_time, end_time or dt_util.now(), reset)
+        )
+        # Wait without propagating the cancellation of the task to the caller
+        await asyncio.wait([self._recompute_task])
+
+    async def _async_recompute(self, start_time, end_time, reset):
+        """Fold a long range of statistics into the peaks, reporting progress per chunk."""
+        entity_ids = self.statistics_ids
+        # Only complete windows are folded
+        start_time = window_floor(dt_util.as_local(start_time), self.window_minutes)
+        end_time = window_floor(dt_util.as_local(min(end_time, dt_util.now())), self.window_minutes)
+        if end_time <= start_time:
+            _LOGGER.warning(f"Nothing to recompute for {self.source_sensor} from {start_time} to {end_time}")
+            return
+
+        if self.window_minutes < 60:
+            # Shorter windows are merged from 5-minute statistics, which the recorder purges after keep_days
+            kept_from = dt_util.now() - timedelta(days=get_instance(self.hass).keep_days)
+            if start_time < kept_from:
+                _LOGGER.warning(f"Recompute for {self.source_sensor} starts at {start_time}, but the 5-minute "
+                                f"statistics of {self.window_minutes}-minute windows are only kept since "
+                                f"{kept_from}; earlier windows are missing")
+        _LOGGER.info(f"Recomputing max values for {entity_ids} from {start_time} to {end_time}")
+        changed = reset
+        # A reset rebuilds the sketches from the range, merging in one chunk at a time
+        sketches = None
+        if reset:
+            sketches = {profile.key: QuantileSketch() for profile in self.profiles}
+            for profile in self.profiles:
+                profile.clear()
+        windows = 0
+        processed_until = start_time
+        self._async_report_progress(start_time, end_time, processed_until, windows, "running")
+        try:
+            async for chunk_changed, chunk_windows, processed_until in self._async_fold_range(
+                entity_ids, start_time, end_time, sketches
+            ):
+                if sketches is not None:
+                    for profile in self.profiles:
+                        profile.sketch.merge(sketches[profile.key])
+                        sketches[profile.key].clear()
+                changed |= chunk_changed
+                windows += chunk_windows
+                self._async_report_progress(start_time, end_time, processed_until, windows, "running")
+        except asyncio.CancelledError:
+            self._async_report_progress(start_time, end_time, processed_until, windows, "cancelled")
+            raise
+        except Exception as err:
+            _LOGGER.error(f"Recompute for {self.source_sensor} failed: {err}")
+            self._async_report_progress(start_time, end_time, processed_until, windows, "failed")
+        else:
+            self._async_report_progress(start_time, end_time, end_time, windows, "done")
+            if self.recompute_progress["missing"]:
+                _LOGGER.warning(f"Recompute for {self.source_sensor} found no statistics for "
+                                f"{self.recompute_progress['missing']} of {self.recompute_progress['expected']} "
+                                f"windows from {start_time} to {end_time}; the peaks only cover the others")
+        finally:
+            if changed:
+                self.async_schedule_save()
+                self.hass.async_create_task(self._update_entities("recompute"))
+
+    @callback
+    def _async_report_progress(self, start_time, end_time, processed_until, windows, state):
+        """Publish recompute progress as an event and keep it for diagnostics.
+
+        Windows without statistics up to processed_until, e.g. purged or
+        recorded while the source was unavailable, are reported as missing.
+        """
+        total = (end_time - start_time).total_seconds()
+        # Counted in UTC, so the windows of a DST change are counted right
+        elapsed = dt_util.as_utc(processed_until) - dt_util.as_utc(start_time)
+        expected = int(elapsed.total_seconds() // (self.window_minutes * 60))
+        self.recompute_progress = {
+            "entry_id": self.entry.entry_id,
+            "state": state,
+            "start": start_time.isoformat(),
+            "end": end_time.isoformat(),
+            "processed_until": processed_until.isoformat(),
+            "progress": round((processed_until - start_time).total_seconds() / total, 4),
+            "windows": windows,
+            "expected": expected,
+            "missing": max(0, expected - windows),
+        }
+        self.hass.bus.async_fire(EVENT_RECOMPUTE_PROGRESS, self.recompute_progress)
+
+    def _mark_processed(self, window_start):
+        """Advance the last processed window watermark, returning True if the window is after it."""
+        if self.last_window is None or window_start > self.last_window:
+            self.last_window = window_start
+            self.async_schedule_save()
+            return True
+        return False
+
+    @callback
+    def _async_schedule_percentiles(self):
+        """Write the percentile sensors once the current batch of windows is folded."""
+        if self.percentile_entities and not self._percentiles_pending:
+            self._percentiles_pending = True
+            self.hass.loop.call_soon(self._async_write_percentiles)
+
+    @callback
+    def _async_write_percentiles(self):
+        """Write the state of the percentile sensors."""
+        self._percentiles_pending = False
+        for entity in self.percentile_entities:
+            if entity.hass is not None:
+                entity.async_write_ha_state()
+                self.metrics.state_writes += 1
+
     async def _update_entities(self, update_type: str):
         """Update all valid entities and log the process."""
         # Filter and clean invalid entities
@@ -199,40 +1071,102 @@ class PowerMaxCoordinator:
             _LOGGER.warning(f"Removed {len(self.entities) - len(valid_entities)} invalid entities from coordinator for {self.source_sensor}")
             self.entities = valid_entities
 
-        _LOGGER.debug(f"Processing {update_type} for {len(valid_entities)} valid entities")
+        _LOGGER.debug("Processing %s for %d valid entities", update_type, len(valid_entities))
         for entity in valid_entities:
-            _LOGGER.debug(f"Updating entity {entity.entity_id} with unique_id {entity._attr_unique_id}")
+            _LOGGER.debug("Updating entity %s with unique_id %s", entity.entity_id, entity._attr_unique_id)
             try:
                 self.hass.async_add_job(entity.async_write_ha_state)
+                self.metrics.state_writes += 1
             except Exception as e:
                 _LOGGER.error(f"Failed to schedule state update for entity {entity.entity_id} with unique_id {entity._attr_unique_id}: {e}")
         if not valid_entities:
             _LOGGER.error(f"No valid entities found for {update_type} for {self.source_sensor}")
 
-    def _can_update_max_values(self):
-        """Check if max values can be updated based on binary sensor state."""
-        if not self.binary_sensor:
-            return True  # No binary sensor configured, allow updates
-        state = self.hass.states.get(self.binary_sensor)
-        if state is None or state.state == "unavailable":
-            _LOGGER.debug(f"Binary sensor {self.binary_sensor} is unavailable")
-            return False
-        return state.state == "on"  # Only update if sensor is True (on)
+    def _can_update_max_values(self, window_start=None):
+        """Check if max values can be updated based on the schedule and binary sensor state."""
+        return self.profile.can_fold(dt_util.as_local(window_start) if window_start is not None else None)
 
     async def _async_reset_monthly(self, now):
         """Reset max values if it's the 1st of the month."""
-        if self.monthly_reset and now.day == 1:
-            _LOGGER.info(f"Performing monthly reset of {self.num_max_values} max values")
-            self.max_values = [0.0] * self.num_max_values
-            self.hass.config_entries.async_update_entry(
-                entry=self.entry,
-                data={**self.entry.data, "max_values": self.max_values}
-            )
+        if now.day != 1:
+            return
+        changed = False
+        for profile in self.profiles:
+            # A reset already done by the catch-up after a restart is not repeated
+            if profile.monthly_reset and profile.period_start < month_start(now):
+                _LOGGER.info(f"Performing monthly reset of {profile.num_max_values} max values")
+                await self._async_close_period(profile, month_start(now))
+                changed = True
+        if changed:
+            self.async_schedule_save()
             # Force sensor update
             await self._update_entities("monthly reset")
 
+    async def _async_close_period(self, profile, period_end):
+        """Archive a profile's peaks as the period ending at period_end and start a new one."""
+        period_start = profile.period_start or month_start(period_end - timedelta(days=1))
+        # Peaks kept by old versions have no start; they are dated to the period
+        peaks = [(peak.value, peak.start or period_start) for peak in profile.peak_store.peaks]
+        try:
+            if await self.hass.async_add_executor_job(profile.archive.append, period_start, period_end, peaks):
+                _LOGGER.debug(f"Archived {len(peaks)} peaks of {self.source_sensor} for {period_start}")
+        except OSError as err:
+            _LOGGER.error(f"Could not archive peaks of {self.source_sensor} for {period_start}: {err}")
+        profile.clear()
+        profile.period_start = period_end
+
+    async def async_get_peak_history(self, start_time=None, end_time=None):
+        """Return the archived periods starting within [start_time, end_time) and the current peaks.
+
+        Named profiles are returned under "profiles", keyed by profile.
+        """
+        history = await self._async_get_profile_history(self.profile, start_time, end_time)
+        if len(self.profiles) > 1:
+            history["profiles"] = {
+                profile.key: await self._async_get_profile_history(profile, start_time, end_time)
+                for profile in self.profiles[1:]
+            }
+        return history
+
+    async def _async_get_profile_history(self, profile, start_time, end_time):
+        """Return the archived periods and current peaks of one profile."""
+        periods = await self.hass.async_add_executor_job(
+            lambda: list(profile.archive.periods(start_time, end_time))
+        )
+        return {
+            "periods": [
+                {
+                    "start": dt_util.as_local(period.start).isoformat(),
+                    "end": dt_util.as_local(period.end).isoformat(),
+                    "peaks": [
+                        {"value": value, "start": dt_util.as_local(start).isoformat()}
+                        for value, start in period.peaks
+                    ],
+                }
+                for period in periods
+            ],
+            "current": [
+                {"value": peak.value, "start": peak.start.isoformat() if peak.start else None}
+                for peak in profile.peak_store.peaks
+            ],
+        }
+
     def async_unload(self):
         """Unload listeners."""
         for listener in self._listeners:
             listener()
-        self._listeners.clear()
\ No newline at end of file
+        self._listeners.clear()
+        # Subscribers are ended rather than left waiting for values that never come
+        for unload_listener in list(self._live_unload_listeners):
+            unload_listener()
+        self._live_listeners.clear()
+        self._live_unload_listeners.clear()
+        for cancel in self._statistics_fetches.values():
+            cancel()
+        self._statistics_fetches.clear()
+        for task in (self._recompute_task, self._catch_up_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._gate_unsub is not None:
+            self._gate_unsub()
+            self._gate_unsub = None
\ No newline at end of file
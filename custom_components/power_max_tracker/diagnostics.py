@@ -0,0 +1,31 @@
+"""Diagnostics support for Power Max Tracker."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return runtime counters and tracker state for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "config": dict(entry.data),
+        "metrics": coordinator.metrics.as_dict(),
+        "peaks": coordinator.peak_store.as_list(),
+        "last_window": coordinator.last_window.isoformat() if coordinator.last_window else None,
+        "period_start": coordinator.period_start.isoformat() if coordinator.period_start else None,
+        "sketch": coordinator.profile.sketch.as_dict(),
+        "integrator": coordinator.integrator.snapshot(),
+        "live_windows": coordinator.live_windows,
+        "gate_open": coordinator.gate_open if coordinator.schedule is not None else None,
+        "recompute": coordinator.recompute_progress,
+        "shedding": coordinator.shedder.as_dict() if coordinator.shedder is not None else None,
+        "archived_periods": len(coordinator.archive),
+        "profiles": {
+            profile.key: {
+                **profile.as_dict(),
+                "binary_on": profile.binary_on if profile.binary_sensor else None,
+                "archived_periods": len(profile.archive),
+            }
+            for profile in coordinator.profiles[1:]
+        },
+    }
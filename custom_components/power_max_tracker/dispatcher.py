@@ -0,0 +1,110 @@
+"""Shared source state subscription with parsed-sample fan-out."""
+import logging
+from datetime import datetime
+from typing import NamedTuple
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, DATA_DISPATCHER
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# Factors to the base units: W for power sources, kWh for energy meters
+UNIT_FACTORS = {"W": 1.0, "kW": 1000.0, "MW": 1000000.0, "Wh": 0.001, "kWh": 1.0, "MWh": 1000.0}
+
+
+class Sample(NamedTuple):
+    """A parsed source reading."""
+
+    time: datetime  # UTC
+    value: float | None  # Non-negative W or kWh, None if unavailable or invalid
+
+
+def async_get_dispatcher(hass: HomeAssistant) -> "SourceDispatcher":
+    """Return the domain-wide source dispatcher, creating it on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    dispatcher = domain_data.get(DATA_DISPATCHER)
+    if dispatcher is None:
+        dispatcher = domain_data[DATA_DISPATCHER] = SourceDispatcher(hass)
+    return dispatcher
+
+
+def parse_value(entity_id, state) -> float | None:
+    """Return the non-negative value of a state in W or kWh, or None if it is not usable."""
+    if state is None or state.state in ("unavailable", "unknown"):
+        _LOGGER.debug("Source sensor %s unavailable or unknown", entity_id)
+        return None
+    try:
+        value = max(0.0, float(state.state))  # Ignore negative values
+    except (ValueError, TypeError):
+        _LOGGER.warning("Invalid state for %s: %s", entity_id, state.state)
+        return None
+    # Sensors without a known unit are taken to report W or kWh
+    return value * UNIT_FACTORS.get(state.attributes.get("unit_of_measurement"), 1.0)
+
+
+class SourceDispatcher:
+    """Subscribe once per source entity and fan each parsed sample out to all listeners.
+
+    Listeners are called synchronously in subscription order, so a coordinator
+    that subscribes before its sensors has integrated a sample before the
+    sensors publish it.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._listeners = {}  # entity_id -> (callback(Sample), ...), rebuilt on (un)subscribe
+        self._unsubs = {}  # entity_id -> state change unsubscribe
+        self._last_samples = {}  # entity_id -> Sample
+
+    @callback
+    def async_subscribe(self, entity_id, listener):
+        """Call listener with a Sample on every state change of entity_id."""
+        self._listeners[entity_id] = self._listeners.get(entity_id, ()) + (listener,)
+        if entity_id not in self._unsubs:
+            state = self.hass.states.get(entity_id)
+            self._last_samples[entity_id] = Sample(
+                state.last_updated if state is not None else dt_util.utcnow(), parse_value(entity_id, state)
+            )
+            self._unsubs[entity_id] = async_track_state_change_event(
+                self.hass, [entity_id], self._async_state_changed
+            )
+
+        @callback
+        def _unsubscribe():
+            listeners = list(self._listeners.get(entity_id, ()))
+            if listener in listeners:
+                listeners.remove(listener)
+            self._listeners[entity_id] = tuple(listeners)
+            if not listeners:
+                self._listeners.pop(entity_id, None)
+                self._last_samples.pop(entity_id, None)
+                unsub = self._unsubs.pop(entity_id, None)
+                if unsub is not None:
+                    unsub()
+
+        return _unsubscribe
+
+    @callback
+    def async_last_sample(self, entity_id) -> Sample | None:
+        """Return the most recent sample of a subscribed entity."""
+        return self._last_samples.get(entity_id)
+
+    @callback
+    def _async_state_changed(self, event: Event):
+        """Parse the new state carried by the event once and fan it out.
+
+        Samples are stamped with the time the state was updated rather than
+        the time the event is handled, but never before the previous sample.
+        """
+        entity_id = event.data["entity_id"]
+        new_state = event.data["new_state"]
+        updated = new_state.last_updated if new_state is not None else dt_util.utcnow()
+        previous = self._last_samples.get(entity_id)
+        if previous is not None and updated < previous.time:
+            updated = previous.time
+        sample = Sample(updated, parse_value(entity_id, new_state))
+        self._last_samples[entity_id] = sample
+        for listener in self._listeners.get(entity_id, ()):
+            listener(sample)
@@ -0,0 +1,247 @@
+"""Peak tracking core shared by the integration and the offline audit tool.
+
+Nothing here depends on Home Assistant: windows are integrated by the
+WindowIntegrator, gated by each profile's schedule and binary sensor state,
+clamped to non-negative means and folded into bounded top-K stores and
+quantile sketches that are archived and cleared at month boundaries.
+"""
+import bisect
+from datetime import datetime, timedelta
+
+from .archive import PeakArchive
+from .integrator import WindowIntegrator
+from .peaks import PeakStore, RollingPeakStore, UNIQUE_WINDOW
+from .schedule import GateSchedule
+from .sketch import COUNTED_HORIZON_DAYS, CountedWindows, QuantileSketch
+
+
+def month_start(moment: datetime) -> datetime:
+    """Return midnight on the first day of the month containing moment, in moment's time zone."""
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month_start(moment: datetime) -> datetime:
+    """Return midnight on the first day of the month after the one containing moment."""
+    return month_start(month_start(moment) + timedelta(days=32))
+
+
+class StateTimeline:
+    """On/off changes of a binary sensor, to gate each window by the state at its start."""
+
+    def __init__(self):
+        self._times = []
+        self._states = []
+
+    def record(self, moment: datetime, on: bool):
+        """Record that the state became on or off at moment, in any order."""
+        index = bisect.bisect_right(self._times, moment)
+        if index and self._times[index - 1] == moment:
+            self._states[index - 1] = on
+            return
+        self._times.insert(index, moment)
+        self._states.insert(index, on)
+
+    def state_at(self, moment: datetime, default: bool | None = None) -> bool | None:
+        """Return the state at moment, or default if nothing was recorded before it."""
+        index = bisect.bisect_right(self._times, moment)
+        return self._states[index - 1] if index else default
+
+    def prune(self, before: datetime):
+        """Drop the changes before the one in effect at before."""
+        index = bisect.bisect_right(self._times, before) - 1
+        if index > 0:
+            del self._times[:index]
+            del self._states[:index]
+
+
+class TrackerProfile:
+    """One set of peaks with its own gate, size and reset policy.
+
+    Profiles do not integrate anything themselves: every closed window mean
+    of the entry is offered to each profile, which folds it if its gate was
+    open at the start of the window. With rolling_days the peaks are those of
+    the last rolling_days days instead, and expire as they age out.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        num_max_values: int = 2,
+        uniqueness: str = UNIQUE_WINDOW,
+        monthly_reset: bool = False,
+        binary_sensor: str | None = None,
+        schedule: GateSchedule | None = None,
+        archive_path: str | None = None,
+        percentiles=(),
+        rolling_days: int = 0,
+        window_minutes: int = 60,
+    ):
+        self.key = key  # "" for the entry's own tracker
+        self.name = name
+        self.num_max_values = num_max_values
+        self.monthly_reset = monthly_reset
+        self.binary_sensor = binary_sensor
+        self.schedule = schedule
+        self.binary_on = False  # Cached binary sensor state
+        self.binary_states = StateTimeline()  # Recent binary sensor changes, to gate closed windows
+        self.rolling_days = rolling_days
+        self.window_minutes = window_minutes  # Length of the windows whose means are folded
+        if rolling_days:
+            self.peak_store = RollingPeakStore(num_max_values, uniqueness, rolling_days)
+        else:
+            self.peak_store = PeakStore(num_max_values, uniqueness)
+        self.period_start = None  # Start of the month the current peaks belong to
+        self.archive = PeakArchive(archive_path) if archive_path else None
+        self.percentiles = tuple(percentiles)  # Percentiles of the window means exposed as sensors
+        self.sketch = QuantileSketch()  # Distribution of the window means folded this period
+        # Windows already counted in the distribution, remembered over the rolling period or a month
+        self.counted = CountedWindows(window_minutes, rolling_days or COUNTED_HORIZON_DAYS)
+
+    def can_fold(self, window_start: datetime | None = None, binary_states: StateTimeline | None = None) -> bool:
+        """Return True if a window starting at the given local time may update the peaks.
+
+        The binary sensor is checked at the start of the window: in the
+        recorded binary_states if given, else in the recent changes, else by
+        its current state.
+        """
+        if self.schedule is not None and window_start is not None and not self.schedule.is_open_at(window_start):
+            return False
+        if not self.binary_sensor:
+            return True
+        if window_start is None:
+            return self.binary_on
+        binary_on = binary_states.state_at(window_start) if binary_states is not None else None
+        if binary_on is None:
+            binary_on = self.binary_states.state_at(window_start, self.binary_on)
+        return binary_on
+
+    def as_dict(self) -> dict:
+        """Return the profile state to persist."""
+        return {
+            "peaks": self.peak_store.as_list(),
+            "period_start": self.period_start.isoformat() if self.period_start else None,
+            "sketch": self.sketch.as_dict(),
+            "counted": self.counted.as_dict(),
+        }
+
+    def load(self, data: dict | None, parse_datetime=datetime.fromisoformat):
+        """Restore the profile state from as_dict() output."""
+        data = data or {}
+        self.peak_store.load(data.get("peaks"), parse_datetime)
+        self.sketch.load(data.get("sketch"))
+        self.counted.load(data.get("counted"), parse_datetime)
+        if data.get("period_start"):
+            self.period_start = parse_datetime(data["period_start"])
+
+    def clear(self):
+        """Drop the peaks and window distribution of the current period."""
+        self.peak_store.clear()
+        self.sketch.clear()
+        self.counted.clear()
+
+
+def fold_window(profiles, window_start: datetime, mean_kw: float, sketches=None, binary_states=None) -> bool:
+    """Offer a window mean in kW starting at a local time to every profile, returning True if any peaks changed.
+
+    Negative means are ignored. Windows already tracked are ignored by the
+    peaks, so folding a range again is idempotent. The mean is also counted
+    in the sketch of each profile that folds it, once per window, or in
+    sketches[profile.key] if a mapping is given: a recompute counts into its
+    own sketches and merges them. Past windows are gated by the recorded
+    binary sensor states in binary_states[profile.key], if given.
+    """
+    if mean_kw < 0:
+        return False
+    changed = False
+    for profile in profiles:
+        if profile.can_fold(window_start, binary_states.get(profile.key) if binary_states else None):
+            changed |= profile.peak_store.add(window_start, mean_kw)
+            sketch = profile.sketch if sketches is None else sketches.get(profile.key)
+            if sketch is not None and profile.counted.add(window_start):
+                sketch.add(mean_kw)
+    return changed
+
+
+def next_reset_boundary(profiles, now: datetime) -> datetime | None:
+    """Return the earliest month start up to now at which a profile's peaks are due to be reset."""
+    boundary = min(
+        (next_month_start(profile.period_start) for profile in profiles
+         if profile.monthly_reset and profile.period_start is not None),
+        default=None,
+    )
+    return boundary if boundary is not None and boundary <= now else None
+
+
+class PeakEngine:
+    """Stream of samples or window means folded into the peaks of several profiles.
+
+    Used offline, where no recorder or timers exist: month boundaries are
+    crossed as windows arrive in time order, and the peaks of every period a
+    profile closes are kept in closed_periods as (profile key, period start,
+    period end, [Peak]).
+    """
+
+    def __init__(self, profiles, window_minutes: int = 60, tz=None, min_coverage: float = 0.0, max_hold=None):
+        self.profiles = list(profiles)
+        self.integrator = WindowIntegrator(window_minutes)
+        self.tz = tz  # Time zone of the local wall clock; gates and months follow it
+        self.min_coverage = min_coverage
+        self.max_hold = timedelta(seconds=max_hold) if max_hold else None
+        self.closed_periods = []
+
+    def add_sample(self, now: datetime, watts: float | None):
+        """Integrate a power sample in W, folding the windows it closes.
+
+        As in the integration, the last power is held for at most max_hold
+        seconds; the rest of a longer silence is left uncovered.
+        """
+        if watts is not None:
+            watts = max(0.0, watts)
+        # Windows are aligned on the local wall clock, as in the integration
+        now = now.astimezone(self.tz)
+        if (self.max_hold is not None and self.integrator.last_power is not None and
+                now - self.integrator.last_time > self.max_hold):
+            self._fold(self.integrator.add_sample(self.integrator.last_time + self.max_hold, None))
+        self._fold(self.integrator.add_sample(now, watts))
+
+    def _fold(self, windows):
+        """Fold the closed windows backed by enough samples."""
+        for window in windows:
+            if window.coverage >= self.min_coverage:
+                self.add_window(window.start, window.mean)
+
+    def add_window(self, window_start: datetime, mean_watts: float) -> bool:
+        """Fold a closed window mean in W, closing the periods that ended before it."""
+        local_start = window_start.astimezone(self.tz)
+        for profile in self.profiles:
+            if profile.period_start is None:
+                profile.period_start = month_start(local_start)
+        while (boundary := next_reset_boundary(self.profiles, local_start)) is not None:
+            self.close_period(boundary)
+        return fold_window(self.profiles, local_start, mean_watts / 1000.0)
+
+    def close_period(self, period_end: datetime):
+        """Close the periods of the profiles that reset at period_end."""
+        for profile in self.profiles:
+            if profile.monthly_reset and next_month_start(profile.period_start) == period_end:
+                self.closed_periods.append((profile.key, profile.period_start, period_end, profile.peak_store.peaks))
+                profile.clear()
+                profile.period_start = period_end
+
+    def current_periods(self, end: datetime | None = None):
+        """Return the still open period of every profile as (profile key, period start, end, [Peak]).
+
+        For rolling profiles the period is the rolling_days before end, and
+        peaks older than that are expired first.
+        """
+        periods = []
+        for profile in self.profiles:
+            if profile.period_start is None:
+                continue
+            start = profile.period_start
+            if profile.rolling_days and end is not None:
+                profile.peak_store.expire(end)
+                start = max(start, end - timedelta(days=profile.rolling_days))
+            periods.append((profile.key, start, end, profile.peak_store.peaks))
+        return periods
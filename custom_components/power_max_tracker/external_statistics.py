@@ -0,0 +1,86 @@
+"""Long-term external statistics of closed window means and the running peak average."""
+import logging
+from datetime import timedelta
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import UnitOfPower
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+
+def statistic_id(entry_id, series):
+    """Return the external statistic id of one series of a config entry."""
+    return f"{DOMAIN}:{entry_id.lower()}_{series}"
+
+
+class StatisticsPublisher:
+    """Import one long-term statistics row per hour for the window mean and the average of the peaks.
+
+    Long-term statistics are hourly, so sub-hour windows are rolled up into
+    the row of their hour: its mean is the mean of the window means and its
+    min and max are the lowest and highest window mean. Rows are buffered
+    until their hour is complete and imported in one call per flush, and
+    importing a row again replaces it, so recomputes backfill in place.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, name):
+        self.hass = hass
+        self._window_metadata = StatisticMetaData(
+            has_mean=True,
+            has_sum=False,
+            name=f"{name} window average",
+            source=DOMAIN,
+            statistic_id=statistic_id(entry_id, "window_average"),
+            unit_of_measurement=UnitOfPower.KILO_WATT,
+        )
+        self._average_max_metadata = StatisticMetaData(
+            has_mean=True,
+            has_sum=False,
+            name=f"{name} average max",
+            source=DOMAIN,
+            statistic_id=statistic_id(entry_id, "average_max"),
+            unit_of_measurement=UnitOfPower.KILO_WATT,
+        )
+        self._hours = {}  # hour start (UTC) -> [sum kW, count, min kW, max kW, average max kW]
+
+    def add(self, window_start, mean_kw, average_max_kw=None):
+        """Buffer the mean of a closed window and the average of the peaks after folding it.
+
+        average_max_kw is None for a window folded after later ones, whose
+        peak average at the time is not known: the hour's average max row is
+        then left as it is.
+        """
+        hour = dt_util.as_utc(window_start).replace(minute=0, second=0, microsecond=0)
+        row = self._hours.get(hour)
+        if row is None:
+            self._hours[hour] = [mean_kw, 1, mean_kw, mean_kw, average_max_kw]
+            return
+        row[0] += mean_kw
+        row[1] += 1
+        row[2] = min(row[2], mean_kw)
+        row[3] = max(row[3], mean_kw)
+        if average_max_kw is not None:
+            row[4] = average_max_kw
+
+    @callback
+    def async_flush(self, complete_before):
+        """Import the buffered hours that end at or before complete_before."""
+        hours = sorted(hour for hour in self._hours if hour + HOUR <= complete_before)
+        if not hours:
+            return
+        window_rows = []
+        average_max_rows = []
+        for hour in hours:
+            total, count, low, high, average_max = self._hours.pop(hour)
+            window_rows.append(StatisticData(start=hour, mean=total / count, min=low, max=high))
+            if average_max is not None:
+                average_max_rows.append(StatisticData(start=hour, mean=average_max, min=average_max, max=average_max))
+        _LOGGER.debug("Importing %d hours of external statistics from %s", len(hours), hours[0])
+        async_add_external_statistics(self.hass, self._window_metadata, window_rows)
+        if average_max_rows:
+            async_add_external_statistics(self.hass, self._average_max_metadata, average_max_rows)
@@ -0,0 +1,293 @@
+"""Incremental trapezoidal integrator of power samples over fixed windows."""
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+WINDOW_OPTIONS = [15, 30, 60]
+
+
+class ClosedWindow(NamedTuple):
+    """Result of a completed measurement window."""
+
+    start: datetime  # UTC
+    end: datetime  # UTC
+    mean: float  # W, averaged over the full window length
+    coverage: float  # Fraction of the window backed by samples (0..1)
+
+
+def window_floor(moment: datetime, minutes: int) -> datetime:
+    """Return the start of the window containing moment, in UTC.
+
+    The floor is taken on the wall clock of the datetime given, so windows line
+    up with local hours even in time zones with a sub-hour UTC offset.
+    """
+    floored = moment.replace(minute=moment.minute - moment.minute % minutes, second=0, microsecond=0)
+    return floored.astimezone(timezone.utc)
+
+
+class SourceSum:
+    """Sum of the latest power reading of each source.
+
+    The sum changes whenever any one source reports, so integrating it
+    tracks the combined load with the timing of every individual sample.
+    """
+
+    def __init__(self, sources):
+        self._values = dict.fromkeys(sources)  # source -> W, None while unavailable
+        self._missing = len(self._values)
+        self._total = None
+
+    @property
+    def total(self) -> float | None:
+        """Return the summed power in W, or None while any source is unavailable."""
+        return self._total
+
+    def update(self, source, watts: float | None) -> float | None:
+        """Replace the reading of one source and return the new total."""
+        self._missing += (watts is None) - (self._values[source] is None)
+        self._values[source] = watts
+        # Summed afresh, a handful of phases is cheaper than tracking rounding drift
+        self._total = None if self._missing else sum(self._values.values())
+        return self._total
+
+
+class EnergyCounters:
+    """Latest readings of cumulative energy meters, turned into consumption between readings.
+
+    A reading below the previous one is taken as a meter reset: the new
+    reading is counted as consumed since the reset. An unavailable meter
+    keeps its last reading, so its next reading covers the gap.
+    """
+
+    def __init__(self, sources):
+        self._readings = dict.fromkeys(sources)  # source -> (UTC time, kWh)
+        self._rates = dict.fromkeys(sources, 0.0)  # source -> W between its last two readings
+
+    @property
+    def rate(self) -> float:
+        """Return the summed power in W of all meters between their last two readings."""
+        return sum(self._rates.values())
+
+    def update(self, source, now: datetime, kwh: float | None) -> tuple[datetime, float] | None:
+        """Record a reading and return (previous reading time, mean power in W since), if known."""
+        if kwh is None:
+            return None
+        now = now.astimezone(timezone.utc)
+        previous = self._readings[source]
+        self._readings[source] = (now, kwh)
+        if previous is None:
+            return None
+        last_time, last_kwh = previous
+        seconds = (now - last_time).total_seconds()
+        if seconds <= 0:
+            return None
+        used = kwh - last_kwh if kwh >= last_kwh else kwh
+        self._rates[source] = used * 3600000 / seconds
+        return last_time, self._rates[source]
+
+
+class WindowIntegrator:
+    """Integrate power samples with the trapezoidal rule and close fixed windows.
+
+    Each sample costs O(1). Windows are closed as soon as a sample or an
+    explicit advance() passes their end, holding the last power value up to
+    the boundary.
+
+    Energy meters only tell what was consumed once they report again, so
+    with meters set a window that ends is kept pending instead: segments
+    that reach back into it are still credited to it, and it is closed once
+    every meter has reported past its end, or by release_pending().
+
+    With hold set each value is held until the next one instead, for a sum
+    of sources that changes in steps whenever any one of them reports.
+    """
+
+    def __init__(self, window_minutes: int = 60, meters: int = 0, hold: bool = False):
+        self.window_minutes = window_minutes
+        self.window = timedelta(minutes=window_minutes)
+        self.meters = meters  # Number of energy meters a window waits for before it is closed
+        self._pending = []  # Ended windows waiting for meter readings, oldest first
+        self.hold = hold  # Integrate each value as constant until the next (left Riemann sum)
+        self.window_start = None  # UTC
+        self.energy = 0.0  # kWh accumulated in the current window
+        self.covered = 0.0  # Seconds of the current window backed by samples
+        self.last_power = None  # W, None until the first sample
+        self.last_time = None  # UTC
+
+    @property
+    def window_end(self):
+        """Return the end of the current window."""
+        return self.window_start + self.window
+
+    def start(self, now: datetime):
+        """Start integrating in the window containing now, discarding any state."""
+        self.window_start = window_floor(now, self.window_minutes)
+        self._pending = []
+        self.energy = 0.0
+        self.covered = 0.0
+        self.last_power = None
+        self.last_time = now.astimezone(timezone.utc)
+
+    def _integrate(self, until: datetime, power: float):
+        """Integrate from the last sample time until the given time."""
+        delta_seconds = (until - self.last_time).total_seconds()
+        if delta_seconds > 0 and self.last_power is not None:
+            # Average power in W over the interval, energy in kWh
+            average = self.last_power if self.hold else (self.last_power + power) / 2
+            self.energy += average * delta_seconds / 3600000
+            self.covered += delta_seconds
+        self.last_time = max(self.last_time, until)
+
+    def _close(self, start: datetime, energy: float, covered: float) -> ClosedWindow:
+        window_seconds = self.window.total_seconds()
+        return ClosedWindow(start, start + self.window, energy * 3600000 / window_seconds,
+                            min(1.0, covered / window_seconds))
+
+    def advance(self, now: datetime) -> list[ClosedWindow]:
+        """Close every window that ends at or before now, or leave it pending with meters."""
+        if self.window_start is None:
+            self.start(now)
+            return []
+        now = now.astimezone(timezone.utc)
+        closed = []
+        while now >= self.window_end:
+            end = self.window_end
+            if self.last_power is not None:
+                self._integrate(end, self.last_power)
+            if self.meters:
+                self._pending.append([self.window_start, self.energy, self.covered, set()])
+            else:
+                closed.append(self._close(self.window_start, self.energy, self.covered))
+            self.window_start = end
+            self.energy = 0.0
+            self.covered = 0.0
+            self.last_time = max(self.last_time, end)
+        return closed
+
+    def add_segment(self, start: datetime, end: datetime, power: float, weight: float = 1.0,
+                    meter=None) -> list[ClosedWindow]:
+        """Integrate a constant power in W over [start, end), e.g. a statistics mean.
+
+        Windows passed on the way are closed and returned. A segment of one of
+        several summed sources counts towards the coverage with its weight.
+        The segment of a meter is also credited to the pending windows it
+        overlaps, and closes those it reaches the end of once every meter has.
+        """
+        start = start.astimezone(timezone.utc)
+        end = end.astimezone(timezone.utc)
+        for pending in self._pending:
+            pending_end = pending[0] + self.window
+            seconds = (min(end, pending_end) - max(start, pending[0])).total_seconds()
+            if seconds > 0:
+                pending[1] += power * seconds / 3600000
+                pending[2] += seconds * weight
+        if self.window_start is not None:
+            start = max(start, self.window_start)
+        closed = []
+        while start < end:
+            closed.extend(self.advance(start))
+            segment_end = min(end, self.window_end)
+            seconds = (segment_end - start).total_seconds()
+            self.energy += power * seconds / 3600000
+            self.covered += seconds * weight
+            start = segment_end
+        self.last_time = max(self.last_time, end)
+        if meter is not None:
+            for pending in self._pending:
+                if pending[0] + self.window <= end:
+                    pending[3].add(meter)
+            while self._pending and len(self._pending[0][3]) >= self.meters:
+                closed.append(self._close(*self._pending.pop(0)[:3]))
+        return closed
+
+    def release_pending(self, before: datetime) -> list[ClosedWindow]:
+        """Close the pending windows that ended at or before the given time, whether or not every meter reported."""
+        closed = []
+        while self._pending and self._pending[0][0] + self.window <= before:
+            closed.append(self._close(*self._pending.pop(0)[:3]))
+        return closed
+
+    def add_sample(self, now: datetime, power: float | None) -> list[ClosedWindow]:
+        """Add a power sample in W, returning any windows it closed.
+
+        A power of None marks the source as unavailable: the time until the
+        next valid sample is left uncovered instead of being integrated.
+        """
+        closed = self.advance(now)
+        now = now.astimezone(timezone.utc)
+        if power is None:
+            if self.last_power is not None:
+                self._integrate(now, self.last_power)
+            self.last_power = None
+            return closed
+        self._integrate(now, power)
+        self.last_power = power
+        return closed
+
+    def mean(self, now: datetime, power: float | None = None) -> float:
+        """Return the average power in W of the current window so far.
+
+        The time since the last sample is counted at power, by default the
+        last one, so a quiet source does not drag the average down.
+        """
+        if self.window_start is None:
+            return 0.0
+        elapsed = (now.astimezone(timezone.utc) - self.window_start).total_seconds()
+        if elapsed <= 0:
+            return 0.0
+        return self.energy_at(now, power) * 3600000 / elapsed
+
+    def energy_at(self, now: datetime, power: float | None = None) -> float:
+        """Return the energy in kWh of the current window up to now, holding power (by default the last one)."""
+        if power is None:
+            power = self.last_power
+        if power is None or self.last_time is None:
+            return self.energy
+        seconds = (now.astimezone(timezone.utc) - self.last_time).total_seconds()
+        return self.energy + power * max(0.0, seconds) / 3600000
+
+    def projected_mean(self, now: datetime, power: float | None = None) -> float:
+        """Return the mean in W the window would end with if power, by default the last one, is held to its end."""
+        if self.window_start is None:
+            return 0.0
+        energy = self.energy_at(now, power)
+        if power is None:
+            power = self.last_power or 0.0
+        remaining = max(0.0, (self.window_end - now.astimezone(timezone.utc)).total_seconds())
+        return (energy * 3600000 + power * remaining) / self.window.total_seconds()
+
+    def snapshot(self) -> dict | None:
+        """Return a JSON-serialisable snapshot of the in-progress window."""
+        if self.window_start is None:
+            return None
+        return {
+            "window_minutes": self.window_minutes,
+            "window_start": self.window_start.isoformat(),
+            "accumulated_energy": self.energy,
+            "covered": self.covered,
+            "last_power": self.last_power,
+            "last_time": self.last_time.isoformat() if self.last_time else None,
+        }
+
+    def restore(self, snapshot: dict, parse_datetime=datetime.fromisoformat) -> bool:
+        """Resume a window from snapshot(), returning False if it cannot be used.
+
+        The last power value is not restored: the time since the snapshot is a
+        gap until it is filled or a new sample arrives. Pending windows are not
+        kept; the downtime catch-up takes them from the recorder.
+        """
+        if not snapshot or snapshot.get("window_minutes") != self.window_minutes:
+            return False
+        try:
+            window_start = parse_datetime(snapshot["window_start"]).astimezone(timezone.utc)
+            last_time = parse_datetime(snapshot["last_time"]).astimezone(timezone.utc)
+            energy = float(snapshot["accumulated_energy"])
+            covered = float(snapshot.get("covered", 0.0))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return False
+        self.window_start = window_start
+        self._pending = []
+        self.energy = energy
+        self.covered = covered
+        self.last_power = None
+        self.last_time = max(last_time, window_start)
+        return True
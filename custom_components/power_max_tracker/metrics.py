@@ -0,0 +1,68 @@
+"""Cheap runtime counters kept per tracker."""
+from bisect import bisect_left
+
+# Upper bounds in milliseconds of the recorder latency histogram buckets
+LATENCY_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class TrackerMetrics:
+    """Counters updated on the hot path; each update is a few integer operations."""
+
+    def __init__(self):
+        self.events_processed = 0
+        self.events_dropped = 0  # Unavailable or unparsable source states
+        self.state_writes = 0
+        self.writes_suppressed = 0  # Writes skipped or deferred by coalescing
+        self.handler_seconds = 0.0
+        self.recorder_queries = 0
+        self.recorder_seconds = 0.0
+        self.recorder_latency = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.gap_seconds = 0.0  # Window time not covered by the live integrator
+        self.windows_closed = 0
+        self.last_window = None
+        self.source_stalls = 0  # Times the source was silent for longer than the maximum hold
+
+    def record_event(self, seconds: float, dropped: bool = False):
+        """Count one handled source event and the time spent handling it."""
+        self.events_processed += 1
+        self.handler_seconds += seconds
+        if dropped:
+            self.events_dropped += 1
+
+    def record_query(self, seconds: float):
+        """Count one recorder query and add it to the latency histogram."""
+        self.recorder_queries += 1
+        self.recorder_seconds += seconds
+        self.recorder_latency[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def record_window(self, start, window_seconds: float, coverage: float):
+        """Count a closed window and the part of it the integrator missed."""
+        self.windows_closed += 1
+        self.gap_seconds += window_seconds * (1.0 - coverage)
+        self.last_window = start
+
+    @property
+    def handler_mean_us(self) -> float:
+        """Return the mean time spent per handled event in microseconds."""
+        if not self.events_processed:
+            return 0.0
+        return self.handler_seconds / self.events_processed * 1e6
+
+    def as_dict(self) -> dict:
+        """Return the counters in a JSON-serialisable form."""
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "events_processed": self.events_processed,
+            "events_dropped": self.events_dropped,
+            "state_writes": self.state_writes,
+            "writes_suppressed": self.writes_suppressed,
+            "handler_seconds": round(self.handler_seconds, 6),
+            "handler_mean_us": round(self.handler_mean_us, 2),
+            "recorder_queries": self.recorder_queries,
+            "recorder_seconds": round(self.recorder_seconds, 6),
+            "recorder_latency": dict(zip(labels, self.recorder_latency)),
+            "integrator_gap_seconds": round(self.gap_seconds, 1),
+            "windows_closed": self.windows_closed,
+            "source_stalls": self.source_stalls,
+            "last_window": self.last_window.isoformat() if self.last_window else None,
+        }
@@ -0,0 +1,284 @@
+"""Bounded top-K store of timestamped peak values."""
+import bisect
+import heapq
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+UNIQUE_WINDOW = "window"
+UNIQUE_DAY = "day"
+UNIQUE_WEEK = "week"
+UNIQUENESS_OPTIONS = [UNIQUE_WINDOW, UNIQUE_DAY, UNIQUE_WEEK]
+
+
+class Peak(NamedTuple):
+    """A tracked peak: the window mean and the start of its window."""
+
+    value: float
+    start: datetime | None
+
+
+class PeakStore:
+    """Keep the K largest window values, at most one per window, day or week.
+
+    Entries live in a min-heap so the smallest tracked peak is checked in O(1)
+    and replaced in O(log K). Each entry is keyed by its uniqueness bucket, so
+    inserting a window twice (e.g. when re-running a backfill) is a no-op and a
+    second window from the same day or week only replaces the first if larger.
+    """
+
+    def __init__(self, size: int, uniqueness: str = UNIQUE_WINDOW):
+        self.size = size
+        self.uniqueness = uniqueness
+        self._heap = []  # [value, timestamp, bucket, start]
+        self._buckets = {}  # bucket -> heap entry
+
+    def _bucket(self, start: datetime):
+        """Return the uniqueness bucket of a window start."""
+        if self.uniqueness == UNIQUE_DAY:
+            return start.date().isoformat()
+        if self.uniqueness == UNIQUE_WEEK:
+            year, week, _ = start.isocalendar()
+            return f"{year}-W{week:02d}"
+        return start.isoformat()
+
+    def add(self, start: datetime, value: float) -> bool:
+        """Offer a window value, returning True if the tracked peaks changed."""
+        bucket = self._bucket(start)
+        entry = [value, start.timestamp(), bucket, start]
+        existing = self._buckets.get(bucket)
+        if existing is not None:
+            if value <= existing[0]:
+                return False
+            # Same bucket, larger value: swap it in place and restore the heap
+            self._heap.remove(existing)
+            self._heap.append(entry)
+            heapq.heapify(self._heap)
+        elif len(self._heap) < self.size:
+            heapq.heappush(self._heap, entry)
+        elif value > self._heap[0][0]:
+            evicted = heapq.heapreplace(self._heap, entry)
+            del self._buckets[evicted[2]]
+        else:
+            return False
+        self._buckets[bucket] = entry
+        return True
+
+    def clear(self):
+        """Drop all tracked peaks."""
+        self._heap.clear()
+        self._buckets.clear()
+
+    def expire(self, now: datetime) -> bool:
+        """Drop peaks that aged out of the store by now, returning True if the tracked peaks changed."""
+        return False
+
+    @property
+    def peaks(self) -> list[Peak]:
+        """Return the tracked peaks, largest first."""
+        return [Peak(e[0], e[3]) for e in sorted(self._heap, reverse=True)]
+
+    @property
+    def values(self) -> list[float]:
+        """Return the peak values largest first, padded with zeros to the store size."""
+        values = sorted((e[0] for e in self._heap), reverse=True)
+        return values + [0.0] * (self.size - len(values))
+
+    @property
+    def min_value(self) -> float:
+        """Return the smallest value needed to enter the store."""
+        if len(self._heap) < self.size:
+            return 0.0
+        return self._heap[0][0]
+
+    def as_list(self) -> list[dict]:
+        """Return a JSON-serialisable representation of the peaks."""
+        return [
+            {"value": peak.value, "start": peak.start.isoformat() if peak.start else None}
+            for peak in self.peaks
+        ]
+
+    def load(self, items, parse_datetime=datetime.fromisoformat):
+        """Restore peaks from as_list() output or a legacy list of bare floats."""
+        self.clear()
+        for index, item in enumerate(items or []):
+            if isinstance(item, dict):
+                value = item.get("value")
+                start = parse_datetime(item["start"]) if item.get("start") else None
+            else:
+                value, start = item, None
+            if value is None or value <= 0:
+                continue
+            if start is None:
+                # Legacy values carry no timestamp; give each its own bucket
+                entry = [float(value), float("-inf"), ("legacy", index), None]
+                self._buckets[entry[2]] = entry
+                heapq.heappush(self._heap, entry)
+                if len(self._heap) > self.size:
+                    del self._buckets[heapq.heappop(self._heap)[2]]
+            else:
+                self.add(start, float(value))
+
+
+class RollingPeakStore(PeakStore):
+    """Keep the K largest window values of the last rolling_days days.
+
+    Only candidates are kept: a window is dropped as soon as K newer windows
+    from other uniqueness buckets are at least as large, since those outlive
+    it and keep it out of the top K until it expires. Candidates are kept in
+    a list sorted by value and a min-heap by start. An in-order window only
+    visits the smaller candidates, each of which it brings one step closer to
+    being dropped, so inserts and expiry are amortized O(K log n) in the
+    number of candidates, which stays small for any realistic load. Windows
+    inserted out of order, e.g. by a backfill, fall back to a linear pass.
+    """
+
+    def __init__(self, size: int, uniqueness: str = UNIQUE_WINDOW, rolling_days: int = 30):
+        super().__init__(size, uniqueness)
+        self.horizon = timedelta(days=rolling_days).total_seconds()
+        self._by_value = []  # Candidates sorted by (value, timestamp)
+        self._by_time = []  # Min-heap of (timestamp, id, entry); removed entries are skipped lazily
+        self._newest = None  # Timestamp of the newest window added
+        self._latest = None  # Timestamp of the newest window or expiry time seen
+        self._top_cache = None  # Top K candidates, read on every sample by the projection
+
+    # Candidate entries: [value, timestamp, bucket, start, dominating buckets, removed]
+
+    def _top(self):
+        """Return the top K candidates from distinct buckets, largest first."""
+        if self._top_cache is not None:
+            return self._top_cache
+        top = self._top_cache = []
+        taken = set()
+        for entry in reversed(self._by_value):
+            if entry[2] not in taken:
+                top.append(entry)
+                taken.add(entry[2])
+                if len(top) == self.size:
+                    break
+        return top
+
+    def _remove(self, entry):
+        """Drop a candidate; its expiry heap item is skipped when popped or compacted away."""
+        index = bisect.bisect_left(self._by_value, entry[:2], key=lambda e: e[:2])
+        while self._by_value[index] is not entry:
+            index += 1
+        del self._by_value[index]
+        self._top_cache = None
+        self._buckets[entry[2]].remove(entry)
+        if not self._buckets[entry[2]]:
+            del self._buckets[entry[2]]
+        entry[5] = True
+        if len(self._by_time) > 2 * len(self._by_value) + self.size:
+            # Mostly removed entries; rebuild so only candidates are held
+            self._by_time = [(e[1], id(e), e) for e in self._by_value]
+            heapq.heapify(self._by_time)
+
+    def _dominate(self, entry, newer):
+        """Count newer as dominating entry, dropping entry once it can no longer reach the top K."""
+        if newer[2] == entry[2]:
+            self._remove(entry)  # The larger, newer window of the same bucket always outlives it
+            return
+        entry[4].add(newer[2])
+        if len(entry[4]) >= self.size:
+            self._remove(entry)
+
+    def _expire_before(self, cutoff) -> bool:
+        """Drop the candidates starting at or before cutoff, returning True if any was dropped."""
+        expired = False
+        while self._by_time and self._by_time[0][0] <= cutoff:
+            entry = heapq.heappop(self._by_time)[2]
+            if not entry[5]:
+                self._remove(entry)
+                expired = True
+        return expired
+
+    def add(self, start: datetime, value: float) -> bool:
+        """Offer a window value, returning True if the tracked peaks changed."""
+        timestamp = start.timestamp()
+        if self._latest is not None and timestamp <= self._latest - self.horizon:
+            return False  # Already aged out
+        bucket = self._bucket(start)
+        for existing in self._buckets.get(bucket, ()):
+            if existing[1] >= timestamp and existing[0] >= value:
+                return False  # Same window again, or outlived by a larger window of the same bucket
+        top = self._top()
+        entry = [value, timestamp, bucket, start, set(), False]
+        if self._newest is None or timestamp >= self._newest:
+            # In order: only the candidates up to this value are dominated by it
+            self._newest = timestamp
+            self._latest = max(timestamp, self._latest or timestamp)
+            count = bisect.bisect_right(self._by_value, value, key=lambda e: e[0])
+            for dominated in self._by_value[:count]:
+                self._dominate(dominated, entry)
+            self._expire_before(timestamp - self.horizon)
+        else:
+            for other in list(self._by_value):
+                if other[1] > timestamp and other[0] >= value:
+                    if other[2] == bucket:
+                        return False
+                    entry[4].add(other[2])
+                elif other[1] <= timestamp and other[0] <= value:
+                    self._dominate(other, entry)
+            if len(entry[4]) >= self.size:
+                return self._top() != top
+        bisect.insort(self._by_value, entry, key=lambda e: e[:2])
+        self._top_cache = None
+        heapq.heappush(self._by_time, (timestamp, id(entry), entry))
+        self._buckets.setdefault(bucket, []).append(entry)
+        return self._top() != top
+
+    def expire(self, now: datetime) -> bool:
+        """Drop peaks older than rolling_days before now, returning True if the tracked peaks changed."""
+        timestamp = now.timestamp()
+        if self._latest is None or timestamp > self._latest:
+            self._latest = timestamp
+        if not self._by_time or self._by_time[0][0] > timestamp - self.horizon:
+            return False
+        top = self._top()
+        self._expire_before(timestamp - self.horizon)
+        return self._top() != top
+
+    def clear(self):
+        """Drop all tracked peaks and candidates."""
+        super().clear()
+        self._by_value.clear()
+        self._by_time.clear()
+        self._newest = self._latest = None
+        self._top_cache = None
+
+    @property
+    def peaks(self) -> list[Peak]:
+        """Return the tracked peaks, largest first."""
+        return [Peak(e[0], e[3]) for e in self._top()]
+
+    @property
+    def values(self) -> list[float]:
+        """Return the peak values largest first, padded with zeros to the store size."""
+        values = [e[0] for e in self._top()]
+        return values + [0.0] * (self.size - len(values))
+
+    @property
+    def min_value(self) -> float:
+        """Return the smallest value needed to enter the store."""
+        top = self._top()
+        if len(top) < self.size:
+            return 0.0
+        return top[-1][0]
+
+    def as_list(self) -> list[dict]:
+        """Return every candidate in time order, so the window survives a restart."""
+        return [
+            {"value": e[0], "start": e[3].isoformat()}
+            for e in sorted(self._by_value, key=lambda e: e[1])
+        ]
+
+    def load(self, items, parse_datetime=datetime.fromisoformat):
+        """Restore candidates from as_list() output; values without a start cannot expire and are dropped."""
+        self.clear()
+        entries = []
+        for item in items or []:
+            if isinstance(item, dict) and item.get("value") is not None and item.get("start"):
+                entries.append((parse_datetime(item["start"]), float(item["value"])))
+        for start, value in sorted(entries, key=lambda e: e[0].timestamp()):
+            if value > 0:
+                self.add(start, value)
@@ -0,0 +1,67 @@
+"""Compiled month x weekday x hour gating schedule with a holiday list."""
+from datetime import date, datetime, timedelta, timezone
+
+# Transitions further away than this are not searched for
+MAX_TRANSITION_SEARCH_DAYS = 400
+
+
+def parse_hour_ranges(text: str) -> list[tuple[int, int]]:
+    """Parse "7-12, 13-20" into [(7, 12), (13, 20)]; end hours are exclusive."""
+    ranges = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition("-")
+        start = int(start)
+        end = int(end) if sep else start + 1
+        if not 0 <= start < end <= 24:
+            raise ValueError(f"Invalid hour range: {part}")
+        ranges.append((start, end))
+    return ranges
+
+
+def parse_holidays(value) -> set[date]:
+    """Parse a list or comma separated string of YYYY-MM-DD dates."""
+    if isinstance(value, str):
+        value = value.split(",")
+    return {date.fromisoformat(str(item).strip()) for item in value or [] if str(item).strip()}
+
+
+class GateSchedule:
+    """Gate that is open on the configured months, weekdays and hours, except holidays.
+
+    The schedule is compiled into a 12 x 7 x 24 lookup table, so checking any
+    local datetime is a single index and set lookup.
+    """
+
+    def __init__(self, months=None, weekdays=None, hours=None, holidays=None):
+        months = {int(m) for m in months} if months else set(range(1, 13))
+        weekdays = {int(d) for d in weekdays} if weekdays else set(range(7))
+        hour_ranges = parse_hour_ranges(hours) if isinstance(hours, str) else (hours or [(0, 24)])
+        open_hours = {h for start, end in hour_ranges for h in range(start, end)}
+        if not months <= set(range(1, 13)) or not weekdays <= set(range(7)):
+            raise ValueError("Months must be 1-12 and weekdays 0-6")
+        self.holidays = parse_holidays(holidays)
+        self._table = bytearray(12 * 7 * 24)
+        for month in months:
+            for weekday in weekdays:
+                for hour in open_hours:
+                    self._table[(month - 1) * 168 + weekday * 24 + hour] = 1
+
+    def is_open_at(self, moment: datetime) -> bool:
+        """Return True if the gate is open at the given local datetime."""
+        if moment.date() in self.holidays:
+            return False
+        return bool(self._table[(moment.month - 1) * 168 + moment.weekday() * 24 + moment.hour])
+
+    def next_transition(self, moment: datetime) -> datetime | None:
+        """Return the first full hour after moment where the gate state changes."""
+        state = self.is_open_at(moment)
+        candidate = moment.replace(minute=0, second=0, microsecond=0)
+        for _ in range(MAX_TRANSITION_SEARCH_DAYS * 24):
+            # Step in absolute time so DST changes are handled by the time zone
+            candidate = (candidate.astimezone(timezone.utc) + timedelta(hours=1)).astimezone(moment.tzinfo)
+            if self.is_open_at(candidate) != state:
+                return candidate
+        return None
@@ -1,31 +1,120 @@
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
-from homeassistant.const import UnitOfPower
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, UnitOfEnergy, UnitOfPower, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.event import async_track_state_change_event, async_track_time_change
+from homeassistant.helpers.event import async_call_later, async_track_time_change
 from homeassistant.util import dt as dt_util
-from .const import DOMAIN, CONF_NUM_MAX_VALUES, CONF_SOURCE_SENSOR, CONF_BINARY_SENSOR
-from .coordinator import PowerMaxCoordinator
+from .const import (
+    DOMAIN,
+    CONF_NUM_MAX_VALUES,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_DELTA,
+    CONF_DIAGNOSTIC_SENSORS,
+    MAX_PUBLISH_AGE,
+)
+from .coordinator import PowerMaxCoordinator, source_label
+from .dispatcher import async_get_dispatcher
+from .engine import TrackerProfile
+from .sketch import percentile_label
 
 _LOGGER = logging.getLogger(__name__)
 
+# (metrics key, name, unit, state class) of the optional diagnostic sensors
+DIAGNOSTIC_SENSORS = [
+    ("events_processed", "Events Processed", None, SensorStateClass.TOTAL_INCREASING),
+    ("events_dropped", "Events Dropped", None, SensorStateClass.TOTAL_INCREASING),
+    ("state_writes", "State Writes", None, SensorStateClass.TOTAL_INCREASING),
+    ("recorder_queries", "Recorder Queries", None, SensorStateClass.TOTAL_INCREASING),
+    ("integrator_gap_seconds", "Integrator Gap", UnitOfTime.SECONDS, SensorStateClass.TOTAL_INCREASING),
+    ("source_stalls", "Source Stalls", None, SensorStateClass.TOTAL_INCREASING),
+    ("handler_mean_us", "Handler Time", UnitOfTime.MICROSECONDS, SensorStateClass.MEASUREMENT),
+]
+
 class GatedSensorEntity(SensorEntity):
-    """Base class for sensors gated by a binary sensor."""
+    """Base class for sensors gated by a binary sensor, with coalesced state writes."""
+
+    # Scale from the configured delta (W) to the unit of native_value
+    _publish_delta_scale = 1.0
 
     def __init__(self, entry: ConfigEntry):
         """Initialize."""
         super().__init__()
-        self._binary_sensor = entry.data.get(CONF_BINARY_SENSOR)
+        self._min_publish_interval = float(entry.data.get(CONF_MIN_PUBLISH_INTERVAL, 0))
+        self._min_publish_delta = float(entry.data.get(CONF_MIN_PUBLISH_DELTA, 0)) * self._publish_delta_scale
+        self._last_published_value = None
+        self._last_published_time = None
+        self._deferred_publish = None
+        self._deferred_due = None
 
     def _can_update(self):
-        """Check if the sensor can update based on binary sensor state."""
-        if not self._binary_sensor:
-            return True
-        state = self.hass.states.get(self._binary_sensor)
-        return state is not None and state.state == "on"
+        """Check if the sensor can update based on the coordinator's cached gate state."""
+        return self._coordinator.is_gate_open()
+
+    @callback
+    def _async_publish(self, now):
+        """Write state unless it is too soon or the change is insignificant.
+
+        Writes held back by the minimum interval are flushed once it has
+        passed. Changes below the minimum delta are flushed once the last
+        write is MAX_PUBLISH_AGE seconds old, so the state is never stale for
+        longer than that.
+        """
+        if self._last_published_time is not None:
+            elapsed = (now - self._last_published_time).total_seconds()
+            if abs(self.native_value - self._last_published_value) < self._min_publish_delta:
+                self._coordinator.metrics.writes_suppressed += 1
+                if self.native_value != self._last_published_value:
+                    self._async_defer(now, max(self._min_publish_interval, MAX_PUBLISH_AGE) - elapsed)
+                return
+            if elapsed < self._min_publish_interval:
+                self._coordinator.metrics.writes_suppressed += 1
+                self._async_defer(now, self._min_publish_interval - elapsed)
+                return
+        self._async_write_now(now)
+
+    @callback
+    def _async_defer(self, now, delay):
+        """Flush the latest value in delay seconds, unless a flush is already due by then."""
+        due = now + timedelta(seconds=max(0.0, delay))
+        if self._deferred_publish is not None:
+            if self._deferred_due <= due:
+                return
+            self._deferred_publish()
+        self._deferred_due = due
+        self._deferred_publish = async_call_later(self.hass, max(0.0, delay), self._async_deferred_publish)
+
+    @callback
+    def _async_deferred_publish(self, now):
+        """Write a value that was held back by the minimum publish interval or delta."""
+        self._deferred_publish = None
+        self._async_flush(dt_util.utcnow())
+
+    @callback
+    def _async_flush(self, now):
+        """Write the latest value if it differs from the last published one."""
+        if self._last_published_time is None or self.native_value != self._last_published_value:
+            self._async_write_now(now)
+
+    @callback
+    def _async_write_now(self, now):
+        """Write state immediately and record what was published."""
+        if self._deferred_publish is not None:
+            self._deferred_publish()
+            self._deferred_publish = None
+        self._last_published_value = self.native_value
+        self._last_published_time = now
+        self._coordinator.metrics.state_writes += 1
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self):
+        """Cancel a pending deferred write."""
+        if self._deferred_publish is not None:
+            self._deferred_publish()
+            self._deferred_publish = None
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -35,34 +124,61 @@ async def async_setup_entry(
     """Set up sensors."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
     num_max_values = int(entry.data.get(CONF_NUM_MAX_VALUES, 2))  # Cast to int
+    window = window_label(coordinator.window_minutes)
     sensors = [
-        MaxPowerSensor(coordinator, idx, f"Max Hourly Average Power {idx + 1}")
+        MaxPowerSensor(coordinator, idx, f"Max {window} Average Power {idx + 1}")
         for idx in range(num_max_values)
     ]
     # Add average max power sensor
     average_max_sensor = AverageMaxPowerSensor(coordinator, entry)
     sensors.append(average_max_sensor)
+    sensors.extend(PercentilePowerSensor(coordinator, entry, p) for p in coordinator.profile.percentiles)
+    # Each named profile gets its own set of peak sensors
+    for profile in coordinator.profiles[1:]:
+        sensors.extend(
+            MaxPowerSensor(coordinator, idx, f"{profile.name} Max {window} Average Power {idx + 1}", profile)
+            for idx in range(profile.num_max_values)
+        )
+        sensors.append(AverageMaxPowerSensor(coordinator, entry, profile))
+        sensors.extend(PercentilePowerSensor(coordinator, entry, p, profile) for p in profile.percentiles)
     # Add SourcePowerSensor
     source_sensor = SourcePowerSensor(coordinator, entry)
     sensors.append(source_sensor)
     # Add HourlyAveragePowerSensor
     hourly_average_power_sensor = HourlyAveragePowerSensor(coordinator, entry)
     sensors.append(hourly_average_power_sensor)
+    # Add the projection sensors for load shedding
+    sensors.append(ProjectedAveragePowerSensor(coordinator, entry))
+    sensors.append(PeakBudgetSensor(coordinator, entry))
     async_add_entities(sensors, update_before_add=True)
     for sensor in sensors:
         coordinator.add_entity(sensor)
         _LOGGER.debug(f"Registered sensor {sensor._attr_name} with coordinator, unique_id {sensor._attr_unique_id}, entity_id {sensor.entity_id}")
+    # Diagnostic sensors poll the coordinator's counters and are not pushed by it
+    if entry.data.get(CONF_DIAGNOSTIC_SENSORS, False):
+        async_add_entities(
+            TrackerDiagnosticSensor(coordinator, entry, *description) for description in DIAGNOSTIC_SENSORS
+        )
+
+def window_label(window_minutes: int) -> str:
+    """Return the window length as used in entity names, e.g. Hourly or 15-Minute."""
+    return "Hourly" if window_minutes == 60 else f"{window_minutes}-Minute"
+
 
 class MaxPowerSensor(SensorEntity):
-    """Sensor for max hourly average power in kW."""
+    """Sensor for max window average power in kW."""
 
-    def __init__(self, coordinator: PowerMaxCoordinator, index: int, name: str):
+    def __init__(self, coordinator: PowerMaxCoordinator, index: int, name: str, profile: TrackerProfile | None = None):
         """Initialize."""
         super().__init__()
         self._coordinator = coordinator
+        self._profile = profile or coordinator.profile
         self._index = index
         self._attr_name = name
-        self._attr_unique_id = f"{coordinator.entry.entry_id}_max_values_{index + 1}"
+        if self._profile.key:
+            self._attr_unique_id = f"{coordinator.entry.entry_id}_{self._profile.key}_max_values_{index + 1}"
+        else:
+            self._attr_unique_id = f"{coordinator.entry.entry_id}_max_values_{index + 1}"
         self._attr_device_class = SensorDeviceClass.POWER
         self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
         self._attr_state_class = SensorStateClass.MEASUREMENT
@@ -73,19 +189,33 @@ class MaxPowerSensor(SensorEntity):
     @property
     def native_value(self):
         """Return the state."""
-        max_values = self._coordinator.max_values
+        max_values = self._profile.peak_store.values
         return round(max_values[self._index], 2) if len(max_values) > self._index else 0.0
 
+    @property
+    def extra_state_attributes(self):
+        """Return the start of the window this peak was measured in."""
+        peaks = self._profile.peak_store.peaks
+        if len(peaks) > self._index and peaks[self._index].start is not None:
+            return {"start": peaks[self._index].start.isoformat()}
+        return {"start": None}
+
 class AverageMaxPowerSensor(SensorEntity):
-    """Sensor for the average of all max hourly average power values."""
+    """Sensor for the average of all max window average power values."""
 
-    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry):
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry, profile: TrackerProfile | None = None):
         """Initialize."""
         super().__init__()
         self._coordinator = coordinator
         self._entry = entry
-        self._attr_name = "Average Max Hourly Average Power"
-        self._attr_unique_id = f"{entry.entry_id}_average_max"
+        self._profile = profile or coordinator.profile
+        window = window_label(self._profile.window_minutes)
+        if self._profile.key:
+            self._attr_name = f"{self._profile.name} Average Max {window} Average Power"
+            self._attr_unique_id = f"{entry.entry_id}_{self._profile.key}_average_max"
+        else:
+            self._attr_name = f"Average Max {window} Average Power"
+            self._attr_unique_id = f"{entry.entry_id}_average_max"
         self._attr_device_class = SensorDeviceClass.POWER
         self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
         self._attr_state_class = SensorStateClass.MEASUREMENT
@@ -96,11 +226,80 @@ class AverageMaxPowerSensor(SensorEntity):
     @property
     def native_value(self):
         """Return the state."""
-        max_values = self._coordinator.max_values
+        max_values = self._profile.peak_store.values
         if max_values:
             return round(sum(max_values) / len(max_values), 2)
         return 0.0
 
+    @property
+    def extra_state_attributes(self):
+        """Return all tracked peaks with their window start."""
+        return {
+            "peaks": [
+                {"start": peak.start.isoformat() if peak.start else None, "value": round(peak.value, 3)}
+                for peak in self._profile.peak_store.peaks
+            ]
+        }
+
+class PercentilePowerSensor(SensorEntity):
+    """Sensor for a percentile of the window averages folded this period, from the quantile sketch."""
+
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry, percentile: float,
+                 profile: TrackerProfile | None = None):
+        """Initialize."""
+        super().__init__()
+        self._coordinator = coordinator
+        self._profile = profile or coordinator.profile
+        self._percentile = percentile
+        label = percentile_label(percentile)
+        window = window_label(self._profile.window_minutes)
+        if self._profile.key:
+            self._attr_name = f"{self._profile.name} P{percentile:g} {window} Average Power"
+            self._attr_unique_id = f"{entry.entry_id}_{self._profile.key}_p{label}_window_percentile"
+        else:
+            self._attr_name = f"P{percentile:g} {window} Average Power"
+            self._attr_unique_id = f"{entry.entry_id}_p{label}_window_percentile"
+        self._attr_device_class = SensorDeviceClass.POWER
+        self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_icon = "mdi:chart-bell-curve"
+        self._attr_should_poll = False  # Updated via coordinator
+
+    @property
+    def native_value(self):
+        """Return the state, unknown until a window is folded in the period."""
+        value = self._profile.sketch.quantile(self._percentile / 100)
+        return round(value, 2) if value is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        """Return the number of windows the percentile is taken over and its accuracy."""
+        return {
+            "windows": self._profile.sketch.count,
+            "relative_accuracy": self._profile.sketch.relative_accuracy,
+        }
+
+class TrackerDiagnosticSensor(SensorEntity):
+    """Diagnostic sensor exposing one runtime counter of the coordinator."""
+
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry, key, name, unit, state_class):
+        """Initialize."""
+        super().__init__()
+        self._coordinator = coordinator
+        self._key = key
+        self._attr_name = f"Power Max {name} {source_label(entry.data)}"
+        self._attr_unique_id = f"{entry.entry_id}_diagnostic_{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_icon = "mdi:counter"
+        self._attr_should_poll = True  # Polled, so counting costs nothing extra per event
+
+    @property
+    def native_value(self):
+        """Return the state."""
+        return self._coordinator.metrics.as_dict()[self._key]
+
 class SourcePowerSensor(GatedSensorEntity):
     """Sensor that tracks the source sensor state, gated by binary sensor."""
 
@@ -109,8 +308,7 @@ class SourcePowerSensor(GatedSensorEntity):
         super().__init__(entry)
         self._coordinator = coordinator
         self._entry = entry
-        self._source_sensor = entry.data[CONF_SOURCE_SENSOR]
-        self._attr_name = f"Power Max Source {self._source_sensor.split('.')[-1]}"
+        self._attr_name = f"Power Max Source {source_label(entry.data)}"
         self._attr_unique_id = f"{entry.entry_id}_source"
         self._attr_device_class = SensorDeviceClass.POWER
         self._attr_native_unit_of_measurement = UnitOfPower.WATT
@@ -121,134 +319,156 @@ class SourcePowerSensor(GatedSensorEntity):
 
     async def async_added_to_hass(self):
         """Handle entity added to hass."""
-        async def _async_state_changed(event):
-            """Handle state changes of source or binary sensor."""
-            if self._can_update():
-                source_state = self.hass.states.get(self._source_sensor)
-                if source_state is not None and source_state.state not in ("unavailable", "unknown"):
-                    try:
-                        value = float(source_state.state)
-                        self._state = max(0.0, value)  # Ignore negative values
-                    except (ValueError, TypeError):
-                        _LOGGER.warning(f"Invalid state for {self._source_sensor}: {source_state.state}")
-                        self._state = 0.0
-                else:
-                    _LOGGER.debug(f"Source sensor {self._source_sensor} unavailable or unknown")
-                    self._state = 0.0
-            else:
-                self._state = 0.0
-            self.async_write_ha_state()
-
-        # Track state changes of source and binary sensors
-        sensors = [self._source_sensor]
-        if self._binary_sensor:
-            sensors.append(self._binary_sensor)
+        dispatcher = async_get_dispatcher(self.hass)
+
+        @callback
+        def _async_update(now):
+            """Mirror the summed source power, 0 if gated off or any source is unavailable."""
+            power = self._coordinator.source_power
+            self._state = power if power is not None and self._can_update() else 0.0
+            self._async_publish(now)
+
+        @callback
+        def _async_sample(sample):
+            """Publish after a dispatched sample; the coordinator has already summed it."""
+            begin = time.perf_counter()
+            _async_update(sample.time)
+            self._coordinator.metrics.handler_seconds += time.perf_counter() - begin
+
+        @callback
+        def _async_gate_changed():
+            """Re-evaluate the source power when the gate opens or closes."""
+            _async_update(dt_util.utcnow())
+
+        @callback
+        def _async_window_boundary(now):
+            """Always publish the latest value at the window boundary."""
+            self._async_flush(dt_util.utcnow())
+
         self.async_on_remove(
-            async_track_state_change_event(
-                self.hass, sensors, _async_state_changed
+            async_track_time_change(
+                self.hass,
+                _async_window_boundary,
+                hour=None,
+                minute=f"/{self._coordinator.window_minutes}",
+                second=0,
             )
         )
 
+        # Re-evaluate when the schedule or binary sensor gate opens or closes
+        self.async_on_remove(self._coordinator.async_add_gate_listener(_async_gate_changed))
+
+        # Samples are parsed once per source event by the shared dispatcher
+        for source in self._coordinator.source_sensors:
+            self.async_on_remove(dispatcher.async_subscribe(source, _async_sample))
+
     @property
     def native_value(self):
         """Return the state."""
         return self._state
 
 
-class HourlyAveragePowerSensor(GatedSensorEntity):
-    """Sensor for hourly average power in kW so far the current hour."""
+class WindowSensorEntity(GatedSensorEntity):
+    """Base class for sensors derived from the live window integrator."""
+
+    _publish_delta_scale = 0.001  # Configured delta is in W, state is in kW or kWh
 
     def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry):
         """Initialize."""
         super().__init__(entry)
         self._coordinator = coordinator
         self._entry = entry
-        self._source_sensor = entry.data[CONF_SOURCE_SENSOR]
-        self._attr_name = f"Hourly Average Power {self._source_sensor.split('.')[-1]}"
+        self._attr_should_poll = False
+
+    @callback
+    def async_flush_window(self, now):
+        """Publish the closing value of the window before the integrator rolls over."""
+        if self.hass is not None:
+            self._async_flush(now)
+
+    @callback
+    def async_tick(self, now):
+        """Publish the value at a shared tick, subject to the publish limits."""
+        if self.hass is not None:
+            self._async_publish(now)
+
+    @callback
+    def async_window_started(self, now):
+        """Publish the reset value at the start of a new window."""
+        if self.hass is not None:
+            self._async_write_now(now)
+
+    async def async_added_to_hass(self):
+        """Handle entity added to hass."""
+        @callback
+        def _async_sample(sample):
+            """Publish the new value; the coordinator has already integrated the sample."""
+            begin = time.perf_counter()
+            self._async_publish(sample.time)
+            self._coordinator.metrics.handler_seconds += time.perf_counter() - begin
+
+        # The window is measured whatever the gates, so only samples change the values
+        dispatcher = async_get_dispatcher(self.hass)
+        for source in self._coordinator.source_sensors:
+            self.async_on_remove(dispatcher.async_subscribe(source, _async_sample))
+
+
+class HourlyAveragePowerSensor(WindowSensorEntity):
+    """Sensor for average power in kW so far in the current measurement window."""
+
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry):
+        """Initialize."""
+        super().__init__(coordinator, entry)
+        self._attr_name = f"{window_label(coordinator.window_minutes)} Average Power {source_label(entry.data)}"
         self._attr_unique_id = f"{entry.entry_id}_hourly_average_power"
         self._attr_device_class = SensorDeviceClass.POWER
         self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
         self._attr_state_class = SensorStateClass.MEASUREMENT
         self._attr_icon = "mdi:lightning-bolt"
-        self._attr_should_poll = False
-        self._accumulated_energy = 0.0
-        self._last_power = 0.0
-        self._last_time = None
-        self._hour_start = None
 
-    async def async_added_to_hass(self):
-        """Handle entity added to hass."""
-        async def _async_hour_start(now):
-            """Reset at the start of each hour."""
-            self._accumulated_energy = 0.0
-            self._last_power = 0.0
-            self._last_time = now
-            self._hour_start = now
-            self.async_write_ha_state()
-
-        # Track hour changes
-        self.async_on_remove(
-            async_track_time_change(
-                self.hass,
-                _async_hour_start,
-                hour=None,
-                minute=0,
-                second=0,
-            )
-        )
+    @property
+    def native_value(self):
+        """Return the state."""
+        return round(self._coordinator.window_mean(dt_util.utcnow()) / 1000, 3)
 
-        # Initialize
-        await _async_hour_start(dt_util.utcnow())
 
-        async def _async_state_changed(event):
-            """Handle state changes of source or binary sensor."""
-            now = dt_util.utcnow()
-            if self._last_time is None:
-                self._last_time = now
-                return
-            if self._can_update():
-                source_state = self.hass.states.get(self._source_sensor)
-                if source_state is not None and source_state.state not in ("unavailable", "unknown"):
-                    try:
-                        current_power = float(source_state.state)
-                        if current_power < 0:
-                            current_power = 0.0
-                        delta_seconds = (now - self._last_time).total_seconds()
-                        if delta_seconds > 0:
-                            # Average power in W
-                            avg_power = (self._last_power + current_power) / 2
-                            # Energy in kWh
-                            delta_energy = avg_power * delta_seconds / 3600000
-                            self._accumulated_energy += delta_energy
-                        self._last_power = current_power
-                        self._last_time = now
-                    except (ValueError, TypeError):
-                        _LOGGER.warning(f"Invalid state for {self._source_sensor}: {source_state.state}")
-                        self._last_power = 0.0
-                else:
-                    _LOGGER.debug(f"Source sensor {self._source_sensor} unavailable or unknown")
-                    self._last_power = 0.0
-            else:
-                self._last_power = 0.0
-            self.async_write_ha_state()
-
-        # Track state changes of source and binary sensors
-        sensors = [self._source_sensor]
-        if self._binary_sensor:
-            sensors.append(self._binary_sensor)
-        self.async_on_remove(
-            async_track_state_change_event(
-                self.hass, sensors, _async_state_changed
-            )
-        )
+class ProjectedAveragePowerSensor(WindowSensorEntity):
+    """Sensor for the average power in kW the current window ends with at the current draw."""
+
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry):
+        """Initialize."""
+        super().__init__(coordinator, entry)
+        self._attr_name = f"Projected Average Power {source_label(entry.data)}"
+        self._attr_unique_id = f"{entry.entry_id}_projected_average_power"
+        self._attr_device_class = SensorDeviceClass.POWER
+        self._attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_icon = "mdi:chart-timeline-variant"
 
     @property
     def native_value(self):
         """Return the state."""
-        if self._hour_start is None:
-            return 0.0
-        now = dt_util.utcnow()
-        elapsed_hours = (now - self._hour_start).total_seconds() / 3600
-        if elapsed_hours > 0:
-            return round(self._accumulated_energy / elapsed_hours, 3)
-        return 0.0
+        return round(self._coordinator.projected_mean / 1000, 3)
+
+
+class PeakBudgetSensor(WindowSensorEntity):
+    """Sensor for the energy in kWh the current window can still use before it beats the lowest peak."""
+
+    def __init__(self, coordinator: PowerMaxCoordinator, entry: ConfigEntry):
+        """Initialize."""
+        super().__init__(coordinator, entry)
+        self._attr_name = f"Peak Energy Budget {source_label(entry.data)}"
+        self._attr_unique_id = f"{entry.entry_id}_peak_budget"
+        self._attr_device_class = SensorDeviceClass.ENERGY
+        self._attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+        self._attr_icon = "mdi:battery-charging-medium"
+
+    @property
+    def native_value(self):
+        """Return the state."""
+        return round(self._coordinator.peak_budget, 3)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the peak the budget is measured against."""
+        return {"threshold": self._coordinator.peak_store.min_value}
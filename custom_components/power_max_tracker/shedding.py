@@ -0,0 +1,133 @@
+"""Priority load shedding driven by the projected window average."""
+import logging
+from datetime import datetime, timedelta
+from homeassistant.const import ATTR_ENTITY_ID, STATE_OFF, STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+from .const import EVENT_LOAD_SHED, SHED_SETTLE_TIME
+
+_LOGGER = logging.getLogger(__name__)
+
+SHED_DOMAINS = ["switch", "climate", "number"]
+
+
+class LoadShedder:
+    """Turn loads off in priority order while the window is projected to beat the lowest peak.
+
+    The controller is evaluated on every projection update of the tracker:
+    once the projected average reaches the threshold the next load in the
+    list is shed, and once it has dropped the hysteresis fraction below the
+    threshold the last shed load is restored. A single action is taken per
+    settle time, so the meter can show its effect before the next one, and
+    each load is kept on for min_on and off for min_off seconds after the
+    controller switched it. Loads the controller did not shed are never
+    turned on. Switches are turned off, climate entities set to off and
+    number entities set to their minimum; each is restored to its previous
+    state.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, entities, min_on: float, min_off: float, hysteresis: float):
+        self.hass = hass
+        self.entry_id = entry_id
+        self.entities = list(entities)  # Shed first to last, restored last to first
+        self.min_on = timedelta(seconds=min_on)
+        self.min_off = timedelta(seconds=min_off)
+        self.hysteresis = hysteresis
+        self.shed = {}  # entity_id -> state to restore, in shedding order
+        self._switched_at = {}  # entity_id -> time the controller last switched it
+        self._last_action = None
+
+    @callback
+    def async_update(self, now: datetime, projected_kw: float, threshold_kw: float):
+        """Shed or restore at most one load for the current projection; threshold 0 restores all."""
+        if self._last_action is not None and (now - self._last_action).total_seconds() < SHED_SETTLE_TIME:
+            return
+        if threshold_kw > 0 and projected_kw >= threshold_kw:
+            self._async_shed_next(now, projected_kw, threshold_kw)
+        elif self.shed and (threshold_kw <= 0 or projected_kw < threshold_kw * (1 - self.hysteresis)):
+            self._async_restore_last(now, projected_kw, threshold_kw)
+
+    def _elapsed(self, entity_id, now, minimum):
+        """Return True if the controller switched the entity at least minimum ago, or never."""
+        switched_at = self._switched_at.get(entity_id)
+        return switched_at is None or now - switched_at >= minimum
+
+    @callback
+    def _async_shed_next(self, now, projected_kw, threshold_kw):
+        """Turn off the first load in the list that is on and has been on long enough."""
+        for entity_id in self.entities:
+            if entity_id in self.shed or not self._elapsed(entity_id, now, self.min_on):
+                continue
+            state = self.hass.states.get(entity_id)
+            restore = self._restore_state(state)
+            if restore is None:
+                continue  # Already off or unavailable; shedding it would not lower the draw
+            self.shed[entity_id] = restore
+            self._async_switch(now, entity_id, "shed", None, projected_kw, threshold_kw, state)
+            return
+
+    @callback
+    def _async_restore_last(self, now, projected_kw, threshold_kw):
+        """Turn the most recently shed load back on once it has been off long enough."""
+        entity_id = next(reversed(self.shed))
+        if not self._elapsed(entity_id, now, self.min_off):
+            return
+        restore = self.shed.pop(entity_id)
+        self._async_switch(now, entity_id, "restore", restore, projected_kw, threshold_kw)
+
+    @staticmethod
+    def _restore_state(state):
+        """Return what a load is restored to, or None if it is not drawing power."""
+        if state is None or state.state in (STATE_OFF, STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return None
+        if state.domain == "number":
+            minimum = state.attributes.get("min")
+            try:
+                value = float(state.state)
+            except ValueError:
+                return None
+            return value if minimum is None or value > minimum else None
+        return state.state
+
+    @callback
+    def _async_switch(self, now, entity_id, action, restore, projected_kw, threshold_kw, state=None):
+        """Call the service that sheds or restores a load and announce it."""
+        domain = entity_id.split(".")[0]
+        data = {ATTR_ENTITY_ID: entity_id}
+        if domain == "climate":
+            service = "set_hvac_mode"
+            data["hvac_mode"] = STATE_OFF if action == "shed" else restore
+        elif domain == "number":
+            service = "set_value"
+            data["value"] = state.attributes.get("min", 0) if action == "shed" else restore
+        else:
+            service = "turn_off" if action == "shed" else "turn_on"
+        self._switched_at[entity_id] = now
+        self._last_action = now
+        _LOGGER.info("%s %s at a projected %.3f kW against a peak threshold of %.3f kW",
+                     "Shedding" if action == "shed" else "Restoring", entity_id, projected_kw, threshold_kw)
+        self.hass.async_create_task(self.hass.services.async_call(domain, service, data))
+        self.hass.bus.async_fire(EVENT_LOAD_SHED, {
+            "entry_id": self.entry_id,
+            "entity_id": entity_id,
+            "action": action,
+            "projected_power": round(projected_kw, 3),
+            "threshold": threshold_kw,
+        })
+
+    def as_dict(self) -> dict:
+        """Return the shed loads and switching times to persist."""
+        return {
+            "shed": [[entity_id, restore] for entity_id, restore in self.shed.items()],
+            "switched_at": {entity_id: moment.isoformat() for entity_id, moment in self._switched_at.items()},
+        }
+
+    def load(self, data: dict | None):
+        """Restore the loads shed before a restart, so they are turned back on later."""
+        data = data or {}
+        self.shed = {
+            entity_id: restore for entity_id, restore in data.get("shed", []) if entity_id in self.entities
+        }
+        for entity_id, moment in data.get("switched_at", {}).items():
+            if entity_id in self.entities and (parsed := dt_util.parse_datetime(moment)) is not None:
+                self._switched_at[entity_id] = parsed
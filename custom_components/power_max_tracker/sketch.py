@@ -0,0 +1,220 @@
+"""Fixed-memory, mergeable quantile sketch of window means."""
+import base64
+import math
+from datetime import datetime, timedelta, timezone
+
+# Quantiles are returned within this relative error of a true window mean
+RELATIVE_ACCURACY = 0.01
+# Bucket limit; with 1% accuracy 512 buckets span values over four decades
+MAX_BUCKETS = 512
+# Values below this (kW) are counted as zero
+MIN_VALUE = 0.001
+# Days of windows remembered as counted, behind the latest one, unless a profile's rolling period is given
+COUNTED_HORIZON_DAYS = 31
+
+
+def parse_percentiles(value) -> list[float]:
+    """Return percentiles given as a list or comma separated text, sorted and without duplicates.
+
+    Raises ValueError for a percentile that is not a number in (0, 100].
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.replace(";", ",").split(",") if part.strip()]
+    percentiles = set()
+    for item in value:
+        try:
+            percentile = float(item)
+        except (TypeError, ValueError):
+            raise ValueError(f"percentile {item!r} is not a number") from None
+        if not 0 < percentile <= 100:
+            raise ValueError(f"percentile {item} must be above 0 and at most 100")
+        percentiles.add(percentile)
+    return sorted(percentiles)
+
+
+def percentile_label(percentile: float) -> str:
+    """Return a percentile as used in entity names and unique ids, e.g. 95 or 99_5."""
+    return f"{percentile:g}".replace(".", "_")
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with a relative accuracy guarantee.
+
+    Each value is counted in the bucket of its logarithm in base gamma, so
+    adding a value is O(1) and any quantile is within RELATIVE_ACCURACY of
+    the true one. Counts are kept in a dense list between the lowest and
+    highest bucket; past max_buckets the lowest buckets are collapsed into
+    one, which only affects the lowest quantiles. Two sketches with the same
+    accuracy merge by adding their counts.
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY, max_buckets: int = MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.clear()
+
+    def clear(self):
+        """Drop all counted values."""
+        self.count = 0
+        self.zero_count = 0
+        self._offset = 0  # Bucket key of _counts[0]
+        self._counts = []
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, count: int = 1):
+        """Count a value."""
+        self.count += count
+        if value < MIN_VALUE:
+            self.zero_count += count
+            return
+        self._add_to_bucket(self._key(value), count)
+
+    def _add_to_bucket(self, key: int, count: int):
+        """Add to the count of a bucket, growing or collapsing the bucket list as needed."""
+        if not self._counts:
+            self._offset = key
+            self._counts.append(count)
+            return
+        if key < self._offset:
+            if self._offset + len(self._counts) - key > self.max_buckets:
+                # Out of range below the collapsed buckets; count it in the lowest one
+                self._counts[0] += count
+                return
+            self._counts[:0] = [0] * (self._offset - key)
+            self._offset = key
+        elif key >= self._offset + len(self._counts):
+            self._counts.extend([0] * (key - self._offset - len(self._counts) + 1))
+        self._counts[key - self._offset] += count
+        if len(self._counts) > self.max_buckets:
+            collapse = len(self._counts) - self.max_buckets + 1
+            merged = sum(self._counts[:collapse])
+            self._counts[:collapse] = [merged]
+            self._offset += collapse - 1
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the counts of a sketch with the same accuracy to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same accuracy can be merged")
+        self.count += other.zero_count
+        self.zero_count += other.zero_count
+        for index, count in enumerate(other._counts):
+            if count:
+                self.count += count
+                self._add_to_bucket(other._offset + index, count)
+
+    def quantile(self, q: float) -> float | None:
+        """Return the value at quantile q (0..1), or None while the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen > rank:
+                return 2 * self._gamma ** (self._offset + index) / (self._gamma + 1)
+        return 2 * self._gamma ** (self._offset + len(self._counts) - 1) / (self._gamma + 1)
+
+    def as_dict(self) -> dict:
+        """Return a compact JSON-serialisable representation."""
+        return {
+            "accuracy": self.relative_accuracy,
+            "zero": self.zero_count,
+            "offset": self._offset,
+            "counts": list(self._counts),
+        }
+
+    def load(self, data: dict | None):
+        """Restore counts from as_dict() output with the same accuracy, or start empty."""
+        self.clear()
+        if not data or data.get("accuracy") != self.relative_accuracy:
+            return
+        self.zero_count = int(data.get("zero", 0))
+        self._offset = int(data.get("offset", 0))
+        self._counts = [int(count) for count in data.get("counts", [])][-self.max_buckets:]
+        self.count = self.zero_count + sum(self._counts)
+
+
+class CountedWindows:
+    """Set of the window starts counted in a sketch, kept as a bitmap.
+
+    Bit i stands for the window starting i windows after the origin, so a
+    month of 15-minute windows takes 372 bytes. Windows can be added in any
+    order, but only those within horizon_days of the latest window are kept:
+    the origin moves forward as later windows are added, and older windows
+    are taken as counted, so the bitmap never outgrows the horizon.
+    """
+
+    def __init__(self, window_minutes: int = 60, horizon_days: int = COUNTED_HORIZON_DAYS):
+        self.window = timedelta(minutes=window_minutes)
+        self._size = round(timedelta(days=horizon_days) / self.window)  # Windows kept in the bitmap
+        self.clear()
+
+    def clear(self):
+        """Forget all windows."""
+        self._origin = None  # UTC start of the window of bit 0
+        self._bits = 0
+
+    def __len__(self) -> int:
+        return self._bits.bit_count()
+
+    def add(self, window_start: datetime) -> bool:
+        """Add a window, returning False if it was added before or is beyond the horizon."""
+        window_start = window_start.astimezone(timezone.utc)
+        if self._origin is None:
+            self._origin = window_start
+        index = round((window_start - self._origin) / self.window)
+        if index < 0:
+            if self._bits.bit_length() - index > self._size:
+                return False  # Too far behind the latest window
+            # Earlier than every window so far; move the origin back to it
+            self._bits <<= -index
+            self._origin = window_start
+            index = 0
+        elif index >= self._size:
+            # Forget the windows that fell behind the horizon
+            self._drop(index - self._size + 1)
+            index = self._size - 1
+        bit = 1 << index
+        if self._bits & bit:
+            return False
+        self._bits |= bit
+        return True
+
+    def _drop(self, count: int):
+        """Move the origin forward by count windows, forgetting the windows before it."""
+        self._bits >>= count
+        self._origin += count * self.window
+
+    def as_dict(self) -> dict | None:
+        """Return a compact JSON-serialisable representation, or None while empty."""
+        if self._origin is None:
+            return None
+        raw = self._bits.to_bytes((self._bits.bit_length() + 7) // 8, "little")
+        return {
+            "window": int(self.window.total_seconds()),
+            "origin": self._origin.isoformat(),
+            "bits": base64.b64encode(raw).decode("ascii"),
+        }
+
+    def load(self, data: dict | None, parse_datetime=datetime.fromisoformat):
+        """Restore windows from as_dict() output of the same window length, or start empty."""
+        self.clear()
+        if not data or data.get("window") != int(self.window.total_seconds()):
+            return
+        try:
+            origin = parse_datetime(data["origin"]).astimezone(timezone.utc)
+            bits = int.from_bytes(base64.b64decode(data["bits"]), "little")
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return
+        self._origin = origin
+        self._bits = bits
+        if bits.bit_length() > self._size:
+            self._drop(bits.bit_length() - self._size)
@@ -0,0 +1,69 @@
+"""Shared periodic tick for all Power Max Tracker config entries."""
+import logging
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from .const import DOMAIN, DATA_TICKER
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def async_get_ticker(hass: HomeAssistant) -> "TickScheduler":
+    """Return the domain-wide tick scheduler, creating it on first use."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    ticker = domain_data.get(DATA_TICKER)
+    if ticker is None:
+        ticker = domain_data[DATA_TICKER] = TickScheduler(hass)
+    return ticker
+
+
+class TickScheduler:
+    """Run one timer at the shortest interval any listener asked for.
+
+    Each listener is called at most once per tick, and only once its own
+    interval has passed, so entries with longer intervals share the timer
+    without being called more often than configured.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._listeners = {}  # listener -> [interval seconds, next due time]
+        self._interval = None
+        self._unsub = None
+
+    @callback
+    def async_add_listener(self, listener, interval):
+        """Call listener(now) every interval seconds, returning a callback that removes it."""
+        self._listeners[listener] = [interval, None]
+        self._async_rearm()
+
+        @callback
+        def _remove():
+            self._listeners.pop(listener, None)
+            self._async_rearm()
+
+        return _remove
+
+    @callback
+    def _async_rearm(self):
+        """Run the timer at the shortest listener interval, or stop it without listeners."""
+        interval = min((state[0] for state in self._listeners.values()), default=None)
+        if interval == self._interval:
+            return
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._interval = interval
+        if interval is not None:
+            _LOGGER.debug("Ticking %d listeners every %s s", len(self._listeners), interval)
+            self._unsub = async_track_time_interval(self.hass, self._async_tick, timedelta(seconds=interval))
+
+    @callback
+    def _async_tick(self, now):
+        """Call every listener whose interval has passed."""
+        # Half a tick of slack keeps timer jitter from skipping a listener's turn
+        slack = timedelta(seconds=self._interval / 2)
+        for listener, state in list(self._listeners.items()):
+            if state[1] is None or now >= state[1]:
+                state[1] = now + timedelta(seconds=state[0]) - slack
+                listener(now)
@@ -0,0 +1,96 @@
+"""Websocket subscription to the live values of a tracker."""
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, DEFAULT_LIVE_INTERVAL
+from .coordinator import PowerMaxCoordinator
+
+
+@callback
+def async_register_websocket_commands(hass: HomeAssistant):
+    """Register the websocket commands of the integration."""
+    websocket_api.async_register_command(hass, websocket_subscribe)
+
+
+class LiveSubscription:
+    """Push the live values of one coordinator to one websocket subscriber.
+
+    Pushes are throttled to one per min_interval seconds. A push held back
+    by the throttle is sent when the interval has passed, with the values
+    current at that time, so the subscriber always ends up with the latest
+    values without receiving every sample.
+    """
+
+    def __init__(self, hass, connection, msg_id, coordinator: PowerMaxCoordinator, min_interval: float):
+        self.hass = hass
+        self.connection = connection
+        self.msg_id = msg_id
+        self.coordinator = coordinator
+        self.min_interval = min_interval
+        self._last_sent = None
+        self._trailing = None
+        self._remove_listener = coordinator.async_add_live_listener(self.async_push, self._async_entry_unloaded)
+
+    @callback
+    def async_push(self, now):
+        """Send the live values now, or once the throttle interval has passed."""
+        if self._trailing is not None:
+            return  # The values are sent by the pending trailing push
+        if self._last_sent is not None:
+            elapsed = (now - self._last_sent).total_seconds()
+            if elapsed < self.min_interval:
+                self._trailing = async_call_later(self.hass, self.min_interval - elapsed, self._async_send_trailing)
+                return
+        self._async_send(now)
+
+    @callback
+    def _async_send_trailing(self, _now):
+        """Send the values held back by the throttle."""
+        self._trailing = None
+        self._async_send(dt_util.utcnow())
+
+    @callback
+    def _async_send(self, now):
+        """Send the live values of the coordinator at now."""
+        self._last_sent = now
+        self.connection.send_message(websocket_api.event_message(self.msg_id, self.coordinator.live_values(now)))
+
+    @callback
+    def _async_entry_unloaded(self):
+        """End the subscription with an error when the tracker is unloaded."""
+        self.async_unsubscribe()
+        self.connection.subscriptions.pop(self.msg_id, None)
+        self.connection.send_error(
+            self.msg_id, websocket_api.ERR_NOT_FOUND, f"Tracker {self.coordinator.entry.entry_id} was unloaded"
+        )
+
+    @callback
+    def async_unsubscribe(self):
+        """Stop pushing and cancel a pending trailing push."""
+        self._remove_listener()
+        if self._trailing is not None:
+            self._trailing()
+            self._trailing = None
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe",
+        vol.Required("entry_id"): str,
+        vol.Optional("min_interval", default=DEFAULT_LIVE_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
+@callback
+def websocket_subscribe(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict):
+    """Stream the samples, running window average and projection of a tracker."""
+    coordinator = hass.data.get(DOMAIN, {}).get(msg["entry_id"])
+    if not isinstance(coordinator, PowerMaxCoordinator):
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, f"No tracker for entry {msg['entry_id']}")
+        return
+    subscription = LiveSubscription(hass, connection, msg["id"], coordinator, msg["min_interval"])
+    connection.subscriptions[msg["id"]] = subscription.async_unsubscribe
+    connection.send_result(msg["id"])
+    # Subscribers get the current values right away instead of waiting for a sample
+    subscription.async_push(dt_util.utcnow())
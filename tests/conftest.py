@@ -0,0 +1,24 @@
+"""Fixtures shared by the Power Max Tracker tests."""
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.power_max_tracker.const import DOMAIN
+
+
+@pytest.fixture
+async def setup_tracker(hass, enable_custom_integrations):
+    """Return a coroutine function that sets up a config entry and returns its coordinator."""
+    entries = []
+
+    async def _setup(data, entry_id="tracker"):
+        entry = MockConfigEntry(domain=DOMAIN, title="Power Max Tracker", data=data, entry_id=entry_id)
+        entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        entries.append(entry)
+        return hass.data[DOMAIN][entry.entry_id]
+
+    yield _setup
+    for entry in entries:
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
@@ -0,0 +1,57 @@
+"""Tests for the binary peak archive."""
+import csv
+from datetime import datetime, timezone
+
+from custom_components.power_max_tracker.archive import CSV_HEADER, RECORD, PeakArchive, export_csv
+
+
+def month(number):
+    return datetime(2025, number, 1, tzinfo=timezone.utc)
+
+
+def peaks_of(number):
+    return [(4.0 + number, datetime(2025, number, 3, 18, tzinfo=timezone.utc)),
+            (2.5, datetime(2025, number, 9, 7, tzinfo=timezone.utc))]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "archive" / "peaks.bin")
+    archive = PeakArchive(path)
+    archive.load()
+    for number in (3, 1, 2):
+        assert archive.append(month(number), month(number + 1), peaks_of(number))
+    assert not archive.append(month(2), month(3), peaks_of(2))  # Periods are only archived once
+
+    reopened = PeakArchive(path)
+    reopened.load()
+    assert len(reopened) == 3
+    periods = list(reopened.periods())
+    assert [period.start for period in periods] == [month(1), month(2), month(3)]
+    assert periods[1].end == month(3)
+    assert periods[1].peaks == sorted(peaks_of(2), reverse=True)
+    assert [period.start for period in reopened.periods(month(2), month(3))] == [month(2)]
+
+
+def test_partly_written_record_is_dropped(tmp_path):
+    path = str(tmp_path / "peaks.bin")
+    archive = PeakArchive(path)
+    archive.append(month(1), month(2), peaks_of(1))
+    with open(path, "ab") as output:
+        output.write(b"\0" * (RECORD.size // 2))
+    reopened = PeakArchive(path)
+    reopened.load()
+    assert len(reopened) == 1
+    assert reopened.append(month(2), month(3), peaks_of(2))
+    assert [period.start for period in reopened.periods()] == [month(1), month(2)]
+
+
+def test_export_csv(tmp_path):
+    archive = PeakArchive(str(tmp_path / "peaks.bin"))
+    archive.append(month(1), month(2), peaks_of(1))
+    output = str(tmp_path / "peaks.csv")
+    assert export_csv(output, [("entry", "", archive)]) == 2
+    with open(output, newline="") as exported:
+        rows = list(csv.reader(exported))
+    assert rows[0] == CSV_HEADER
+    assert rows[1][:5] == ["entry", "", month(1).isoformat(), month(2).isoformat(), "1"]
+    assert float(rows[1][5]) == 5.0
@@ -0,0 +1,19 @@
+"""Smoke test of the replay benchmark, so the harness keeps working as the integration changes."""
+from argparse import Namespace
+
+import pytest
+
+from benchmarks import replay
+
+
+@pytest.mark.parametrize("live", [False, True])
+async def test_replay_runs_briefly(live):
+    args = Namespace(events=7200, interval=1.0, window=60, live=live, publish_interval=0, publish_delta=0)
+    result = await replay.async_run(2, args)
+    assert result["events"] == 7200
+    assert result["p50_us"] > 0
+    assert result["state_writes"] > 0
+    # Two hours of samples close two windows, each saved and, without live windows, read from the recorder
+    assert result["timers"] > 0
+    assert result["saves"] > 0
+    assert result["recorder_queries"] == (0 if live else 2)
@@ -0,0 +1,91 @@
+"""Tests for the recorder statistics broker."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.components.recorder.statistics import async_import_statistics
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+
+from custom_components.power_max_tracker import broker
+
+START = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+def hours(count):
+    return START + timedelta(hours=count)
+
+
+async def test_concurrent_requests_are_answered_by_one_query_per_batch(hass, monkeypatch):
+    queries = []
+
+    def statistics_during_period(hass, start_time, end_time, statistic_ids, period, units, types):
+        queries.append((start_time, end_time, set(statistic_ids), period, types))
+        return {
+            statistic_id: [{"start": hours(hour).timestamp(), "mean": 100.0 * index + hour, "sum": None}
+                           for hour in range(6)]
+            for index, statistic_id in enumerate(sorted(statistic_ids))
+        }
+
+    monkeypatch.setattr(broker, "statistics_during_period", statistics_during_period)
+    monkeypatch.setattr(broker, "get_instance", lambda hass: SimpleNamespace(
+        async_add_executor_job=hass.async_add_executor_job
+    ))
+    instance = broker.async_get_broker(hass)
+    first, second, third, sums = await asyncio.gather(
+        instance.async_fetch("sensor.a", hours(0), hours(2)),
+        instance.async_fetch("sensor.b", hours(1), hours(4)),
+        instance.async_fetch("sensor.a", hours(3), hours(6)),
+        instance.async_fetch("sensor.a", hours(0), hours(1), types=("sum",)),
+    )
+    # One query per (period, types), spanning every request of the batch
+    assert sorted(queries, key=lambda query: sorted(query[4])) == [
+        (hours(0), hours(6), {"sensor.a", "sensor.b"}, "hour", {"mean"}),
+        (hours(0), hours(1), {"sensor.a"}, "hour", {"sum"}),
+    ]
+    # Each request gets the rows of its own entity and range
+    assert [row["mean"] for row in first] == [0.0, 1.0]
+    assert [row["mean"] for row in second] == [101.0, 102.0, 103.0]
+    assert [row["mean"] for row in third] == [3.0, 4.0, 5.0]
+    assert len(sums) == 1
+
+    # A request after the batch was answered starts a new one
+    await instance.async_fetch("sensor.b", hours(0), hours(1))
+    assert len(queries) == 3
+
+
+async def _import(hass, statistic_id, unit, rows, has_mean=False, has_sum=False):
+    metadata = {
+        "source": "recorder",
+        "statistic_id": statistic_id,
+        "name": None,
+        "unit_of_measurement": unit,
+        "has_mean": has_mean,
+        "has_sum": has_sum,
+    }
+    async_import_statistics(hass, metadata, rows)
+    await async_wait_recording_done(hass)
+
+
+async def test_power_statistics_are_fetched_in_watts(recorder_mock, hass, monkeypatch):
+    monkeypatch.setattr(broker, "BATCH_DELAY", 0)
+    await _import(hass, "sensor.phase_l1", "kW", [
+        {"start": START + timedelta(hours=hour), "mean": 1.5 + hour, "min": 1.0, "max": 5.0}
+        for hour in range(3)
+    ], has_mean=True)
+    rows = await broker.async_get_broker(hass).async_fetch(
+        "sensor.phase_l1", START, START + timedelta(hours=3)
+    )
+    assert [row["mean"] for row in rows] == pytest.approx([1500.0, 2500.0, 3500.0])
+
+
+async def test_energy_statistics_are_fetched_in_kwh(recorder_mock, hass, monkeypatch):
+    monkeypatch.setattr(broker, "BATCH_DELAY", 0)
+    await _import(hass, "sensor.meter_energy", "Wh", [
+        {"start": START + timedelta(hours=hour), "state": 2000.0 * hour, "sum": 2000.0 * hour}
+        for hour in range(3)
+    ], has_sum=True)
+    rows = await broker.async_get_broker(hass).async_fetch(
+        "sensor.meter_energy", START, START + timedelta(hours=3), types=("sum",)
+    )
+    assert [row["sum"] for row in rows] == pytest.approx([0.0, 2.0, 4.0])
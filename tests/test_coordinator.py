@@ -0,0 +1,185 @@
+"""Tests for the live windows, the recompute service and the downtime catch-up, run against the recorder."""
+from datetime import timedelta
+
+import pytest
+from homeassistant.components.recorder import history
+from homeassistant.components.recorder.statistics import async_import_statistics
+from homeassistant.core import State
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_capture_events, async_fire_time_changed
+from pytest_homeassistant_custom_component.components.recorder.common import async_wait_recording_done
+
+from custom_components.power_max_tracker import external_statistics
+from custom_components.power_max_tracker.const import (
+    CONF_BINARY_SENSOR,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_LIVE_WINDOWS,
+    CONF_NUM_MAX_VALUES,
+    CONF_PROFILE_NAME,
+    CONF_PROFILES,
+    CONF_SOURCE_SENSOR,
+    DOMAIN,
+    EVENT_RECOMPUTE_PROGRESS,
+    STATISTICS_DELAY,
+    STORAGE_VERSION,
+)
+from custom_components.power_max_tracker.external_statistics import statistic_id
+
+MEANS = [1000.0, 3000.0, 2000.0, 500.0, 4000.0, 1500.0]  # W, one per hour
+PHASES = ["sensor.phase_1", "sensor.phase_2"]  # Several sources are read from their own statistics
+
+
+def hours_ago(count):
+    return dt_util.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=count)
+
+
+async def import_hourly_means(hass, start, means):
+    """Import the means split evenly over the phases."""
+    for statistic_id in PHASES:
+        async_import_statistics(hass, {
+            "source": "recorder",
+            "statistic_id": statistic_id,
+            "name": None,
+            "unit_of_measurement": "W",
+            "has_mean": True,
+            "has_sum": False,
+        }, [
+            {"start": start + timedelta(hours=hour), "mean": mean / 2, "min": mean / 2, "max": mean / 2}
+            for hour, mean in enumerate(means)
+        ])
+    await async_wait_recording_done(hass)
+
+
+def set_phases(hass):
+    for entity_id in PHASES:
+        hass.states.async_set(entity_id, "0", {"unit_of_measurement": "W"})
+
+
+async def test_profiles_are_gated_when_the_window_is_folded(recorder_mock, hass, freezer, setup_tracker):
+    freezer.move_to(hours_ago(-1))
+    hass.states.async_set("binary_sensor.day", "off")
+    hass.states.async_set("binary_sensor.night", "on")
+    hass.states.async_set("sensor.power", "0", {"unit_of_measurement": "W"})
+    coordinator = await setup_tracker({
+        CONF_SOURCE_SENSOR: "sensor.power",
+        CONF_BINARY_SENSOR: "binary_sensor.day",
+        CONF_LIVE_WINDOWS: True,
+        CONF_PROFILES: [{CONF_PROFILE_NAME: "Night", CONF_BINARY_SENSOR: "binary_sensor.night"}],
+    })
+
+    # The entry's own gate is closed, but the window is still measured for the night profile
+    for _ in range(12):
+        hass.states.async_set("sensor.power", "2000", {"unit_of_measurement": "W"}, force_update=True)
+        await hass.async_block_till_done()
+        freezer.tick(timedelta(minutes=5))
+    hass.states.async_set("sensor.power", "1000", {"unit_of_measurement": "W"})
+    await hass.async_block_till_done()
+    assert coordinator.profiles[1].peak_store.values[0] == pytest.approx(2.0)
+    assert coordinator.max_values == [0.0, 0.0]
+
+
+async def test_recompute_rebuilds_the_peaks(recorder_mock, hass, setup_tracker):
+    set_phases(hass)
+    coordinator = await setup_tracker({CONF_SOURCE_SENSOR: PHASES, CONF_NUM_MAX_VALUES: 2})
+    start = hours_ago(len(MEANS) + 1)
+    await import_hourly_means(hass, start, MEANS)
+    events = async_capture_events(hass, EVENT_RECOMPUTE_PROGRESS)
+
+    await hass.services.async_call(DOMAIN, "recompute", {
+        "start": start, "end": start + timedelta(hours=len(MEANS)), "reset": True,
+    }, blocking=True)
+    assert coordinator.max_values == [4.0, 3.0]
+    assert [event.data["state"] for event in events] == ["running", "running", "done"]
+    assert events[-1].data["windows"] == len(MEANS)
+    assert events[-1].data["progress"] == 1.0
+    assert events[-1].data["missing"] == 0
+
+
+async def test_recompute_only_backfills_the_peak_average_with_reset(recorder_mock, hass, monkeypatch, setup_tracker):
+    imported = {}
+    monkeypatch.setattr(
+        external_statistics, "async_add_external_statistics",
+        lambda hass, metadata, data: imported.setdefault(metadata["statistic_id"], []).extend(data),
+    )
+    set_phases(hass)
+    coordinator = await setup_tracker({
+        CONF_SOURCE_SENSOR: PHASES, CONF_NUM_MAX_VALUES: 2, CONF_EXTERNAL_STATISTICS: True,
+    })
+    start = hours_ago(len(MEANS) + 1)
+    await import_hourly_means(hass, start, MEANS)
+    coordinator.last_window = start + timedelta(hours=len(MEANS))  # Later windows were already folded
+
+    # The peak average after each past window is not known without rebuilding the peaks
+    await hass.services.async_call(DOMAIN, "recompute", {
+        "start": start, "end": start + timedelta(hours=len(MEANS)),
+    }, blocking=True)
+    assert len(imported[statistic_id("tracker", "window_average")]) == len(MEANS)
+    assert statistic_id("tracker", "average_max") not in imported
+
+    await hass.services.async_call(DOMAIN, "recompute", {
+        "start": start, "end": start + timedelta(hours=len(MEANS)), "reset": True,
+    }, blocking=True)
+    assert [row["mean"] for row in imported[statistic_id("tracker", "average_max")]] == [
+        0.5, 2.0, 2.5, 2.5, 3.5, 3.5,
+    ]
+
+
+async def test_recompute_reports_windows_without_statistics(recorder_mock, hass, setup_tracker):
+    set_phases(hass)
+    coordinator = await setup_tracker({CONF_SOURCE_SENSOR: PHASES, CONF_NUM_MAX_VALUES: 2})
+    start = hours_ago(len(MEANS) + 1)
+    await import_hourly_means(hass, start, MEANS)
+    events = async_capture_events(hass, EVENT_RECOMPUTE_PROGRESS)
+
+    # The two hours before the imported ones have no statistics
+    await hass.services.async_call(DOMAIN, "recompute", {
+        "start": start - timedelta(hours=2), "end": start + timedelta(hours=len(MEANS)), "reset": True,
+    }, blocking=True)
+    assert coordinator.max_values == [4.0, 3.0]
+    assert events[-1].data["state"] == "done"
+    assert (events[-1].data["windows"], events[-1].data["expected"], events[-1].data["missing"]) == (6, 8, 2)
+
+
+async def test_recompute_gates_windows_by_the_recorded_binary_sensor(recorder_mock, hass, monkeypatch, setup_tracker):
+    start = hours_ago(len(MEANS) + 1)
+    # The gate was on for the first three hours only, and is off now
+    recorded = [
+        State("binary_sensor.gate", "on", last_changed=start - timedelta(hours=1)),
+        State("binary_sensor.gate", "off", last_changed=start + timedelta(hours=3)),
+    ]
+    monkeypatch.setattr(
+        history, "get_significant_states",
+        lambda hass, start_time, end_time, entity_ids, **kwargs: {"binary_sensor.gate": recorded},
+    )
+    await import_hourly_means(hass, start, MEANS)
+    set_phases(hass)
+    hass.states.async_set("binary_sensor.gate", "off")
+    coordinator = await setup_tracker({
+        CONF_SOURCE_SENSOR: PHASES, CONF_NUM_MAX_VALUES: 2, CONF_BINARY_SENSOR: "binary_sensor.gate",
+    })
+
+    await hass.services.async_call(DOMAIN, "recompute", {
+        "start": start, "end": start + timedelta(hours=len(MEANS)), "reset": True,
+    }, blocking=True)
+    assert coordinator.max_values == [3.0, 2.0]
+
+
+async def test_windows_missed_while_down_are_caught_up(recorder_mock, hass, hass_storage, setup_tracker):
+    start = hours_ago(len(MEANS) + 1)
+    await import_hourly_means(hass, start, MEANS)
+    # The last window processed before the downtime was the first one
+    hass_storage[f"{DOMAIN}.tracker"] = {
+        "version": STORAGE_VERSION,
+        "minor_version": 1,
+        "key": f"{DOMAIN}.tracker",
+        "data": {"peaks": [{"value": 1.0, "start": start.isoformat()}], "last_window": start.isoformat()},
+    }
+    set_phases(hass)
+    coordinator = await setup_tracker({CONF_SOURCE_SENSOR: PHASES, CONF_NUM_MAX_VALUES: 3})
+    assert coordinator.max_values == [1.0, 0.0, 0.0]
+
+    # The catch-up runs once the statistics of the last missed window are compiled
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=STATISTICS_DELAY + 1))
+    await hass.async_block_till_done()
+    assert coordinator.max_values == pytest.approx([4.0, 3.0, 2.0])
+    assert coordinator.last_window == start + timedelta(hours=len(MEANS) - 1)
@@ -0,0 +1,65 @@
+"""Tests for the shared source subscription."""
+from datetime import timedelta
+
+import pytest
+from homeassistant.core import EVENT_STATE_CHANGED, State
+
+from custom_components.power_max_tracker.dispatcher import async_get_dispatcher
+
+
+async def test_samples_are_parsed_once_and_fanned_out_in_order(hass):
+    hass.states.async_set("sensor.power", "1.5", {"unit_of_measurement": "kW"})
+    dispatcher = async_get_dispatcher(hass)
+    received = []
+    unsubscribe_first = dispatcher.async_subscribe("sensor.power", lambda sample: received.append(("first", sample)))
+    unsubscribe_second = dispatcher.async_subscribe("sensor.power", lambda sample: received.append(("second", sample)))
+    assert dispatcher.async_last_sample("sensor.power").value == pytest.approx(1500.0)
+
+    hass.states.async_set("sensor.power", "2", {"unit_of_measurement": "kW"})
+    await hass.async_block_till_done()
+    assert [name for name, _ in received] == ["first", "second"]
+    assert received[0][1] is received[1][1]
+    assert received[0][1].value == pytest.approx(2000.0)
+
+    unsubscribe_first()
+    unsubscribe_second()
+    hass.states.async_set("sensor.power", "3", {"unit_of_measurement": "kW"})
+    await hass.async_block_till_done()
+    assert len(received) == 2
+    assert dispatcher.async_last_sample("sensor.power") is None
+
+
+async def test_samples_are_stamped_with_the_state_update_time(hass):
+    hass.states.async_set("sensor.power", "100")
+    dispatcher = async_get_dispatcher(hass)
+    received = []
+    dispatcher.async_subscribe("sensor.power", received.append)
+    assert dispatcher.async_last_sample("sensor.power").time == hass.states.get("sensor.power").last_updated
+
+    # Samples carry the update time of their state, but never go back before the previous sample
+    updated = hass.states.get("sensor.power").last_updated + timedelta(seconds=5)
+    for value, last_updated in (("200", updated), ("300", updated - timedelta(seconds=10))):
+        hass.bus.async_fire(EVENT_STATE_CHANGED, {
+            "entity_id": "sensor.power",
+            "old_state": None,
+            "new_state": State("sensor.power", value, last_updated=last_updated),
+        })
+        await hass.async_block_till_done()
+    assert [(sample.time, sample.value) for sample in received] == [(updated, 200.0), (updated, 300.0)]
+
+
+@pytest.mark.parametrize(("state", "attributes", "value"), [
+    ("unavailable", {}, None),
+    ("unknown", {}, None),
+    ("not a number", {}, None),
+    ("-250", {"unit_of_measurement": "W"}, 0.0),
+    ("1200", {}, 1200.0),
+    ("2500", {"unit_of_measurement": "Wh"}, 2.5),
+])
+async def test_states_are_parsed(hass, state, attributes, value):
+    dispatcher = async_get_dispatcher(hass)
+    received = []
+    dispatcher.async_subscribe("sensor.source", received.append)
+    hass.states.async_set("sensor.source", state, attributes)
+    await hass.async_block_till_done()
+    assert received[-1].value == value
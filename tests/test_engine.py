@@ -0,0 +1,93 @@
+"""Tests for the peak engine shared by the integration and the audit tool."""
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from custom_components.power_max_tracker.engine import (
+    PeakEngine,
+    StateTimeline,
+    TrackerProfile,
+    fold_window,
+    month_start,
+    next_month_start,
+    next_reset_boundary,
+)
+from custom_components.power_max_tracker.schedule import GateSchedule
+
+STOCKHOLM = ZoneInfo("Europe/Stockholm")
+
+
+@pytest.mark.parametrize(("period_start", "boundary"), [
+    # Into summer time: the month ends at 22:00 UTC instead of 23:00
+    (datetime(2025, 3, 1, tzinfo=STOCKHOLM), datetime(2025, 3, 31, 22, tzinfo=timezone.utc)),
+    # Out of summer time: the month ends at 23:00 UTC again
+    (datetime(2025, 10, 1, tzinfo=STOCKHOLM), datetime(2025, 10, 31, 23, tzinfo=timezone.utc)),
+])
+def test_next_reset_boundary_across_dst(period_start, boundary):
+    profile = TrackerProfile("", "", monthly_reset=True)
+    profile.period_start = period_start
+    assert next_reset_boundary([profile], boundary - timedelta(seconds=1)) is None
+    assert next_reset_boundary([profile], boundary) == boundary
+    assert next_reset_boundary([profile], boundary + timedelta(days=3)) == boundary
+    local = next_reset_boundary([profile], boundary)
+    assert (local.day, local.hour) == (1, 0)
+
+
+def test_next_reset_boundary_ignores_profiles_without_reset():
+    profile = TrackerProfile("", "")
+    profile.period_start = datetime(2025, 1, 1, tzinfo=STOCKHOLM)
+    assert next_reset_boundary([profile], datetime(2025, 6, 1, tzinfo=STOCKHOLM)) is None
+
+
+def test_month_start_keeps_the_wall_clock():
+    moment = datetime(2025, 3, 30, 12, tzinfo=STOCKHOLM)  # Summer time
+    assert month_start(moment).utcoffset() == timedelta(hours=1)
+    assert next_month_start(moment).utcoffset() == timedelta(hours=2)
+    assert next_month_start(datetime(2025, 12, 31, 23, tzinfo=STOCKHOLM)) == datetime(2026, 1, 1, tzinfo=STOCKHOLM)
+
+
+def test_fold_window_respects_each_profiles_gate():
+    weekdays = TrackerProfile("weekdays", "Weekdays", schedule=GateSchedule(weekdays=[0, 1, 2, 3, 4]))
+    everything = TrackerProfile("", "")
+    saturday = datetime(2025, 1, 11, 12, tzinfo=STOCKHOLM)
+    assert fold_window([everything, weekdays], saturday, 5.0)
+    assert everything.peak_store.values[0] == 5.0
+    assert weekdays.peak_store.values[0] == 0.0
+    assert not fold_window([everything], saturday + timedelta(hours=1), -1.0)
+
+
+def test_binary_sensor_is_checked_at_the_start_of_each_window():
+    night = TrackerProfile("night", "Night", binary_sensor="binary_sensor.night")
+    start = datetime(2025, 1, 6, 22, tzinfo=STOCKHOLM)
+    night.binary_states.record(start, True)
+    night.binary_states.record(start + timedelta(hours=2), False)
+    night.binary_on = False  # The current state no longer applies to the closed windows
+    assert fold_window([night], start + timedelta(hours=1), 3.0)
+    assert not fold_window([night], start + timedelta(hours=2), 4.0)
+    assert night.can_fold(start - timedelta(hours=1)) is False  # Before the first change: the current state
+
+    # Recorded history takes precedence over the recent changes
+    recorded = StateTimeline()
+    recorded.record(start - timedelta(days=1), True)
+    assert fold_window([night], start + timedelta(hours=3), 5.0, binary_states={"night": recorded})
+    assert night.peak_store.values == [5.0, 3.0]
+
+    night.binary_states.prune(start + timedelta(hours=3))
+    assert night.binary_states.state_at(start + timedelta(hours=3)) is False
+    assert night.binary_states.state_at(start + timedelta(hours=1)) is None
+
+
+def test_engine_closes_monthly_periods():
+    profile = TrackerProfile("", "", num_max_values=1, monthly_reset=True)
+    engine = PeakEngine([profile], 60, STOCKHOLM)
+    january = datetime(2025, 1, 20, 17, tzinfo=STOCKHOLM)
+    february = datetime(2025, 2, 3, 8, tzinfo=STOCKHOLM)
+    engine.add_window(january, 4000.0)
+    engine.add_window(february, 3000.0)
+    ((key, start, end, peaks),) = engine.closed_periods
+    assert (key, start, end) == ("", datetime(2025, 1, 1, tzinfo=STOCKHOLM), datetime(2025, 2, 1, tzinfo=STOCKHOLM))
+    assert [(peak.value, peak.start) for peak in peaks] == [(4.0, january)]
+    ((_, current_start, _, current),) = engine.current_periods()
+    assert current_start == datetime(2025, 2, 1, tzinfo=STOCKHOLM)
+    assert current[0].value == 3.0
@@ -0,0 +1,48 @@
+"""Tests for the long-term statistics publisher."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.power_max_tracker import external_statistics
+from custom_components.power_max_tracker.external_statistics import StatisticsPublisher, statistic_id
+
+START = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def imported(monkeypatch):
+    """Capture the rows imported per statistic id."""
+    rows = {}
+    monkeypatch.setattr(
+        external_statistics, "async_add_external_statistics",
+        lambda hass, metadata, data: rows.setdefault(metadata["statistic_id"], []).extend(data),
+    )
+    return rows
+
+
+def test_windows_are_rolled_up_per_complete_hour(hass, imported):
+    publisher = StatisticsPublisher(hass, "ENTRY", "Power Max")
+    for quarter, mean_kw in enumerate([1.0, 3.0, 2.0, 6.0, 4.0]):
+        publisher.add(START + timedelta(minutes=15 * quarter), mean_kw, 0.5 + quarter)
+    publisher.async_flush(START + timedelta(minutes=75))
+    (window_row,) = imported[statistic_id("ENTRY", "window_average")]
+    assert window_row["start"] == START
+    assert (window_row["mean"], window_row["min"], window_row["max"]) == (3.0, 1.0, 6.0)
+    (average_max_row,) = imported[statistic_id("ENTRY", "average_max")]
+    assert average_max_row["mean"] == 3.5  # After the last window of the hour
+
+    # The second hour is imported once it is complete
+    publisher.async_flush(START + timedelta(hours=2))
+    assert [row["mean"] for row in imported[statistic_id("ENTRY", "window_average")]] == [3.0, 4.0]
+    publisher.async_flush(START + timedelta(hours=3))
+    assert len(imported[statistic_id("ENTRY", "window_average")]) == 2
+
+
+def test_unknown_peak_average_leaves_its_row_out(hass, imported):
+    publisher = StatisticsPublisher(hass, "ENTRY", "Power Max")
+    publisher.add(START, 2.0, 1.5)
+    publisher.add(START + timedelta(minutes=15), 4.0)  # Folded after later windows
+    publisher.add(START + timedelta(hours=1), 3.0)
+    publisher.async_flush(START + timedelta(hours=2))
+    assert [row["mean"] for row in imported[statistic_id("ENTRY", "window_average")]] == [3.0, 3.0]
+    assert [(row["start"], row["mean"]) for row in imported[statistic_id("ENTRY", "average_max")]] == [(START, 1.5)]
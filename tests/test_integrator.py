@@ -0,0 +1,130 @@
+"""Tests for the window integrator."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.power_max_tracker.integrator import EnergyCounters, SourceSum, WindowIntegrator
+
+START = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+def replay_meters(integrator, meters, interval, until, watts=2000.0):
+    """Feed readings of meters at a constant load every interval, advancing at each window boundary."""
+    counters = EnergyCounters(meters)
+    events = []
+    for index, meter in enumerate(meters):
+        offset = timedelta(minutes=index)  # Meters report at different times
+        moment = START + offset
+        while moment <= until:
+            events.append((moment, 0, meter))
+            moment += interval
+    boundary = START + integrator.window
+    while boundary <= until:
+        events.append((boundary, 1, None))
+        boundary += integrator.window
+    integrator.start(START)
+    closed = []
+    for moment, is_boundary, meter in sorted(events, key=lambda event: event[:2]):
+        if is_boundary:
+            closed.extend(integrator.advance(moment))
+            continue
+        kwh = watts / len(meters) * (moment - START).total_seconds() / 3600000
+        reading = counters.update(meter, moment, kwh)
+        if reading is not None:
+            closed.extend(integrator.add_segment(reading[0], moment, reading[1], 1 / len(meters), meter))
+    return closed
+
+
+@pytest.mark.parametrize("meters", [["sensor.meter"], ["sensor.l1", "sensor.l2", "sensor.l3"]])
+def test_sparse_meter_readings_are_split_at_window_boundaries(meters):
+    integrator = WindowIntegrator(15, meters=len(meters))
+    closed = replay_meters(integrator, meters, timedelta(minutes=7), START + timedelta(hours=2))
+    # The first window starts before the first reading of the later meters, and the last ones wait for a reading
+    full = [window for window in closed if window.start >= START + timedelta(minutes=15)]
+    assert len(full) >= 5
+    for window in full:
+        assert window.mean == pytest.approx(2000.0)
+        assert window.coverage == pytest.approx(1.0)
+
+
+def test_pending_windows_are_released_after_a_silence():
+    integrator = WindowIntegrator(15, meters=1)
+    integrator.start(START)
+    integrator.add_segment(START, START + timedelta(minutes=10), 1000.0, 1.0, "sensor.meter")
+    assert integrator.advance(START + timedelta(minutes=15)) == []
+    assert integrator.release_pending(START + timedelta(minutes=14)) == []
+    (window,) = integrator.release_pending(START + timedelta(minutes=15))
+    assert window.start == START
+    assert window.mean == pytest.approx(1000.0 * 10 / 15)
+    assert window.coverage == pytest.approx(10 / 15)
+
+
+def test_power_samples_close_windows_at_the_boundary():
+    integrator = WindowIntegrator(15)
+    integrator.start(START)
+    integrator.add_sample(START, 1000.0)
+    integrator.add_sample(START + timedelta(minutes=10), 2000.0)
+    (window,) = integrator.advance(START + timedelta(minutes=15))
+    # Trapezoid to the last sample, then the last power is held to the boundary
+    assert window.mean == pytest.approx((1500.0 * 10 + 2000.0 * 5) / 15)
+    assert window.coverage == pytest.approx(1.0)
+
+
+def test_unavailable_source_leaves_a_gap():
+    integrator = WindowIntegrator(15)
+    integrator.start(START)
+    integrator.add_sample(START, 1200.0)
+    integrator.add_sample(START + timedelta(minutes=5), None)
+    integrator.add_sample(START + timedelta(minutes=10), 1200.0)
+    (window,) = integrator.advance(START + timedelta(minutes=15))
+    assert window.coverage == pytest.approx(10 / 15)
+    assert window.mean == pytest.approx(1200.0 * 10 / 15)
+
+
+def test_snapshot_round_trip():
+    integrator = WindowIntegrator(30)
+    integrator.start(START)
+    integrator.add_sample(START, 500.0)
+    integrator.add_sample(START + timedelta(minutes=12), 500.0)
+    restored = WindowIntegrator(30)
+    assert restored.restore(integrator.snapshot())
+    assert restored.window_start == integrator.window_start
+    assert restored.energy == pytest.approx(integrator.energy)
+    assert restored.last_power is None
+    assert not WindowIntegrator(15).restore(integrator.snapshot())
+
+
+def test_summed_sources_are_held_between_changes():
+    sources = SourceSum(["sensor.l1", "sensor.l2"])
+    trapezoid = WindowIntegrator(15)
+    hold = WindowIntegrator(15, hold=True)
+    readings = [(0, "sensor.l1", 1000.0), (0, "sensor.l2", 0.0), (5, "sensor.l2", 3000.0), (10, "sensor.l1", 0.0)]
+    for integrator in (trapezoid, hold):
+        integrator.start(START)
+    for minute, source, watts in readings:
+        total = sources.update(source, watts)
+        for integrator in (trapezoid, hold):
+            integrator.add_sample(START + timedelta(minutes=minute), total)
+    (held,) = hold.advance(START + timedelta(minutes=15))
+    (interpolated,) = trapezoid.advance(START + timedelta(minutes=15))
+    # 1 kW for 5 minutes, 4 kW for 5 minutes and 3 kW for 5 minutes
+    assert held.mean == pytest.approx((1000.0 + 4000.0 + 3000.0) / 3)
+    assert interpolated.mean != pytest.approx(held.mean)
+
+
+@pytest.mark.parametrize(("hold", "means"), [
+    # The window is closed holding the last power, and the next one interpolates from it to 3 kW
+    (False, [1000.0, (2000.0 * 5 + 3000.0 * 10) / 15]),
+    # Held, the 1 kW lasts until the next sample in the next window
+    (True, [1000.0, (1000.0 * 5 + 3000.0 * 10) / 15]),
+])
+def test_trapezoid_and_hold_across_a_window_boundary(hold, means):
+    integrator = WindowIntegrator(15, hold=hold)
+    integrator.start(START)
+    closed = []
+    for minute, watts in ((0, 1000.0), (10, 1000.0), (20, 3000.0)):
+        closed.extend(integrator.add_sample(START + timedelta(minutes=minute), watts))
+    closed.extend(integrator.advance(START + timedelta(minutes=30)))
+    assert [window.start for window in closed] == [START, START + timedelta(minutes=15)]
+    assert [window.mean for window in closed] == pytest.approx(means)
+    assert [window.coverage for window in closed] == pytest.approx([1.0, 1.0])
@@ -0,0 +1,112 @@
+"""Tests for the top-K peak stores."""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.power_max_tracker.peaks import (
+    UNIQUE_DAY,
+    UNIQUE_WEEK,
+    UNIQUE_WINDOW,
+    PeakStore,
+    RollingPeakStore,
+)
+
+START = datetime(2025, 1, 6, tzinfo=timezone.utc)  # A Monday
+
+
+def hours(count):
+    return START + timedelta(hours=count)
+
+
+def test_keeps_the_largest_windows():
+    store = PeakStore(3)
+    for hour, value in enumerate([1.0, 5.0, 2.0, 4.0, 3.0]):
+        store.add(hours(hour), value)
+    assert store.values == [5.0, 4.0, 3.0]
+    assert [peak.start for peak in store.peaks] == [hours(1), hours(3), hours(4)]
+    assert store.min_value == 3.0
+
+
+def test_adding_a_window_again_is_a_no_op():
+    store = PeakStore(2, UNIQUE_WINDOW)
+    assert store.add(hours(0), 3.0)
+    assert not store.add(hours(0), 3.0)
+    assert store.add(hours(0), 4.0)  # A larger value for the same window replaces it
+    assert store.values == [4.0, 0.0]
+
+
+@pytest.mark.parametrize(("uniqueness", "expected"), [
+    (UNIQUE_WINDOW, [9.0, 8.0, 7.0]),
+    (UNIQUE_DAY, [9.0, 7.0, 3.0]),
+    (UNIQUE_WEEK, [9.0, 0.0, 0.0]),
+])
+def test_uniqueness_buckets(uniqueness, expected):
+    store = PeakStore(3, uniqueness)
+    # Three days of the same week with two windows each
+    for day, values in enumerate([(9.0, 8.0), (7.0, 6.0), (3.0, 1.0)]):
+        ordered = sorted(values) if day == 1 else values  # A larger window later in the day replaces the first
+        for hour, value in enumerate(ordered):
+            store.add(START + timedelta(days=day, hours=hour), value)
+    assert store.values == expected
+
+
+def test_legacy_values_and_round_trip():
+    store = PeakStore(3)
+    store.load([4.0, 2.5, 0.0])
+    assert store.values == [4.0, 2.5, 0.0]
+    store.add(hours(1), 3.0)
+    restored = PeakStore(3)
+    restored.load(store.as_list())
+    assert restored.values == [4.0, 3.0, 2.5]
+
+
+def brute_force(windows, now, size, rolling_days, bucket):
+    """Return the top values of the windows within rolling_days before now, one per bucket."""
+    best = {}
+    for start, value in windows:
+        if now - timedelta(days=rolling_days) < start <= now:
+            key = bucket(start)
+            best[key] = max(best.get(key, 0.0), value)
+    values = sorted(best.values(), reverse=True)[:size]
+    return values + [0.0] * (size - len(values))
+
+
+@pytest.mark.parametrize("uniqueness", [UNIQUE_WINDOW, UNIQUE_DAY])
+def test_rolling_store_matches_brute_force(uniqueness):
+    rng = random.Random(7)
+    store = RollingPeakStore(3, uniqueness, rolling_days=2)
+    windows = []
+    bucket = (lambda start: start) if uniqueness == UNIQUE_WINDOW else (lambda start: start.date())
+    for hour in range(24 * 10):
+        start = hours(hour)
+        value = round(rng.uniform(0.5, 10.0), 2)
+        windows.append((start, value))
+        store.add(start, value)
+        store.expire(start)
+        assert store.values == brute_force(windows, start, 3, 2, bucket)
+    # Candidates are dropped once they can no longer reach the top, so few are kept
+    assert len(store.as_list()) < 24 * 2
+
+
+def test_rolling_store_expires_old_peaks():
+    store = RollingPeakStore(2, rolling_days=1)
+    store.add(hours(0), 9.0)
+    store.add(hours(1), 2.0)
+    assert store.values == [9.0, 2.0]
+    assert not store.expire(hours(23))
+    assert store.expire(hours(24))
+    assert store.values == [2.0, 0.0]
+    assert not store.add(hours(0), 9.0)  # Already aged out
+
+
+def test_rolling_store_accepts_out_of_order_windows():
+    store = RollingPeakStore(2, rolling_days=7)
+    store.add(hours(10), 5.0)
+    store.add(hours(11), 6.0)
+    assert store.add(hours(2), 7.0)  # A backfilled window
+    assert not store.add(hours(3), 1.0)
+    assert store.values == [7.0, 6.0]
+    restored = RollingPeakStore(2, rolling_days=7)
+    restored.load(store.as_list())
+    assert restored.values == [7.0, 6.0]
@@ -0,0 +1,62 @@
+"""Tests for the compiled gating schedule."""
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from custom_components.power_max_tracker.schedule import GateSchedule, parse_holidays, parse_hour_ranges
+
+STOCKHOLM = ZoneInfo("Europe/Stockholm")
+
+
+def local(*args):
+    return datetime(*args, tzinfo=STOCKHOLM)
+
+
+def test_parse_hour_ranges():
+    assert parse_hour_ranges("7-12, 13-20") == [(7, 12), (13, 20)]
+    assert parse_hour_ranges("22") == [(22, 23)]
+    assert parse_hour_ranges("") == []
+    for invalid in ("20-7", "0-25", "seven"):
+        with pytest.raises(ValueError):
+            parse_hour_ranges(invalid)
+
+
+def test_parse_holidays():
+    assert parse_holidays("2025-12-24, 2025-12-25") == {date(2025, 12, 24), date(2025, 12, 25)}
+    assert parse_holidays(["2025-01-01", ""]) == {date(2025, 1, 1)}
+    assert parse_holidays(None) == set()
+
+
+def test_is_open_at():
+    schedule = GateSchedule(months=[1, 2, 3, 11, 12], weekdays=[0, 1, 2, 3, 4], hours="7-20",
+                            holidays=["2025-01-06"])
+    assert schedule.is_open_at(local(2025, 1, 7, 7))  # Tuesday morning
+    assert not schedule.is_open_at(local(2025, 1, 7, 20))  # End hours are exclusive
+    assert not schedule.is_open_at(local(2025, 1, 11, 12))  # Saturday
+    assert not schedule.is_open_at(local(2025, 6, 3, 12))  # Summer
+    assert not schedule.is_open_at(local(2025, 1, 6, 12))  # Holiday
+    assert GateSchedule().is_open_at(local(2025, 6, 3, 3))
+
+
+def test_invalid_months_and_weekdays():
+    with pytest.raises(ValueError):
+        GateSchedule(months=[13])
+    with pytest.raises(ValueError):
+        GateSchedule(weekdays=[7])
+
+
+def test_next_transition():
+    schedule = GateSchedule(weekdays=[0, 1, 2, 3, 4], hours="7-20")
+    assert schedule.next_transition(local(2025, 1, 10, 19, 30)) == local(2025, 1, 10, 20)
+    # From Friday evening the gate next opens on Monday morning
+    assert schedule.next_transition(local(2025, 1, 10, 21)) == local(2025, 1, 13, 7)
+    assert GateSchedule().next_transition(local(2025, 1, 10, 21)) is None
+
+
+def test_next_transition_across_dst():
+    schedule = GateSchedule(hours="2-4")
+    # 02:00 does not exist on the day summer time starts, so the gate opens at 03:00
+    transition = schedule.next_transition(local(2025, 3, 30, 1, 30))
+    assert transition == local(2025, 3, 30, 3)
+    assert transition.utcoffset().total_seconds() == 7200
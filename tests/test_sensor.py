@@ -0,0 +1,50 @@
+"""Tests for the sensor entity names and state writes."""
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.power_max_tracker.const import (
+    CONF_MIN_PUBLISH_DELTA,
+    CONF_SOURCE_SENSOR,
+    DOMAIN,
+    MAX_PUBLISH_AGE,
+)
+
+from custom_components.power_max_tracker.engine import TrackerProfile
+from custom_components.power_max_tracker.sensor import (
+    AverageMaxPowerSensor,
+    PercentilePowerSensor,
+    window_label,
+)
+
+
+@pytest.mark.parametrize(("minutes", "label"), [(15, "15-Minute"), (30, "30-Minute"), (60, "Hourly")])
+def test_names_follow_the_window_length(minutes, label):
+    entry = SimpleNamespace(entry_id="entry", data={})
+    profile = TrackerProfile("", "", window_minutes=minutes, percentiles=[95])
+    coordinator = SimpleNamespace(profile=profile, window_minutes=minutes)
+    assert window_label(minutes) == label
+    assert AverageMaxPowerSensor(coordinator, entry).name == f"Average Max {label} Average Power"
+    assert PercentilePowerSensor(coordinator, entry, 95).name == f"P95 {label} Average Power"
+    named = TrackerProfile("peak", "Peak", window_minutes=minutes)
+    assert AverageMaxPowerSensor(coordinator, entry, named).name == f"Peak Average Max {label} Average Power"
+
+
+async def test_changes_below_the_delta_are_written_late(recorder_mock, hass, setup_tracker):
+    hass.states.async_set("sensor.power", "1000", {"unit_of_measurement": "W"})
+    await setup_tracker({CONF_SOURCE_SENSOR: "sensor.power", CONF_MIN_PUBLISH_DELTA: 50})
+    source = er.async_get(hass).async_get_entity_id("sensor", DOMAIN, "tracker_source")
+    hass.states.async_set("sensor.power", "1200", {"unit_of_measurement": "W"})
+    await hass.async_block_till_done()
+    assert hass.states.get(source).state == "1200.0"
+
+    hass.states.async_set("sensor.power", "1220", {"unit_of_measurement": "W"})
+    await hass.async_block_till_done()
+    assert hass.states.get(source).state == "1200.0"
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=MAX_PUBLISH_AGE + 1))
+    await hass.async_block_till_done()
+    assert hass.states.get(source).state == "1220.0"
@@ -0,0 +1,78 @@
+"""Tests for the priority load shedding controller."""
+from datetime import datetime, timedelta, timezone
+
+from pytest_homeassistant_custom_component.common import async_capture_events, async_mock_service
+
+from custom_components.power_max_tracker.const import EVENT_LOAD_SHED, SHED_SETTLE_TIME
+from custom_components.power_max_tracker.shedding import LoadShedder
+
+START = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+LOADS = ["switch.heater", "climate.heat_pump", "number.charger"]
+
+
+def settled(steps):
+    """Return the time after the given number of settle periods."""
+    return START + timedelta(seconds=SHED_SETTLE_TIME * steps)
+
+
+async def test_sheds_in_order_and_restores_in_reverse(hass):
+    hass.states.async_set("switch.heater", "on")
+    hass.states.async_set("climate.heat_pump", "heat")
+    hass.states.async_set("number.charger", "16", {"min": 6})
+    calls = {
+        service: async_mock_service(hass, domain, service)
+        for domain, service in (("switch", "turn_off"), ("switch", "turn_on"),
+                                ("climate", "set_hvac_mode"), ("number", "set_value"))
+    }
+    events = async_capture_events(hass, EVENT_LOAD_SHED)
+    shedder = LoadShedder(hass, "entry", LOADS, min_on=0, min_off=0, hysteresis=0.1)
+
+    shedder.async_update(settled(0), 5.0, 4.0)
+    shedder.async_update(settled(0.5), 5.0, 4.0)  # Not settled yet
+    shedder.async_update(settled(1), 5.0, 4.0)
+    shedder.async_update(settled(2), 4.0, 4.0)
+    await hass.async_block_till_done()
+    assert list(shedder.shed) == LOADS
+    assert calls["turn_off"][0].data == {"entity_id": "switch.heater"}
+    assert calls["set_hvac_mode"][0].data == {"entity_id": "climate.heat_pump", "hvac_mode": "off"}
+    assert calls["set_value"][0].data == {"entity_id": "number.charger", "value": 6}
+
+    shedder.async_update(settled(3), 3.8, 4.0)  # Within the hysteresis
+    assert len(shedder.shed) == 3
+    shedder.async_update(settled(4), 3.5, 4.0)
+    shedder.async_update(settled(5), 0.0, 0.0)  # Outside the gate every load is restored
+    shedder.async_update(settled(6), 0.0, 0.0)
+    await hass.async_block_till_done()
+    assert shedder.shed == {}
+    assert calls["set_value"][1].data == {"entity_id": "number.charger", "value": 16.0}
+    assert calls["set_hvac_mode"][1].data == {"entity_id": "climate.heat_pump", "hvac_mode": "heat"}
+    assert calls["turn_on"][0].data == {"entity_id": "switch.heater"}
+    assert [event.data["action"] for event in events] == ["shed"] * 3 + ["restore"] * 3
+
+
+async def test_loads_that_are_off_are_skipped(hass):
+    hass.states.async_set("switch.heater", "off")
+    hass.states.async_set("climate.heat_pump", "heat")
+    hass.states.async_set("number.charger", "6", {"min": 6})
+    async_mock_service(hass, "climate", "set_hvac_mode")
+    shedder = LoadShedder(hass, "entry", LOADS, min_on=0, min_off=0, hysteresis=0.1)
+    shedder.async_update(settled(0), 5.0, 4.0)
+    shedder.async_update(settled(1), 5.0, 4.0)
+    await hass.async_block_till_done()
+    assert list(shedder.shed) == ["climate.heat_pump"]
+
+
+async def test_minimum_off_time_and_round_trip(hass):
+    hass.states.async_set("switch.heater", "on")
+    async_mock_service(hass, "switch", "turn_off")
+    shedder = LoadShedder(hass, "entry", LOADS, min_on=0, min_off=600, hysteresis=0.1)
+    shedder.async_update(settled(0), 5.0, 4.0)
+    shedder.async_update(settled(1), 1.0, 4.0)  # Off for less than min_off
+    await hass.async_block_till_done()
+    assert list(shedder.shed) == ["switch.heater"]
+
+    restored = LoadShedder(hass, "entry", LOADS, min_on=0, min_off=600, hysteresis=0.1)
+    restored.load(shedder.as_dict())
+    assert restored.shed == {"switch.heater": "on"}
+    restored.async_update(START + timedelta(seconds=300), 1.0, 4.0)
+    assert restored.shed == {"switch.heater": "on"}
@@ -0,0 +1,136 @@
+"""Tests for the quantile sketch and the counted windows."""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.power_max_tracker.engine import TrackerProfile, fold_window
+from custom_components.power_max_tracker.sketch import (
+    RELATIVE_ACCURACY,
+    CountedWindows,
+    QuantileSketch,
+    parse_percentiles,
+    percentile_label,
+)
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def test_counted_windows_in_any_order():
+    counted = CountedWindows(15)
+    window = timedelta(minutes=15)
+    assert counted.add(START + 4 * window)
+    assert counted.add(START)  # Before the origin
+    assert counted.add(START + 2 * window)
+    assert not counted.add(START + 4 * window)
+    assert not counted.add(START)
+    assert len(counted) == 3
+
+
+def test_counted_windows_round_trip():
+    counted = CountedWindows(60)
+    for hour in (0, 5, 700):
+        counted.add(START + timedelta(hours=hour))
+    restored = CountedWindows(60)
+    restored.load(counted.as_dict())
+    assert len(restored) == 3
+    assert not restored.add(START + timedelta(hours=700))
+    assert restored.add(START + timedelta(hours=1))
+    other = CountedWindows(15)
+    other.load(counted.as_dict())
+    assert len(other) == 0
+
+
+def test_counted_windows_are_bounded_by_the_horizon():
+    counted = CountedWindows(60, horizon_days=2)
+    for hour in range(24 * 30):
+        assert counted.add(START + timedelta(hours=hour))
+    assert len(counted) == 48
+    assert counted._bits.bit_length() == 48
+    # Windows behind the horizon are taken as counted, those within it are still tracked
+    assert not counted.add(START)
+    assert not counted.add(START + timedelta(hours=24 * 30 - 48))
+    assert counted.add(START + timedelta(hours=24 * 30 + 5))
+    assert len(counted) == 43  # The gap moved the origin past five windows
+    restored = CountedWindows(60, horizon_days=1)
+    restored.load(counted.as_dict())
+    assert len(restored) == 19  # The last day: 18 windows before the gap and the latest one
+
+
+def test_window_is_counted_once_when_folded_again_out_of_order():
+    profile = TrackerProfile("", "", num_max_values=2)
+    late = START + timedelta(hours=3)
+    fold_window([profile], late, 4.0)
+    # An earlier window folded after a later one, e.g. by a catch-up, is still counted
+    fold_window([profile], START, 2.0)
+    fold_window([profile], START, 2.0)
+    fold_window([profile], late, 4.0)
+    assert profile.sketch.count == 2
+    profile.clear()
+    fold_window([profile], START, 2.0)
+    assert profile.sketch.count == 1
+
+
+def exact(values, q):
+    """Return the quantile the sketch approximates: the value at rank q * (n - 1)."""
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantiles_are_within_the_relative_accuracy(q):
+    rng = random.Random(3)
+    values = [rng.lognormvariate(0.5, 0.8) for _ in range(20000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    assert sketch.quantile(q) == pytest.approx(exact(values, q), rel=RELATIVE_ACCURACY)
+
+
+def test_merge_equals_one_sketch_of_all_values():
+    rng = random.Random(5)
+    values = [rng.uniform(0.0, 12.0) for _ in range(5000)] + [0.0] * 50
+    whole = QuantileSketch()
+    parts = [QuantileSketch() for _ in range(4)]
+    for index, value in enumerate(values):
+        whole.add(value)
+        parts[index % 4].add(value)
+    merged = QuantileSketch()
+    for part in parts:
+        merged.merge(part)
+    assert merged.count == whole.count == len(values)
+    assert merged.zero_count == whole.zero_count == 50
+    for q in (0.0, 0.1, 0.5, 0.95, 1.0):
+        assert merged.quantile(q) == whole.quantile(q)
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(relative_accuracy=0.02))
+
+
+def test_bucket_limit_only_affects_the_lowest_quantiles():
+    sketch = QuantileSketch(max_buckets=64)
+    values = [0.01 * 1.05 ** step for step in range(400)]
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.as_dict()["counts"]) <= 64
+    assert sketch.quantile(0.99) == pytest.approx(exact(values, 0.99), rel=RELATIVE_ACCURACY)
+
+
+def test_sketch_round_trip():
+    sketch = QuantileSketch()
+    for value in (0.0, 1.0, 2.0, 3.5):
+        sketch.add(value)
+    restored = QuantileSketch()
+    restored.load(sketch.as_dict())
+    assert restored.count == 4
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_parse_percentiles():
+    assert parse_percentiles("99, 95;95") == [95.0, 99.0]
+    assert parse_percentiles([50, "99.5"]) == [50.0, 99.5]
+    assert parse_percentiles(None) == []
+    assert percentile_label(99.5) == "99_5"
+    for invalid in ("0", "101", "p95"):
+        with pytest.raises(ValueError):
+            parse_percentiles(invalid)
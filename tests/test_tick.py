@@ -0,0 +1,26 @@
+"""Tests for the shared tick."""
+from datetime import datetime, timedelta, timezone
+
+from custom_components.power_max_tracker.tick import async_get_ticker
+
+START = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+async def test_listeners_share_one_timer_at_their_own_interval(hass):
+    ticker = async_get_ticker(hass)
+    fast, slow = [], []
+    remove_fast = ticker.async_add_listener(fast.append, 10)
+    remove_slow = ticker.async_add_listener(slow.append, 30)
+    assert ticker._interval == 10
+    ticks = [START + timedelta(seconds=seconds) for seconds in (0, 10, 20, 29, 40, 50, 60)]
+    for now in ticks:
+        ticker._async_tick(now)
+    assert fast == ticks
+    # A slightly early tick does not skip the slow listener's turn
+    assert slow == [ticks[0], ticks[3], ticks[6]]
+
+    remove_fast()
+    assert ticker._interval == 30
+    remove_slow()
+    assert ticker._interval is None
+    assert ticker._unsub is None
@@ -0,0 +1,52 @@
+"""Tests for the live websocket subscription."""
+from custom_components.power_max_tracker.const import CONF_SOURCE_SENSOR, DOMAIN
+
+
+async def test_subscription_streams_live_values(recorder_mock, hass, hass_ws_client, setup_tracker):
+    hass.states.async_set("sensor.power", "1000", {"unit_of_measurement": "W"})
+    await setup_tracker({CONF_SOURCE_SENSOR: "sensor.power"})
+    client = await hass_ws_client(hass)
+
+    await client.send_json({"id": 1, "type": f"{DOMAIN}/subscribe", "entry_id": "tracker", "min_interval": 0})
+    assert (await client.receive_json())["success"]
+    # The current values are sent right away
+    message = await client.receive_json()
+    assert message["type"] == "event"
+    assert message["event"]["entry_id"] == "tracker"
+    assert message["event"]["power"] == 1000.0
+
+    hass.states.async_set("sensor.power", "2500", {"unit_of_measurement": "W"})
+    await hass.async_block_till_done()
+    message = await client.receive_json()
+    assert message["event"]["power"] == 2500.0
+    assert message["event"]["gate_open"]
+
+
+async def test_unknown_entry_is_an_error(recorder_mock, hass, hass_ws_client, setup_tracker):
+    hass.states.async_set("sensor.power", "1000", {"unit_of_measurement": "W"})
+    await setup_tracker({CONF_SOURCE_SENSOR: "sensor.power"})
+    client = await hass_ws_client(hass)
+    await client.send_json({"id": 1, "type": f"{DOMAIN}/subscribe", "entry_id": "missing"})
+    message = await client.receive_json()
+    assert not message["success"]
+    assert message["error"]["code"] == "not_found"
+
+
+async def test_unloading_the_entry_ends_the_subscription(recorder_mock, hass, hass_ws_client, setup_tracker):
+    hass.states.async_set("sensor.power", "1000", {"unit_of_measurement": "W"})
+    coordinator = await setup_tracker({CONF_SOURCE_SENSOR: "sensor.power"})
+    client = await hass_ws_client(hass)
+    await client.send_json({"id": 1, "type": f"{DOMAIN}/subscribe", "entry_id": "tracker", "min_interval": 0})
+    assert (await client.receive_json())["success"]
+    await client.receive_json()  # The current values
+
+    assert await hass.config_entries.async_unload("tracker")
+    await hass.async_block_till_done()
+    message = await client.receive_json()
+    assert message["id"] == 1
+    assert message["error"]["code"] == "not_found"
+    assert not coordinator._live_listeners
+
+    # Unsubscribing afterwards is answered as for any unknown subscription
+    await client.send_json({"id": 2, "type": "unsubscribe_events", "subscription": 1})
+    assert not (await client.receive_json())["success"]
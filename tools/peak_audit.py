@@ -0,0 +1,347 @@
+"""Compute window means and billing-period peaks from exported meter data.
+
+Reads one CSV or Parquet file of power samples per meter, resamples it into
+windows with NumPy exactly like the integration's live integrator (the
+trapezoidal rule between samples, the last power held across a window
+boundary, unavailable stretches left uncovered) and folds the window means
+into the peaks with the integration's own engine, so gating, peak
+uniqueness and monthly resets behave the same. Meters are processed in
+parallel by a pool of worker processes and each file is streamed in
+chunks, so memory does not grow with the length of the export.
+
+Run from the repository root with Home Assistant, which the integration
+package imports, and NumPy installed (and pyarrow for Parquet):
+
+    python tools/peak_audit.py exports/*.csv --num-max-values 3 --monthly-reset \
+        --uniqueness day --tz Europe/Stockholm --output peaks.csv
+
+Input files need a time column (ISO 8601 or UTC epoch seconds; times without
+an offset are read in --tz) and a power column, named by --time-column and
+--value-column. Samples must be in time order. Empty, "unknown" and
+"unavailable" values mark the meter as unavailable. The peaks of every
+period are written as CSV with one row per peak; --windows-dir also writes
+the window means of each meter.
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_components.power_max_tracker.const import DEFAULT_MAX_HOLD, WINDOW_MIN_COVERAGE  # noqa: E402
+from custom_components.power_max_tracker.engine import PeakEngine, TrackerProfile  # noqa: E402
+from custom_components.power_max_tracker.integrator import WINDOW_OPTIONS  # noqa: E402
+from custom_components.power_max_tracker.peaks import UNIQUENESS_OPTIONS, UNIQUE_WINDOW  # noqa: E402
+from custom_components.power_max_tracker.schedule import GateSchedule  # noqa: E402
+
+PEAK_HEADER = ["meter", "period_start", "period_end", "rank", "value_kw", "peak_start"]
+WINDOW_HEADER = ["window_start", "mean_kw", "coverage"]
+UNIT_FACTORS = {"W": 1.0, "kW": 1000.0, "MW": 1000000.0}
+UNAVAILABLE = ("", "unknown", "unavailable")
+
+
+class WindowResampler:
+    """Vectorized equivalent of WindowIntegrator over batches of samples.
+
+    Each batch is integrated with a handful of array operations. The last
+    sample and the energy of the window it falls in are carried over to the
+    next batch, so a file can be fed in chunks of any size.
+    """
+
+    def __init__(self, window_minutes: int, shift: float = 0.0, max_hold: float = math.inf):
+        self.window = window_minutes * 60.0
+        self.shift = shift  # Seconds the local window grid is offset from the UTC one
+        self.max_hold = max_hold or math.inf  # Seconds the last power is held before a gap
+        self._last = None  # (time, W) of the last sample fed
+        self._partial = None  # (window index, W*s, covered s) of the window still open
+
+    def feed(self, times, watts):
+        """Integrate a batch of epoch times and W (NaN while unavailable).
+
+        Returns the start times, means in W and coverage of the windows
+        completed by the batch.
+        """
+        if self._last is not None:
+            times = np.concatenate(([self._last[0]], times))
+            watts = np.concatenate(([self._last[1]], watts))
+        if len(times) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+        # Like the integrator, a sample older than the last one only changes the power
+        times = np.maximum.accumulate(times)
+        self._last = (times[-1], watts[-1])
+        if len(times) < 2:
+            if self._partial is None:
+                self._partial = (math.floor((times[0] + self.shift) / self.window), 0.0, 0.0)
+            return np.empty(0), np.empty(0), np.empty(0)
+
+        start_times, end_times = times[:-1] + self.shift, times[1:] + self.shift
+        start_power, end_power = watts[:-1], watts[1:]
+        valid = ~np.isnan(start_power)
+        start_power = np.where(valid, start_power, 0.0)
+        # Going unavailable integrates up to that sample with the last power held
+        end_power = np.where(np.isnan(end_power), start_power, end_power)
+        # A silence longer than the maximum hold is held that long and then left uncovered
+        stalled = end_times - start_times > self.max_hold
+        end_times = np.where(stalled, start_times + self.max_hold, end_times)
+        end_power = np.where(stalled, start_power, end_power)
+        start_window = np.floor(start_times / self.window).astype(np.int64)
+        end_window = np.floor(end_times / self.window).astype(np.int64)
+        first = start_window[0] if self._partial is None else self._partial[0]
+        count = int(math.floor((times[-1] + self.shift) / self.window) - first + 1)
+        energy = np.zeros(count + 1)
+        covered = np.zeros(count + 1)
+        if self._partial is not None:
+            energy[0] += self._partial[1]
+            covered[0] += self._partial[2]
+
+        # Segments within one window use the trapezoidal rule
+        inside = valid & (start_window == end_window)
+        seconds = end_times - start_times
+        np.add.at(energy, start_window[inside] - first, (start_power + end_power)[inside] / 2 * seconds[inside])
+        np.add.at(covered, start_window[inside] - first, seconds[inside])
+
+        # Segments crossing boundaries hold the start power up to the last boundary
+        crossing = valid & (start_window != end_window)
+        start_window, end_window = start_window[crossing] - first, end_window[crossing] - first
+        start_times, end_times = start_times[crossing], end_times[crossing]
+        start_power, end_power = start_power[crossing], end_power[crossing]
+        head = (start_window + 1 + first) * self.window - start_times
+        tail = end_times - (end_window + first) * self.window
+        np.add.at(energy, start_window, start_power * head)
+        np.add.at(covered, start_window, head)
+        # Whole windows in between, added as a difference array
+        full_energy = np.zeros(count + 1)
+        full_covered = np.zeros(count + 1)
+        np.add.at(full_energy, start_window + 1, start_power * self.window)
+        np.add.at(full_energy, end_window, -start_power * self.window)
+        np.add.at(full_covered, start_window + 1, self.window)
+        np.add.at(full_covered, end_window, -self.window)
+        energy += np.cumsum(full_energy)
+        covered += np.cumsum(full_covered)
+        np.add.at(energy, end_window, (start_power + end_power) / 2 * tail)
+        np.add.at(covered, end_window, tail)
+
+        # The window of the last sample stays open
+        self._partial = (first + count - 1, energy[count - 1], covered[count - 1])
+        starts = (np.arange(first, first + count - 1) * self.window) - self.shift
+        return starts, energy[:count - 1] / self.window, np.minimum(1.0, covered[:count - 1] / self.window)
+
+
+def _localize(naive_seconds, tz):
+    """Convert naive local epoch seconds to UTC epoch seconds, looking up each hour's offset once."""
+    hours, inverse = np.unique(np.floor(naive_seconds / 3600), return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(hour * 3600, timezone.utc).replace(tzinfo=tz).utcoffset().total_seconds()
+        for hour in hours
+    ])
+    return naive_seconds - offsets[inverse]
+
+
+def _has_offset(value):
+    """Return True if an ISO 8601 string carries a UTC offset."""
+    return value.endswith("Z") or value[19:].lstrip(".0123456789")[:1] in ("+", "-")
+
+
+def _parse_times(values, tz):
+    """Return UTC epoch seconds for a column of epoch numbers or ISO 8601 strings."""
+    try:
+        return np.asarray(values, dtype=float)
+    except ValueError:
+        pass
+    if len(values) and not _has_offset(str(values[0])):
+        try:
+            # Naive ISO strings parse in one NumPy call
+            naive = np.asarray(values, dtype="datetime64[ms]").astype(np.int64) / 1000.0
+            return _localize(naive, tz)
+        except ValueError:
+            pass
+    times = np.empty(len(values))
+    for index, value in enumerate(values):
+        moment = datetime.fromisoformat(value)
+        times[index] = (moment if moment.tzinfo else moment.replace(tzinfo=tz)).timestamp()
+    return times
+
+
+def _parse_values(values, factor):
+    """Return non-negative W for a column of readings, NaN where unavailable."""
+    watts = np.array([math.nan if str(v).strip().lower() in UNAVAILABLE else float(v) for v in values])
+    return np.maximum(watts, 0.0) * factor  # NaN is kept
+
+
+def read_csv(path, options):
+    """Yield (UTC epoch seconds, W) arrays in chunks of a CSV export."""
+    with open(path, newline="") as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        missing = [name for name in (options.time_column, options.value_column) if name not in header]
+        if missing:
+            raise ValueError(f"{path} has no column {', '.join(missing)}")
+        time_index = header.index(options.time_column)
+        value_index = header.index(options.value_column)
+        times, values = [], []
+        for row in reader:
+            times.append(row[time_index])
+            values.append(row[value_index])
+            if len(times) >= options.chunk_size:
+                yield _parse_times(times, options.tz), _parse_values(values, options.factor)
+                times, values = [], []
+        if times:
+            yield _parse_times(times, options.tz), _parse_values(values, options.factor)
+
+
+def read_parquet(path, options):
+    """Yield (UTC epoch seconds, W) arrays in row batches of a Parquet export."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Reading Parquet files requires pyarrow")
+    parquet = pq.ParquetFile(path)
+    time_type = parquet.schema_arrow.field(options.time_column).type
+    for batch in parquet.iter_batches(options.chunk_size, columns=[options.time_column, options.value_column]):
+        times = batch.column(0).to_numpy(zero_copy_only=False)
+        if np.issubdtype(times.dtype, np.datetime64):
+            times = times.astype("datetime64[ms]").astype(np.int64) / 1000.0
+            if getattr(time_type, "tz", None) is None:
+                times = _localize(times, options.tz)
+        else:
+            times = _parse_times(times, options.tz)
+        values = batch.column(1).to_numpy(zero_copy_only=False).astype(float)
+        yield times, np.maximum(values, 0.0) * options.factor
+
+
+def build_profile(options):
+    """Return the tracker profile configured on the command line."""
+    schedule = None
+    if options.schedule_months or options.schedule_weekdays or options.schedule_hours or options.schedule_holidays:
+        schedule = GateSchedule(
+            options.schedule_months, options.schedule_weekdays, options.schedule_hours, options.schedule_holidays
+        )
+    return TrackerProfile(
+        "", "", options.num_max_values, options.uniqueness, options.monthly_reset, schedule=schedule,
+        rolling_days=options.rolling_days, window_minutes=options.window_minutes,
+    )
+
+
+def _samples(path, options):
+    """Yield the sample batches of one export file."""
+    if path.endswith(".parquet"):
+        return read_parquet(path, options)
+    return read_csv(path, options)
+
+
+def audit_meter(path, options):
+    """Compute the peak rows of one meter, writing its windows if requested."""
+    meter = os.path.splitext(os.path.basename(path))[0]
+    engine = PeakEngine(
+        [build_profile(options)], options.window_minutes, options.tz, options.min_coverage, options.max_hold
+    )
+    windows_file = None
+    if options.windows_dir:
+        windows_file = open(os.path.join(options.windows_dir, f"{meter}.csv"), "w", newline="")
+        windows = csv.writer(windows_file)
+        windows.writerow(WINDOW_HEADER)
+    resampler = None
+    last_end = None
+    try:
+        for times, watts in _samples(path, options):
+            if options.reference:
+                # Sample by sample through the integration's own integrator
+                for moment, power in zip(times, watts):
+                    engine.add_sample(datetime.fromtimestamp(moment, timezone.utc), None if math.isnan(power) else power)
+                if engine.integrator.window_start is not None:
+                    last_end = engine.integrator.window_start
+                continue
+            if resampler is None and len(times):
+                offset = options.tz.utcoffset(datetime.fromtimestamp(times[0], timezone.utc).replace(tzinfo=None))
+                resampler = WindowResampler(
+                    options.window_minutes, offset.total_seconds() % (options.window_minutes * 60), options.max_hold
+                )
+            if resampler is None:
+                continue
+            starts, means, coverage = resampler.feed(times, watts)
+            for start, mean, covered in zip(starts.tolist(), means.tolist(), coverage.tolist()):
+                window_start = datetime.fromtimestamp(start, timezone.utc)
+                if windows_file is not None:
+                    windows.writerow([window_start.astimezone(options.tz).isoformat(), round(mean / 1000.0, 6), round(covered, 4)])
+                if covered >= options.min_coverage:
+                    engine.add_window(window_start, mean)
+            if len(starts):
+                last_end = datetime.fromtimestamp(starts[-1] + options.window_minutes * 60, timezone.utc)
+    finally:
+        if windows_file is not None:
+            windows_file.close()
+
+    rows = []
+    end = last_end.astimezone(options.tz) if last_end is not None else None
+    for _, period_start, period_end, peaks in engine.closed_periods + engine.current_periods(end):
+        for rank, peak in enumerate(peaks, start=1):
+            rows.append([
+                meter,
+                period_start.isoformat(),
+                period_end.isoformat() if period_end else "",
+                rank,
+                round(peak.value, 6),
+                peak.start.isoformat() if peak.start else "",
+            ])
+    return rows
+
+
+def main(argv=None):
+    """Audit the given meter exports and write their peaks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help="CSV or .parquet exports, one meter per file")
+    parser.add_argument("--time-column", default="time")
+    parser.add_argument("--value-column", default="value")
+    parser.add_argument("--unit", choices=list(UNIT_FACTORS), default="W", help="Unit of the value column")
+    parser.add_argument("--tz", default="UTC", help="Time zone of the billing calendar and schedule")
+    parser.add_argument("--window-minutes", type=int, choices=WINDOW_OPTIONS, default=60)
+    parser.add_argument("--num-max-values", type=int, default=2)
+    parser.add_argument("--uniqueness", choices=UNIQUENESS_OPTIONS, default=UNIQUE_WINDOW)
+    parser.add_argument("--monthly-reset", action="store_true")
+    parser.add_argument("--rolling-days", type=int, default=0,
+                        help="Track the peaks of the last N days at the end of each export instead")
+    parser.add_argument("--schedule-months", type=int, nargs="*")
+    parser.add_argument("--schedule-weekdays", type=int, nargs="*")
+    parser.add_argument("--schedule-hours", help='Hour ranges with exclusive end, e.g. "7-20"')
+    parser.add_argument("--schedule-holidays", nargs="*", help="Dates (YYYY-MM-DD) on which tracking is inactive")
+    parser.add_argument("--min-coverage", type=float, default=WINDOW_MIN_COVERAGE,
+                        help="Fraction of a window that must be backed by samples for it to count")
+    parser.add_argument("--max-hold", type=float, default=DEFAULT_MAX_HOLD,
+                        help="Seconds the last power is held through a silence, 0 to hold it indefinitely")
+    parser.add_argument("--chunk-size", type=int, default=500000, help="Rows read per batch")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--reference", action="store_true",
+                        help="Integrate sample by sample with the integration's integrator instead of NumPy")
+    parser.add_argument("--windows-dir", help="Also write the window means of each meter to this directory")
+    parser.add_argument("--output", help="Peak CSV to write, stdout by default")
+    options = parser.parse_args(argv)
+    if not 1 <= options.num_max_values <= 10:
+        parser.error("--num-max-values must be between 1 and 10")
+    if options.rolling_days and options.monthly_reset:
+        parser.error("--rolling-days cannot be combined with --monthly-reset")
+    options.tz = ZoneInfo(options.tz)
+    options.factor = UNIT_FACTORS[options.unit]
+    if options.windows_dir:
+        os.makedirs(options.windows_dir, exist_ok=True)
+
+    output = open(options.output, "w", newline="") if options.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(PEAK_HEADER)
+        with ProcessPoolExecutor(max_workers=options.jobs) as pool:
+            for rows in pool.map(audit_meter, options.files, [options] * len(options.files)):
+                writer.writerows(rows)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()